@@ -0,0 +1,226 @@
+"""
+Plays whole games end to end against a local backend (see utils/backend.py)
+and measures where the time goes. input() is answered by a scripted player
+that clears every clue on the board, so the timings are pure overhead, with
+no thinking time in them. Half the games pick an episode by date, and half
+take a random one from the prefetcher.
+
+Reports p50/p95/p99 latency of every dbaccess call, of each transition
+between rounds, and of the full game, plus the connections borrowed from
+and opened by the backend. Results are printed and, with --output, written
+as JSON, tagged with the current commit so runs can be compared. No
+altconfig.py is needed: the game's settings fall back to config.py's
+defaults (see utils/settings.py), and the backend is chosen here.
+
+Usage: python benchmarks/game_latency.py [--games N] [--episodes N]
+                                         [--backend memory|sqlite] [--output FILE]
+"""
+
+import argparse
+import builtins
+import functools
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Any, Callable
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "utils"))
+
+import synthetic # pylint: disable=wrong-import-position
+
+# the points between the rounds of a game, in the order they happen
+TRANSITIONS = ("start -> Regular", "Regular -> Double", "Double -> Final", "Final -> end")
+
+class ScriptedPlayer():
+    """Stands in for input(). Answers every prompt game_loop asks, picking
+    each category and value in turn, and answering every other clue right."""
+
+    def __init__(self, ep_date: str | None = None):
+        self.ep_date = ep_date
+        self.picks = [
+            (category, value)
+            for categories, values in ((synthetic.REGULAR_CATEGORIES, (200, 400, 600, 800, 1000)),
+                                       (synthetic.DOUBLE_CATEGORIES, (400, 800, 1200, 1600, 2000)))
+            for category in categories
+            for value in values]
+        self.value = 0
+        self.answers = 0
+
+    def __call__(self, prompt: str = "") -> str:
+        if prompt.startswith("Do you want to start with a specific game?"):
+            return "y" if self.ep_date is not None else "n"
+        if prompt.startswith("Please enter episode date"):
+            return str(self.ep_date)
+        if prompt.startswith("Choose a category"):
+            category, self.value = self.picks.pop(0)
+            return category
+        if prompt.startswith("What value of clue?"):
+            return str(self.value)
+        if prompt.startswith("How much would you like to bid?"):
+            return "0"
+        if prompt.startswith("What is..."):
+            self.answers += 1
+            return synthetic.ANSWER if self.answers % 2 == 1 else "no idea"
+        raise ValueError(f"Unexpected prompt: {prompt!r}")
+
+class Recorder():
+    """Collects timing samples, in seconds, by name."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        """Records one sample. Safe to call from the prefetcher's threads."""
+        self.samples.setdefault(name, []).append(seconds)
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """Wraps a function so that every call to it is recorded under name."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return wrapper
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Returns the count, mean, and p50/p95/p99 of a list of samples, in milliseconds."""
+    ms = sorted(sample * 1000 for sample in samples)
+    if len(ms) == 1:
+        cuts = [ms[0]] * 99
+    else:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98]}
+
+def current_commit() -> str | None:
+    """The commit being benchmarked, if this is a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(games: int, episodes: int) -> dict[str, Any]:
+    """Fills the backend with synthetic episodes, plays the games, and returns the results.
+    The game's modules are imported here, after the backend has been chosen."""
+    # pylint: disable=import-outside-toplevel
+    import dbbuilder
+    import utils.dbaccess as db
+    import modules.play_game as play
+    from utils.connection import backend
+    from utils.prefetch import prefetcher
+
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest(synthetic.dump_entries(episodes))
+        db.add_player_to_table("benchmark", "benchmark")
+    user_id = db.get_user_id("benchmark")
+
+    calls = Recorder()
+    for name in dir(db):
+        function = getattr(db, name)
+        if callable(function) and getattr(function, "__module__", None) == db.__name__:
+            setattr(db, name, calls.timed(name, function))
+
+    borrowed = 0
+    connection = backend.connection
+    def counted_connection():
+        nonlocal borrowed
+        borrowed += 1
+        return connection()
+    backend.connection = counted_connection
+
+    # a transition ends when the next round starts; the last ends when game_loop returns
+    transitions = Recorder()
+    marks: list[float] = []
+    def round_mark(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            marks.append(time.perf_counter())
+            result = function(*args, **kwargs)
+            marks.append(time.perf_counter())
+            return result
+        return wrapper
+    play.play_game = round_mark(play.play_game)
+    play.play_final_jeopardy = round_mark(play.play_final_jeopardy)
+
+    full_games = Recorder()
+    real_input = builtins.input
+    opened_before = backend.opened
+    try:
+        for game in range(games):
+            ep_date = str(synthetic.airdate(game % episodes)) if game % 2 == 0 else None
+            builtins.input = ScriptedPlayer(ep_date)
+            marks.clear()
+            with redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                play.game_loop(user_id)
+                end = time.perf_counter()
+            full_games.add("game", end - start)
+            # start, then an (enter, exit) pair per round, then the end
+            points = [start] + marks + [end]
+            for index, name in enumerate(TRANSITIONS):
+                transitions.add(name, points[index * 2 + 1] - points[index * 2])
+    finally:
+        builtins.input = real_input
+        prefetcher.shutdown()
+
+    return {
+        "commit": current_commit(),
+        "backend": backend.name,
+        "games": games,
+        "episodes": episodes,
+        "game": summarize(full_games.samples["game"]),
+        "transitions": {name: summarize(transitions.samples[name]) for name in TRANSITIONS},
+        "calls": {name: summarize(samples) for name, samples in sorted(calls.samples.items())},
+        "connections": {"borrowed": borrowed, "opened": backend.opened - opened_before}}
+
+def print_results(results: dict[str, Any]) -> None:
+    """Prints the results as a table."""
+    print(f"{results['games']} games over {results['episodes']} episodes "
+          f"on the {results['backend']} backend")
+    print(f"{'':32} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("full game", results["game"])]
+    rows += list(results["transitions"].items())
+    rows += list(results["calls"].items())
+    for name, stats in rows:
+        print(f"{name:32} {stats['count']:>6} {stats['p50_ms']:>9.3f} "
+              f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+    print(f"connections borrowed: {results['connections']['borrowed']}, "
+          f"opened: {results['connections']['opened']}")
+
+def main() -> None:
+    """Parses the arguments, chooses the backend, and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20, help="number of games to play")
+    parser.add_argument("--episodes", type=int, default=200, help="number of synthetic episodes")
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory",
+                        help="local backend to play against")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    # the config is read when the game's modules are first imported
+    os.environ["BACKEND"] = args.backend
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["SQLITE_FILE"] = os.path.join(directory, "benchmark.sqlite3")
+        results = run(args.games, args.episodes)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
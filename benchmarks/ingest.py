@@ -0,0 +1,246 @@
+"""
+Measures how fast dbbuilder writes new episodes, and then updates them in
+place, in rows per second, for the original per-row path (a connection and
+commit for every insert, lookup, and update) and for each of the ingest
+strategies in dbbuilder.INGEST_STRATEGIES:
+
+    executemany  one executemany per table per episode
+    multirow     one multi-row INSERT per table per batch
+    loaddata     LOAD DATA LOCAL INFILE per table per batch (MySQL only)
+
+Episodes are synthetic (see synthetic.py), and the episode tables are
+emptied before every run. Against MySQL/MariaDB, connect straight to a
+local server set aside for the benchmark - no SSH tunnel is involved, and
+the server needs local_infile enabled for the loaddata strategy. The
+sqlite and memory backends need no server.
+
+Usage: python benchmarks/ingest.py [--backend mysql|sqlite|memory] [--episodes N]
+                                   [--strategies perrow,executemany,...]
+                                   [--host H] [--port P] [--user U] [--password PW]
+                                   [--database DB] [--output FILE]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Iterator
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "utils"))
+
+import synthetic # pylint: disable=wrong-import-position
+
+STRATEGIES = ("perrow", "executemany", "multirow", "loaddata")
+EPISODE_TABLES = ("clues", "categories", "episodes")
+
+def rows_per_episode() -> int:
+    """The number of rows one synthetic episode adds across the episode tables."""
+    data = synthetic.episode_data(0)
+    categories = sum(len(jround) for jround in data)
+    clues = sum(len(clues) for jround in data for clues in jround.values())
+    return 1 + categories + clues
+
+def is_ep_in_database(dbbuilder: Any, episode_title: str) -> bool:
+    """Checks if the episode title already exists in the database."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(dbbuilder.q.SQL_GET_EPTITLE_EXISTENCE, (episode_title))
+            result = cur.fetchone()
+        finally:
+            cur.close()
+    return result is not None
+
+def get_category_ids_by_round(dbbuilder: Any, episode_id: int, what_round: str) -> list[int]:
+    """Retrieves all category IDs in an episode's round."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(dbbuilder.q.SQL_GET_CATEGORYIDS_BY_ROUND, (what_round, episode_id))
+            return [int(row[0]) for row in cur.fetchall()]
+        finally:
+            cur.close()
+
+def get_clue_ids_by_category_id(dbbuilder: Any, category_id: int) -> list[int]:
+    """Retrieves all clue IDs that are associated with a category ID."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(dbbuilder.q.SQL_GET_CLUES_BY_CATEGORYID, (category_id))
+            return [int(row[0]) for row in cur.fetchall()]
+        finally:
+            cur.close()
+
+def update_category(dbbuilder: Any, category_name: str, category_id: int) -> None:
+    """Updates a category that already exists in the database."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(dbbuilder.q.SQL_UPDATE_CATEGORY, (category_name, category_id))
+            conn.commit()
+        finally:
+            cur.close()
+
+def update_clues_and_answers(dbbuilder: Any, question: str, answer: str, clue_id: int) -> None:
+    """Updates a clue and answer that already exist in the database."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(dbbuilder.q.SQL_UPDATE_CLUES, (question, answer, clue_id))
+            conn.commit()
+        finally:
+            cur.close()
+
+def ingest_per_row(dbbuilder: Any, entries: list) -> None:
+    """Writes episodes the way update_database did before the bulk paths:
+    every insert, lookup, and update borrows its own connection and commits
+    alone. Episodes already in the database are updated category by
+    category and clue by clue."""
+    for file, json_data in entries:
+        episode_title = dbbuilder.build_ep_title_from_file(file)
+        if not is_ep_in_database(dbbuilder, episode_title):
+            dbbuilder.insert_episode(file)
+            episode_id = dbbuilder.get_episode_id(episode_title)
+            for round_position, jround in enumerate(json_data):
+                dbbuilder.insert_categories(jround, round_position, episode_id)
+                for category in dbbuilder.build_categories(jround):
+                    dbbuilder.insert_clues_and_answers(jround, round_position, category, episode_id)
+            continue
+        episode_id = dbbuilder.get_episode_id(episode_title)
+        for what_round, jround in zip(dbbuilder.ROUND_NAMES, json_data):
+            category_names = dbbuilder.build_categories(jround)
+            for category_name, category_id in zip(category_names,
+                                                  get_category_ids_by_round(dbbuilder, episode_id, what_round)):
+                update_category(dbbuilder, category_name, category_id)
+                clues = dbbuilder.build_clues_and_answers(jround, category_name)
+                for (question, answer), clue_id in zip(clues.items(),
+                                                       get_clue_ids_by_category_id(dbbuilder, category_id)):
+                    update_clues_and_answers(dbbuilder, question, answer, clue_id)
+
+def empty_tables(dbbuilder: Any) -> None:
+    """Deletes every episode, category, and clue, so each run starts empty."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            for table in EPISODE_TABLES:
+                cur.execute(f"DELETE FROM {table}")
+            conn.commit()
+        finally:
+            cur.close()
+
+def count_rows(dbbuilder: Any) -> int:
+    """Counts the rows in the episode tables."""
+    with dbbuilder.backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            total = 0
+            for table in EPISODE_TABLES:
+                cur.execute(f"SELECT COUNT(*) FROM {table}")
+                total += int(cur.fetchone()[0])
+        finally:
+            cur.close()
+    return total
+
+def use_local_mysql(dbbuilder: Any, args: argparse.Namespace) -> None:
+    """Points the builder straight at a local MySQL/MariaDB server and
+    brings the benchmark database's schema up to date."""
+    # pylint: disable=import-outside-toplevel
+    import pymysql
+    import schema
+    from backend import MySQLBackend
+
+    @contextmanager
+    def connect() -> Iterator[pymysql.Connection]:
+        conn = pymysql.connect(host=args.host, port=args.port, user=args.user, passwd=args.password,
+                               db=args.database, local_infile=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    dbbuilder.backend = MySQLBackend(connect)
+    with connect() as conn:
+        schema.apply_migrations(conn)
+
+def run(dbbuilder: Any, strategies: list[str], episodes: int) -> dict[str, dict[str, float]]:
+    """Times each strategy writing the same episodes into empty tables, then
+    writing them again, which updates every episode in place."""
+    entries = list(synthetic.dump_entries(episodes))
+    expected = episodes * rows_per_episode()
+    results = {}
+    for strategy in strategies:
+        if strategy == "loaddata" and dbbuilder.backend.dialect != "mysql":
+            print(f"Skipping loaddata: the {dbbuilder.backend.name} backend can't LOAD DATA")
+            continue
+        empty_tables(dbbuilder)
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if strategy == "perrow":
+                ingest_per_row(dbbuilder, entries)
+            else:
+                dbbuilder.ingest(entries, episode_ids={}, strategy=strategy)
+            seconds = time.perf_counter() - start
+        rows = count_rows(dbbuilder)
+        if rows != expected:
+            raise ValueError(f"{strategy} wrote {rows} rows, expected {expected}")
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if strategy == "perrow":
+                ingest_per_row(dbbuilder, entries)
+            else:
+                dbbuilder.ingest(entries, strategy=strategy)
+            update_seconds = time.perf_counter() - start
+        rows = count_rows(dbbuilder)
+        if rows != expected:
+            raise ValueError(f"{strategy} left {rows} rows after updating, expected {expected}")
+        results[strategy] = {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds,
+                             "update_seconds": update_seconds, "update_rows_per_second": rows / update_seconds}
+    empty_tables(dbbuilder)
+    return results
+
+def main() -> None:
+    """Parses the arguments, chooses the backend, and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("mysql", "sqlite", "memory"), default="mysql")
+    parser.add_argument("--episodes", type=int, default=100, help="number of synthetic episodes")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES),
+                        help=f"comma-separated, from {', '.join(STRATEGIES)}")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="jenopardy_benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+    strategies = [strategy.strip() for strategy in args.strategies.split(",")]
+    for strategy in strategies:
+        if strategy not in STRATEGIES:
+            parser.error(f"unknown strategy {strategy!r}")
+
+    # the config is read when the builder is first imported
+    os.environ["BACKEND"] = args.backend
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["SQLITE_FILE"] = os.path.join(directory, "benchmark.sqlite3")
+        import dbbuilder # pylint: disable=import-outside-toplevel
+        if args.backend == "mysql":
+            use_local_mysql(dbbuilder, args)
+        results = run(dbbuilder, strategies, args.episodes)
+        dbbuilder.backend.close()
+
+    print(f"{args.episodes} episodes ({rows_per_episode()} rows each) on the {args.backend} backend")
+    print(f"{'strategy':12} {'seconds':>9} {'rows/s':>10} {'update s':>9} {'update rows/s':>14}")
+    for strategy, result in results.items():
+        print(f"{strategy:12} {result['seconds']:>9.2f} {result['rows_per_second']:>10.0f}"
+              f" {result['update_seconds']:>9.2f} {result['update_rows_per_second']:>14.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"backend": args.backend, "episodes": args.episodes, "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
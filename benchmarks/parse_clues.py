@@ -0,0 +1,101 @@
+"""
+Compares the single-pass get_clues against the old approach of scanning
+the round with find_all once per cell, over a directory of saved episode
+pages (showgame.php saved as .html, in subdirectories too). Both are checked
+to produce the same ClueDicts before anything is timed. With no directory,
+the pages in benchmarks/pages are used: trimmed showgame pages with a full
+board, an early season's unrevealed clues, and a tournament game with markup
+in its clues and an unplayed category.
+
+Usage: python benchmarks/parse_clues.py [path/to/saved/pages] [repeats]
+"""
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+import jsoncrawler as jc # pylint: disable=wrong-import-position
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+def get_clues_scan(jround: BeautifulSoup, is_double: bool) -> jc.ClueDict:
+    """The previous get_clues: two find_all scans of the round for every cell."""
+    if jround == "null":
+        return jc.get_clues(jround, is_double)
+    selected_key = jc.DJ_KEY if is_double else jc.SJ_KEY
+    clue_lists = []
+    answer_lists = []
+    for category in jc.CATEGORY_CONSTS:
+        clue_list = []
+        answer_list = []
+        for clue in jc.CLUE_CONSTS:
+            clue_soup = jround.find_all("td", {"id":f"clue_{selected_key}_{category}_{clue}"})
+            answer_soup = jround.find_all("td", {"id":f"clue_{selected_key}_{category}_{clue}_r"})
+            if len(clue_soup) > 0:
+                clue_list.append(clue_soup[0].get_text())
+            else:
+                clue_list.append(f"null_{selected_key}_{category}_{clue}")
+            if len(answer_soup) > 0:
+                nested_answer = answer_soup[0].find("em", {"class":"correct_response"})
+                answer_list.append(nested_answer.get_text())
+            else:
+                answer_list.append(f"null_{selected_key}_{category}_{clue}_r")
+        clue_lists.append(clue_list)
+        answer_lists.append(answer_list)
+    category_names = jc.get_categories(jround)
+    return {
+        category: dict(zip(clue_lists[index], answer_lists[index]))
+        for index, category in enumerate(category_names)}
+
+def load_rounds(directory: str) -> list[tuple[BeautifulSoup, bool]]:
+    """Parses every saved page and returns its Jeopardy and Double Jeopardy rounds."""
+    rounds = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(".html"):
+                continue
+            with open(os.path.join(root, name), encoding="utf-8") as file:
+                soup = BeautifulSoup(file.read(), "lxml")
+            with redirect_stdout(io.StringIO()):
+                jrounds = jc.create_rounds(soup)
+            rounds.append((jrounds[0], False))
+            rounds.append((jrounds[1], True))
+    if len(rounds) == 0:
+        raise ValueError(f"No .html pages found in {directory}")
+    return rounds
+
+def time_parser(parser, rounds: list[tuple[BeautifulSoup, bool]], repeats: int) -> float:
+    """Returns the best wall time, in seconds, of parsing every round once.
+    The crawler's progress messages are swallowed so they don't skew the timing."""
+    best = float("inf")
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for jround, is_double in rounds:
+                parser(jround, is_double)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def main() -> None:
+    """Runs the comparison and prints the timings."""
+    directory = sys.argv[1] if len(sys.argv) > 1 else PAGES
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rounds = load_rounds(directory)
+    for jround, is_double in rounds:
+        if jc.get_clues(jround, is_double) != get_clues_scan(jround, is_double):
+            raise ValueError("Single-pass and scanning parsers disagree")
+    scan = time_parser(get_clues_scan, rounds, repeats)
+    single = time_parser(jc.get_clues, rounds, repeats)
+    print(f"{len(rounds)} rounds, best of {repeats}")
+    print(f"find_all per cell: {scan:.3f}s")
+    print(f"single pass:       {single:.3f}s")
+    print(f"speedup:           {scan / single:.1f}x")
+
+if __name__ == "__main__":
+    main()
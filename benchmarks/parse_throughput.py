@@ -0,0 +1,151 @@
+"""
+Measures how fast the crawler turns saved episode pages into EpisodeData,
+with the lxml and html.parser tree builders. The corpus is a directory of
+saved showgame.php pages (.html); pages in subdirectories are reported as
+their own group, so a corpus laid out as
+
+    corpus/modern/*.html
+    corpus/early/*.html         (early seasons, with missing clues)
+    corpus/tournament/*.html
+
+is timed group by group as well as in total. For every parser and group,
+each stage (building the soup, create_rounds, get_clues, get_final_jeopardy,
+and the whole of build_episode_data) is timed best-of-N, and pages/s and
+clues/s are reported along with peak RSS. Every measurement runs in a fresh
+process, so one parser's memory use doesn't hide the other's.
+
+Usage: python benchmarks/parse_throughput.py path/to/corpus [--repeats N] [--output FILE]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+from typing import Any, Callable
+from bs4 import BeautifulSoup
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+
+import jsoncrawler as jc # pylint: disable=wrong-import-position
+
+PARSERS = ("lxml", "html.parser")
+STAGES = ("soup", "create_rounds", "get_clues", "get_final_jeopardy", "build_episode_data")
+
+def load_corpus(directory: str) -> dict[str, list[str]]:
+    """Reads every saved page, grouped by the subdirectory it is in.
+    Pages directly in the corpus directory are grouped as "corpus"."""
+    groups: dict[str, list[str]] = {}
+    for root, _, files in os.walk(directory):
+        group = os.path.relpath(root, directory)
+        group = "corpus" if group == "." else group
+        for name in sorted(files):
+            if name.endswith(".html"):
+                with open(os.path.join(root, name), encoding="utf-8") as file:
+                    groups.setdefault(group, []).append(file.read())
+    if len(groups) == 0:
+        raise ValueError(f"No .html pages found in {directory}")
+    return groups
+
+def peak_rss_kib() -> int | None:
+    """The peak resident set size of this process so far, in KiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def count_clues(episode_data: jc.EpisodeData) -> int:
+    """Counts the clues in an episode that j-archive actually had."""
+    return sum(1
+               for jround in episode_data
+               for clues in jround.values()
+               for clue in clues
+               if not clue.startswith("null_"))
+
+def best_time(function: Callable[[], Any], repeats: int) -> float:
+    """Returns the best wall time, in seconds, of `repeats` calls."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def measure(pages: list[str], parser: str, repeats: int) -> dict[str, Any]:
+    """Times every stage over a group of pages with one parser. Runs in its
+    own process. The crawler's progress messages are swallowed so they
+    don't skew the timing."""
+    baseline = peak_rss_kib()
+    with redirect_stdout(io.StringIO()):
+        soups = [BeautifulSoup(html, parser) for html in pages]
+        rounds = [jc.create_rounds(soup) for soup in soups]
+        clues = sum(count_clues(jc.build_episode_data(soup)) for soup in soups)
+        times = {
+            "soup": best_time(lambda: [BeautifulSoup(html, parser) for html in pages], repeats),
+            "create_rounds": best_time(lambda: [jc.create_rounds(soup) for soup in soups], repeats),
+            "get_clues": best_time(lambda: [(jc.get_clues(jrounds[0], False), jc.get_clues(jrounds[1], True))
+                                            for jrounds in rounds], repeats),
+            "get_final_jeopardy": best_time(lambda: [jc.get_final_jeopardy(jrounds[2])
+                                                     for jrounds in rounds], repeats),
+            "build_episode_data": best_time(lambda: [jc.build_episode_data(soup) for soup in soups], repeats)}
+    # a page from disk to EpisodeData is the soup plus build_episode_data
+    total = times["soup"] + times["build_episode_data"]
+    peak = peak_rss_kib()
+    return {
+        "pages": len(pages),
+        "clues": clues,
+        "seconds": times,
+        "pages_per_second": len(pages) / total,
+        "clues_per_second": clues / total,
+        "peak_rss_kib": peak,
+        "parse_rss_kib": peak - baseline if peak is not None and baseline is not None else None}
+
+def run(groups: dict[str, list[str]], repeats: int) -> dict[str, dict[str, Any]]:
+    """Measures every parser on every group, and on the whole corpus, each in a
+    fresh process. Returns the results keyed by parser, then by group."""
+    if len(groups) > 1:
+        groups = {**groups, "all": [page for pages in groups.values() for page in pages]}
+    results: dict[str, dict[str, Any]] = {}
+    for parser in PARSERS:
+        results[parser] = {}
+        for group, pages in groups.items():
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                results[parser][group] = executor.submit(measure, pages, parser, repeats).result()
+    return results
+
+def print_results(results: dict[str, dict[str, Any]]) -> None:
+    """Prints the results as a table."""
+    print(f"{'parser':12} {'group':12} {'pages':>6} {'pages/s':>9} {'clues/s':>10} "
+          + " ".join(f"{stage:>18}" for stage in STAGES) + f" {'peak RSS':>10}")
+    for parser, groups in results.items():
+        for group, result in groups.items():
+            stages = " ".join(f"{result['seconds'][stage] * 1000:>16.1f}ms" for stage in STAGES)
+            rss = f"{result['peak_rss_kib'] / 1024:.0f} MiB" if result["peak_rss_kib"] is not None else "n/a"
+            print(f"{parser:12} {group:12} {result['pages']:>6} {result['pages_per_second']:>9.1f} "
+                  f"{result['clues_per_second']:>10.0f} {stages} {rss:>10}")
+
+def main() -> None:
+    """Loads the corpus, runs every measurement, and reports."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="directory of saved episode pages")
+    parser.add_argument("--repeats", type=int, default=3, help="time each stage best of N")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+    results = run(load_corpus(args.corpus), args.repeats)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
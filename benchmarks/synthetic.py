@@ -0,0 +1,41 @@
+"""
+Synthetic episodes in the shape the crawler dumps (see dbbuilder.EpisodeData),
+for filling a database without crawling j-archive. Every episode has the same
+category names and answers, so a scripted player can play any of them blind.
+"""
+
+from datetime import date, timedelta
+from typing import Iterator
+
+FIRST_AIRDATE = date(2000, 1, 3)
+CATEGORIES = 6
+REGULAR_CATEGORIES = [f"CATEGORY {n}" for n in range(1, CATEGORIES + 1)]
+DOUBLE_CATEGORIES = [f"DOUBLE CATEGORY {n}" for n in range(1, CATEGORIES + 1)]
+FINAL_CATEGORY = "FINAL CATEGORY"
+ANSWER = "the answer"
+
+def airdate(index: int) -> date:
+    """The airdate of the index-th synthetic episode, one per day."""
+    return FIRST_AIRDATE + timedelta(days=index)
+
+def file_name(index: int) -> str:
+    """The dump file name of the index-th episode, as the crawler would write it."""
+    return f"Show #{index + 1} - {airdate(index).strftime('%A, %B %d, %Y')}.json"
+
+def episode_data(index: int) -> list[dict[str, dict[str, str]]]:
+    """The rounds of the index-th episode: six categories of five clues in the
+    Regular and Double rounds, and one Final Jeopardy clue."""
+    rounds = []
+    for round_name, categories in (("J", REGULAR_CATEGORIES), ("DJ", DOUBLE_CATEGORIES)):
+        rounds.append({
+            category: {
+                f"Episode {index + 1} {round_name} {category.lower()} clue {clue}": ANSWER
+                for clue in range(1, 6)}
+            for category in categories})
+    rounds.append({FINAL_CATEGORY: {f"Episode {index + 1} final clue": ANSWER}})
+    return rounds
+
+def dump_entries(count: int, start: int = 0) -> Iterator[tuple[str, list]]:
+    """Yields (file name, rounds) for `count` episodes, as dbbuilder.iter_dump does."""
+    for index in range(start, start + count):
+        yield file_name(index), episode_data(index)
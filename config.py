@@ -20,7 +20,39 @@ class Config():
     SSH_PASSWORD = os.getenv("SSH_PASSWORD")
     SSH_REMOTE_BIND_ADDRESS = os.getenv("SSH_REMOTE_BIND_ADDRESS")
 
+    # where the game's tables live: "mysql", "sqlite" (SQLITE_FILE), or "memory"
+    BACKEND = os.getenv("BACKEND", "mysql")
+    SQLITE_FILE = os.getenv("SQLITE_FILE", "jenopardy.sqlite3")
+
+    POOL_SIZE = int(os.getenv("POOL_SIZE", "4"))
+    POOL_TIMEOUT = float(os.getenv("POOL_TIMEOUT", "30"))
+
+    # how often the cached list of episode IDs used for random picks is reloaded
+    EPISODE_CACHE_SECONDS = float(os.getenv("EPISODE_CACHE_SECONDS", "600"))
+    # random games skip episodes the player has played / episodes with missing clues
+    RANDOM_EXCLUDE_PLAYED = os.getenv("RANDOM_EXCLUDE_PLAYED", "false").lower() == "true"
+    RANDOM_COMPLETE_ONLY = os.getenv("RANDOM_COMPLETE_ONLY", "false").lower() == "true"
+
+    # "json" for one file per episode in jsondump/, "store" for the single-file episode store
+    # (the crawler reads the same variable itself, see jsoncrawler.DUMP_FORMAT)
+    DUMP_FORMAT = os.getenv("DUMP_FORMAT", "json")
+
+    # read episodes, categories and clues from a local SQLite copy (see utils/replica.py)
+    USE_REPLICA = os.getenv("USE_REPLICA", "false").lower() == "true"
+    REPLICA_FILE = os.getenv("REPLICA_FILE", "clues.sqlite3")
+
+    # how the builder writes new episodes: "executemany", "multirow", or "loaddata"
+    INGEST_STRATEGY = os.getenv("INGEST_STRATEGY", "executemany")
+    # allow LOAD DATA LOCAL INFILE on the builder's connection (needed for "loaddata")
+    LOCAL_INFILE = os.getenv("LOCAL_INFILE", "false").lower() == "true"
+
+    # record the time, rows, and errors of every query (see utils/instrumentation.py),
+    # and the file to dump them to on exit (.prom for Prometheus text, anything else for JSON)
+    INSTRUMENT = os.getenv("INSTRUMENT", "true").lower() == "true"
+    STATS_FILE = os.getenv("STATS_FILE")
+
     VALUE_REGULAR = [200, 400, 600, 800, 1000]
     VALUE_DOUBLE = [400, 800, 1200, 1600, 2000]
 
-    ADMIN_ID = int(os.getenv("ADMIN_ID")) #type: ignore
+    # the userID with access to the debug menu; 0 matches no account
+    ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
@@ -5,13 +5,15 @@ from score and user management.
 """
 
 import sys
-from altconfig import Config
+from utils.settings import Config
 from modules.login import log_in
 from modules.play_game import game_loop
 from modules.leaderboard import view_leaderboard
 from modules.user_profile import user_profile
 from modules.debug import debug_menu
 from modules.credits import view_credits
+from utils.replica import replica
+import utils.dbaccess as db
 
 def intro() -> int:
     """Entry point to the game. Logs the player in and returns the relevant user ID."""
@@ -92,6 +94,12 @@ def quit_game() -> None:
 
 def main() -> None:
     """Outside of the game proper, this is the main loop of the program."""
+    try:
+        db.check_schema()
+    except RuntimeError as e:
+        sys.exit(str(e))
+    if Config.USE_REPLICA:
+        replica.refresh()
     user_id = intro()
     while True:
         main_menu(user_id)
@@ -4,6 +4,10 @@ Debug functions only accessible to the admin that can modify important aspects o
 
 import utils.dbaccess as db
 from modules.play_game import game_loop
+from utils.instrumentation import stats
+
+# rows shown at a time when listing players or scores
+PAGE_SIZE = 25
 
 def debug_menu(admin_id: int) -> None:
     """Displays the debug menu, which is only viewable as the admin."""
@@ -12,8 +16,10 @@ def debug_menu(admin_id: int) -> None:
 2. View all scores
 3. Remove a player
 4. Remove a score
-5. Play a debug game
-6. Return to main menu
+5. Purge old or low scores
+6. Play a debug game
+7. View slowest queries
+8. Return to main menu
 """
     managing = True
     while managing:
@@ -21,20 +27,59 @@ def debug_menu(admin_id: int) -> None:
         choice = int(input("What would you like to do? "))
         match choice:
             case 1:
-                table = db.generate_player_table()
-                print(table)
+                view_players()
             case 2:
-                table = db.generate_score_table()
-                print(table)
+                view_scores()
             case 3:
                 remove_player()
             case 4:
                 remove_score()
             case 5:
-                game_loop(admin_id, debug_mode=True)
+                purge_scores()
             case 6:
+                game_loop(admin_id, debug_mode=True)
+            case 7:
+                view_slowest_queries()
+            case 8:
                 managing = False
 
+def page_through(pages) -> None:
+    """Prints one page at a time, waiting for the admin between pages."""
+    shown = False
+    for page in pages:
+        shown = True
+        print(page)
+        if input("Press ENTER for the next page, or Q to stop. ").lower() == "q":
+            return
+    if not shown:
+        print("Nothing found.")
+    else:
+        print("No more results.")
+
+def optional(prompt: str) -> str | None:
+    """Asks for a filter value, where a blank answer means no filter."""
+    answer = input(prompt).strip()
+    return answer if answer != "" else None
+
+def view_players() -> None:
+    """Lists the players a page at a time, optionally filtered by username."""
+    username = optional("Filter by username (% matches anything, blank for all): ")
+    page_through(db.iter_player_pages(PAGE_SIZE, username))
+
+def view_scores() -> None:
+    """Lists the scores a page at a time, optionally filtered by player,
+    by the dates they were earned between, and by episode."""
+    username = optional("Filter by username (blank for all): ")
+    start_date = optional("Earned on or after (yyyy-mm-dd, blank for any): ")
+    end_date = optional("Earned on or before (yyyy-mm-dd, blank for any): ")
+    episode_id = optional("Filter by episodeID (blank for all): ")
+    page_through(db.iter_score_pages(
+        PAGE_SIZE,
+        username,
+        start_date,
+        end_date,
+        int(episode_id) if episode_id is not None else None))
+
 def remove_score() -> None:
     """Removes a score from the scores table."""
     removing_score = True
@@ -58,26 +103,51 @@ def remove_score() -> None:
                 removing_score = False
 
 def remove_player() -> None:
-    """Removes a player (and their associated scores) from the database."""
+    """Removes one or more players (and their associated scores) from the database,
+    all in one transaction."""
     removing_player = True
     while removing_player:
-        player_to_remove = input("What player would you like to remove? ")
-        check = db.check_username_exists(player_to_remove)
-        if check is False:
-            print(f"No player found with username {player_to_remove}")
+        answer = input("What player(s) would you like to remove? (separate with commas) ")
+        usernames = [username.strip() for username in answer.split(",") if username.strip() != ""]
+        missing = [username for username in usernames if not db.check_username_exists(username)]
+        for username in missing:
+            print(f"No player found with username {username}")
+        usernames = [username for username in usernames if username not in missing]
+        if len(usernames) == 0:
             continue_removing = input("Try again? Y/N ")
             if continue_removing == "y":
                 continue
             elif continue_removing == "n":
                 removing_player = False
-        elif check is True:
+        else:
             confirm = input(
-                f"Are you sure you want to remove player {player_to_remove} and their scores? Y/N ")
+                f"Are you sure you want to remove {', '.join(usernames)} and their scores? Y/N ")
             if confirm == "y":
-                user_id = db.get_user_id(player_to_remove)
-                db.delete_scores_by_player(user_id)
-                db.delete_player(user_id)
-                print(f"Player #{user_id} {player_to_remove} removed from database.")
+                players, scores = db.remove_players(usernames)
+                print(f"{players} player(s) and {scores} score(s) removed from database.")
                 removing_player = False
             elif confirm == "n":
                 removing_player = False
+
+def purge_scores() -> None:
+    """Deletes every score older than a date and/or below a value."""
+    older_than = optional("Purge scores earned before (yyyy-mm-dd, blank for any date): ")
+    below = optional("Purge scores below (blank for any score): ")
+    if older_than is None and below is None:
+        print("Nothing to purge by.")
+        return
+    description = " and ".join(
+        ([f"earned before {older_than}"] if older_than is not None else []) +
+        ([f"below {below}"] if below is not None else []))
+    confirm = input(f"Are you sure you want to delete every score {description}? Y/N ")
+    if confirm == "y":
+        purged = db.purge_scores(older_than, int(below) if below is not None else None)
+        print(f"{purged} score(s) removed.")
+
+def view_slowest_queries() -> None:
+    """Shows the queries this session has spent the longest on, per call."""
+    if len(stats.queries) == 0:
+        print("No queries recorded yet. (Is INSTRUMENT turned off?)")
+        return
+    print(stats.slowest())
+    print(f"{stats.connections} connection(s) borrowed, {stats.tunnels} tunnel(s) started.")
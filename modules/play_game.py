@@ -4,25 +4,19 @@ Plays a game of Jeopardy.
 
 from thefuzz import fuzz, process
 import utils.dbaccess as db
-from altconfig import Config
+from utils.settings import Config
+from utils.board import Board
+from utils.prefetch import prefetcher
 import modules.build_game as build
 
-def play_game(episode_id: int,
+def play_game(board: Board,
               what_round: str,
               current_score: int = 0,
               debug_mode: bool = False) -> int:
     """
-    I want to implement caching to make the gameplay less annoying with the
-    slow connection speed. Probably the best way to do it is to save the
-    CategoriesWithValues object, rather than recreating it every time.
-
-    This function first gets all the categories and only does it once. That's
-    fine. The problem is getting the clues. Right now it only gets a clue if 
-    the player selects a value, and that's a big performance problem.
-
-    First brainwave is to make a new function that gets all of the clues and
-    pairs them to a value. The question is how do I then mark those as completed
-    and still include them in the table?
+    Plays a single round (Regular or Double) of the episode on the board.
+    The board already holds every clue in the episode, so choosing a clue
+    is a local lookup rather than a trip to the database.
     """
 
     if debug_mode is True:
@@ -37,7 +31,7 @@ def play_game(episode_id: int,
         case "Double":
             value_set = Config.VALUE_DOUBLE
 
-    categories = db.get_categories(episode_id, what_round)
+    categories = board.categories(what_round)
     lower_case_categories = []
     category_value_dicts = []
     for category in categories:
@@ -62,7 +56,6 @@ def play_game(episode_id: int,
                 print("Invalid category! (Try copy and pasting!)")
             else:
                 category_not_chosen = False
-        category_id = db.get_category_id(episode_id, lowercase_category)
 
         value_not_chosen = True
         no_answer = True
@@ -90,7 +83,7 @@ def play_game(episode_id: int,
                 if category_should_be_removed:
                     categories.remove(found_category)
 
-        clue = db.get_clue(category_id, value)
+        clue = board.clue(what_round, lowercase_category, value)
         question, correct_answer = clue[0], clue[1].lower() # type: ignore
         print(question)
         player_answer = input("What is... ").lower()
@@ -108,7 +101,7 @@ def play_game(episode_id: int,
 
     return player_bank
 
-def play_final_jeopardy(episode_id: int, player_score: int = 0, debug_mode: bool = False) -> int:
+def play_final_jeopardy(board: Board, player_score: int = 0, debug_mode: bool = False) -> int:
     """Runs a round of Final Jeopardy. The player can bet any amount of their current score, and
     that amount will be added or subtracted depending on if they get it right. The resulting score
     is the final score."""
@@ -120,7 +113,7 @@ def play_final_jeopardy(episode_id: int, player_score: int = 0, debug_mode: bool
         return amount
 
     final_score = player_score
-    fj_tuple = db.get_final_jeopardy(episode_id)
+    fj_tuple = board.final_jeopardy()
     category, question, correct_answer = fj_tuple
     print(f"The category is {category}!")
     bidding_not_complete = True
@@ -154,11 +147,14 @@ def game_loop(user_id: int, debug_mode: bool = False) -> None:
     Two rounds of Jeopardy are played, Regular and Double,
     followed by Final Jeopardy. After each round, 
     play_game and play_fj pass the modified score to the
-    next round (or the end)."""
+    next round (or the end). A random board for the next game
+    is loaded in the background while this one is played."""
     warning = """
     NOTE: If you are asked a question that begins with "null", the answer is the exact text of the question.
 This is because the question is missing on j-archive, and the selected value is a placeholder.
 """
+    # start loading a random board while the player reads the warning
+    prefetcher.preload_random(user_id)
     print(warning)
     choice = input("Do you want to start with a specific game? Y/N ")
     if choice == "y":
@@ -169,20 +165,21 @@ This is because the question is missing on j-archive, and the selected value is
             if episode_id is None:
                 continue
             date_not_chosen = False
+        board = db.get_board(episode_id)
+        prefetcher.playing(episode_id, user_id)
     elif choice == "n":
-        episode_id = db.get_random_ep()
+        board = prefetcher.random_board(user_id)
     else:
         print("Invalid response, getting random game...")
-        episode_id = db.get_random_ep()
-    ep_title = db.get_ep_title(episode_id)
-    print(f"Selected episode {ep_title}!")
+        board = prefetcher.random_board(user_id)
+    print(f"Selected episode {board.title}!")
     print("Let's begin our first round...")
-    score = play_game(episode_id, "Regular", debug_mode=debug_mode)
+    score = play_game(board, "Regular", debug_mode=debug_mode)
     print(f"Your score is {score} - it's time for Double Jeopardy!")
-    double_score = play_game(episode_id, "Double", score, debug_mode=debug_mode)
+    double_score = play_game(board, "Double", score, debug_mode=debug_mode)
     print(f"Great job! Your score after Double Jeopardy is {double_score}")
     print("It's time for Final Jeopardy...")
-    final_score = play_final_jeopardy(episode_id, double_score, debug_mode=debug_mode)
-    db.write_score(episode_id, user_id, final_score)
+    final_score = play_final_jeopardy(board, double_score, debug_mode=debug_mode)
+    db.write_score(board.episode_id, user_id, final_score)
     print(f"Your final score is {final_score}!")
     print("Thanks for playing!")
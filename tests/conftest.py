@@ -0,0 +1,18 @@
+"""
+Puts the repo root and utils/ on the path, the way the game (which runs
+from the root) and the server-side scripts (which run from utils/) see
+them, along with benchmarks/ for its synthetic episodes, and points the
+game and the builder at the in-memory backend.
+"""
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "utils"))
+sys.path.insert(2, os.path.join(ROOT, "benchmarks"))
+
+# read when the game's and the builder's modules are first imported
+os.environ["BACKEND"] = "memory"
+os.environ["INSTRUMENT"] = "false"
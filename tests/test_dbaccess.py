@@ -0,0 +1,304 @@
+"""
+Tests the game's database access (utils/dbaccess.py) on a fresh in-memory
+backend per test, filled with synthetic episodes (see benchmarks/synthetic.py)
+by the builder: the leaderboards kept up to date as scores are written,
+the schema check the game runs at startup, random episode picks (see
+utils/episodepicker.py), boards served from a local replica (see
+utils/replica.py) synced from the backend, and the admin menu's
+keyset-paginated listings and batched deletions.
+"""
+
+import io
+from contextlib import redirect_stdout
+import pytest
+import dbbuilder
+import schema
+import synthetic
+import utils.access_queries as access_queries
+import utils.dbaccess as db
+import utils.episodepicker
+import utils.replica
+from utils.access_queries import LEADERBOARD_SIZE, LEADERBOARD_PERIODS
+from utils.backend import MemoryBackend
+from utils.episodepicker import EpisodePicker
+from utils.replica import Replica
+from utils.settings import Config
+
+EPISODES = 10
+
+@pytest.fixture
+def memory(monkeypatch):
+    """Points dbaccess and the builder at a fresh in-memory database
+    holding EPISODES synthetic episodes."""
+    backend = MemoryBackend(name="test_dbaccess")
+    monkeypatch.setattr(db, "backend", backend)
+    monkeypatch.setattr(db, "q", backend.queries(access_queries))
+    monkeypatch.setattr(dbbuilder, "backend", backend)
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest(synthetic.dump_entries(EPISODES))
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def picker(memory, monkeypatch):
+    """A fresh episode picker on the in-memory database, standing in for
+    dbaccess's. Its list only goes stale after an hour."""
+    monkeypatch.setattr(utils.episodepicker, "backend", memory)
+    monkeypatch.setattr(utils.episodepicker, "q", memory.queries(access_queries))
+    fresh = EpisodePicker(refresh_seconds=3600)
+    monkeypatch.setattr(db, "picker", fresh)
+    return fresh
+
+@pytest.fixture
+def replica(memory, tmp_path, monkeypatch):
+    """A replica in a temporary file, synced from the in-memory database,
+    standing in for dbaccess's replica. It is switched on in the config."""
+    monkeypatch.setattr(utils.replica, "backend", memory)
+    monkeypatch.setattr(utils.replica, "q", memory.queries(access_queries))
+    local = Replica(str(tmp_path / "clues.sqlite3"))
+    monkeypatch.setattr(db, "replica", local)
+    monkeypatch.setattr(Config, "USE_REPLICA", True)
+    return local
+
+def execute(backend, query: str, args=None) -> list[tuple]:
+    with backend.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, args)
+        return cur.fetchall()
+
+def add_player(backend, username: str) -> int:
+    """Adds a player without hashing a password, which is slow on purpose."""
+    execute(backend, "INSERT INTO players (username, password_hash) VALUES (%s, 'x')", (username,))
+    return db.get_user_id(username)
+
+def leaderboard_scores(backend, period: str) -> list[int]:
+    rows = execute(backend, "SELECT score FROM leaderboard WHERE period = %s ORDER BY score DESC", (period,))
+    return [int(row[0]) for row in rows]
+
+def test_write_score_fills_every_period(memory):
+    user_id = add_player(memory, "player")
+    db.write_score(1, user_id, 5000)
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == [5000]
+        assert [row[:2] for row in db.get_leaderboard(period)] == [("player", 5000)]
+
+def test_trim_keeps_ties_with_last_place(memory):
+    user_id = add_player(memory, "player")
+    scores = [1000 + n for n in range(1, LEADERBOARD_SIZE)] + [500, 500, 500]
+    for score in scores:
+        db.write_score(1, user_id, score)
+    # three scores tie for last place, so all of them stay
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == sorted(scores, reverse=True)
+    db.write_score(1, user_id, 2000)
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == [2000] + sorted(scores[:-3], reverse=True)
+        assert len(db.get_leaderboard(period)) == LEADERBOARD_SIZE
+
+def test_rebuild_refills_the_leaderboard_after_a_delete(memory):
+    user_id = add_player(memory, "player")
+    scores = [100 * n for n in range(1, LEADERBOARD_SIZE + 3)]
+    for score in scores:
+        db.write_score(1, user_id, score)
+    assert leaderboard_scores(memory, "alltime") == sorted(scores, reverse=True)[:LEADERBOARD_SIZE]
+    (top_id,) = execute(memory, "SELECT scoreID FROM highscores WHERE score = %s", (max(scores),))[0]
+    db.delete_score_by_score_id(top_id)
+    # the score that had been trimmed comes back to fill the gap
+    remaining = sorted(scores, reverse=True)[1:LEADERBOARD_SIZE + 1]
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == remaining
+
+def test_rows_from_ended_periods_are_dropped(memory):
+    user_id = add_player(memory, "player")
+    db.write_score(1, user_id, 100)
+    (score_id,) = execute(memory, "SELECT scoreID FROM highscores")[0]
+    for period in ("weekly", "daily"):
+        execute(memory, "INSERT INTO leaderboard VALUES (%s, '2000-01-03', %s, 9999)", (period, score_id))
+    db.write_score(1, user_id, 200)
+    assert execute(memory, "SELECT COUNT(*) FROM leaderboard WHERE periodStart = '2000-01-03'") == [(0,)]
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == [200, 100]
+
+def test_schema_check_needs_the_migrations_the_game_uses(memory, monkeypatch):
+    assert schema.MIGRATIONS[-1][0] >= access_queries.SCHEMA_VERSION
+    db.check_schema()
+    # a MySQL database the builder has never migrated has no schema_version table
+    monkeypatch.setattr(memory, "dialect", "mysql")
+    with pytest.raises(RuntimeError, match="builddatabase"):
+        db.check_schema()
+    execute(memory, "CREATE TABLE schema_version (version INTEGER, description TEXT, applied TEXT)")
+    execute(memory, "INSERT INTO schema_version VALUES (%s, '', '')",
+            (access_queries.SCHEMA_VERSION - 1,))
+    with pytest.raises(RuntimeError, match="builddatabase"):
+        db.check_schema()
+    execute(memory, "INSERT INTO schema_version VALUES (%s, '', '')",
+            (access_queries.SCHEMA_VERSION,))
+    db.check_schema()
+
+def board_contents(board) -> tuple:
+    """Everything a game reads from a board."""
+    clues = [(what_round, category, value, board.clue(what_round, category, value))
+             for what_round, values in (("Regular", Config.VALUE_REGULAR), ("Double", Config.VALUE_DOUBLE))
+             for category in board.categories(what_round)
+             for value in values]
+    return board.title, clues, board.final_jeopardy()
+
+def test_replica_serves_boards_once_synced(memory, replica, monkeypatch):
+    expected = board_contents(db.get_board(3))
+    # nothing has been synced yet, so the server answers
+    assert not replica.enabled
+    assert replica.sync() == EPISODES
+    assert replica.enabled
+    # with the server's copy gone, the board still comes back from the replica
+    execute(memory, "DELETE FROM clues")
+    assert board_contents(db.get_board(3)) == expected
+    assert db.get_ep_id_from_date(str(synthetic.airdate(2))) == 3
+    monkeypatch.setattr(Config, "USE_REPLICA", False)
+    assert not replica.enabled
+    with pytest.raises(ValueError):
+        db.get_board(3).final_jeopardy()
+
+def test_replica_sync_copies_only_new_episodes(memory, replica):
+    assert replica.sync() == EPISODES
+    assert replica.sync() == 0
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest(synthetic.dump_entries(5, start=EPISODES))
+    assert replica.sync() == 5
+    assert sorted(replica.episode_ids()) == list(range(1, EPISODES + 6))
+    assert board_contents(replica.get_board(EPISODES + 5)) == board_contents(db.get_board(EPISODES + 5))
+
+def add_scores(backend, rows: list[tuple[int, int, int, str]]) -> list[int]:
+    """Adds (episode, player, score, earned date) rows straight to highscores
+    and returns their score IDs, in the order given."""
+    for row in rows:
+        execute(backend, "INSERT INTO highscores (epID, player, score, date) VALUES (%s, %s, %s, %s)", row)
+    return [int(row[0]) for row in execute(backend, "SELECT scoreID FROM highscores ORDER BY scoreID")]
+
+def page_ids(pages) -> list[list[int]]:
+    return [[int(row[0]) for row in page.rows] for page in pages]
+
+def test_score_pages_cover_every_score_once(memory):
+    alice, bob = add_player(memory, "alice"), add_player(memory, "bob")
+    # every score ties, so only scoreID can keep the order stable across pages
+    score_ids = add_scores(memory, [(1, alice if n % 2 else bob, 500, f"2024-05-{n + 1:02d} 12:00:00")
+                                    for n in range(10)])
+    pages = page_ids(db.iter_score_pages(page_size=4))
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert sum(pages, []) == score_ids
+    # a full last page is followed by no empty one
+    assert [len(page) for page in page_ids(db.iter_score_pages(page_size=5))] == [5, 5]
+
+def test_score_pages_filter_by_player_date_and_episode(memory):
+    alice, bob = add_player(memory, "alice"), add_player(memory, "bob")
+    score_ids = add_scores(memory, [
+        (1, alice, 100, "2024-05-01 09:00:00"),
+        (2, bob, 200, "2024-05-02 23:59:59"),
+        (1, alice, 300, "2024-05-03 00:00:00"),
+        (2, alice, 400, "2024-05-04 12:00:00"),
+        (1, bob, 500, "2024-05-05 12:00:00")])
+    assert sum(page_ids(db.iter_score_pages(page_size=2, username="alice")), []) == [
+        score_ids[0], score_ids[2], score_ids[3]]
+    # the date range is inclusive at both ends, whatever the time of day
+    assert sum(page_ids(db.iter_score_pages(start_date="2024-05-02", end_date="2024-05-04")), []) == score_ids[1:4]
+    assert sum(page_ids(db.iter_score_pages(episode_id=2)), []) == [score_ids[1], score_ids[3]]
+    assert sum(page_ids(db.iter_score_pages(username="bob", episode_id=1)), []) == [score_ids[4]]
+    assert page_ids(db.iter_score_pages(username="nobody")) == []
+
+def test_player_pages_filter_by_pattern(memory):
+    user_ids = [add_player(memory, f"player{n}") for n in range(7)] + [add_player(memory, "admin")]
+    pages = page_ids(db.iter_player_pages(page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 2]
+    assert sum(pages, []) == user_ids
+    assert sum(page_ids(db.iter_player_pages(page_size=3, username="player%")), []) == user_ids[:7]
+
+def player_names(backend) -> list[str]:
+    return [str(row[0]) for row in execute(backend, "SELECT username FROM players ORDER BY userID")]
+
+def test_remove_players_removes_their_scores_and_refills_the_leaderboards(memory):
+    alice, bob = add_player(memory, "alice"), add_player(memory, "bob")
+    carol = add_player(memory, "carol")
+    bob_scores = [100 * n for n in range(1, LEADERBOARD_SIZE + 1)]
+    for score in bob_scores:
+        db.write_score(1, bob, score)
+    for score in (5000, 6000, 7000):
+        db.write_score(2, alice, score)
+    db.write_score(3, carol, 50)
+    # alice's scores pushed bob's lowest three off every leaderboard
+    assert leaderboard_scores(memory, "alltime")[:3] == [7000, 6000, 5000]
+    assert db.remove_players(["alice", "carol", "nobody"]) == (2, 4)
+    assert player_names(memory) == ["bob"]
+    assert execute(memory, "SELECT COUNT(*) FROM highscores WHERE player IN (%s, %s)", (alice, carol)) == [(0,)]
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == sorted(bob_scores, reverse=True)
+
+def test_remove_players_rolls_back_when_a_deletion_fails(memory, monkeypatch):
+    alice = add_player(memory, "alice")
+    for score in (100, 200):
+        db.write_score(1, alice, score)
+    monkeypatch.setattr(db.q, "DELETE_PLAYER", "DELETE FROM no_such_table WHERE userID = %s")
+    with redirect_stdout(io.StringIO()):
+        assert db.remove_players(["alice"]) == (0, 0)
+    # the scores and leaderboard rows deleted before the failure are back
+    assert player_names(memory) == ["alice"]
+    assert execute(memory, "SELECT COUNT(*) FROM highscores") == [(2,)]
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == [200, 100]
+
+def test_purge_scores_by_value_refills_the_leaderboards(memory):
+    alice = add_player(memory, "alice")
+    scores = [100 * n for n in range(1, LEADERBOARD_SIZE + 4)]
+    for score in scores:
+        db.write_score(1, alice, score)
+    assert db.purge_scores(below=1200) == 11
+    for period in LEADERBOARD_PERIODS:
+        assert leaderboard_scores(memory, period) == [1300, 1200]
+    with pytest.raises(ValueError):
+        db.purge_scores()
+
+def test_purge_scores_by_date(memory):
+    alice = add_player(memory, "alice")
+    add_scores(memory, [(1, alice, 100, "2019-12-31 23:59:59"), (1, alice, 100, "2020-01-01 00:00:00")])
+    db.write_score(1, alice, 300)
+    assert db.purge_scores(older_than="2020-01-01") == 1
+    assert db.purge_scores(older_than="2020-01-02", below=200) == 1
+    assert execute(memory, "SELECT score FROM highscores") == [(300,)]
+    assert leaderboard_scores(memory, "alltime") == [300]
+
+def picks(count: int = 300, **filters) -> set[int]:
+    return {db.get_random_ep(**filters) for _ in range(count)}
+
+def test_random_picks_cover_every_episode(picker):
+    assert picks() == set(range(1, EPISODES + 1))
+
+def test_complete_only_skips_episodes_with_missing_clues(memory, picker):
+    execute(memory, "UPDATE clues SET question = 'null_J_1_1' WHERE clueID = "
+                    "(SELECT MIN(clueID) FROM clues JOIN categories USING (categoryID) WHERE episodeID = 4)")
+    assert 4 in picks(complete_only=False)
+    assert picks(complete_only=True) == set(range(1, EPISODES + 1)) - {4}
+
+def test_exclude_played_skips_scored_and_just_played_episodes(memory, picker):
+    alice = add_player(memory, "alice")
+    add_scores(memory, [(episode_id, alice, 100, "2024-05-01 12:00:00") for episode_id in range(1, 9)])
+    assert picks(user_id=alice, exclude_played=True, just_played={9}) == {10}
+    assert picks(user_id=alice, exclude_played=False, just_played={9}) == set(range(1, EPISODES + 1))
+    with pytest.raises(ValueError):
+        db.get_random_ep(alice, exclude_played=True, just_played={9, 10})
+
+def test_random_filters_follow_the_config_when_called(memory, picker, monkeypatch):
+    alice = add_player(memory, "alice")
+    add_scores(memory, [(episode_id, alice, 100, "2024-05-01 12:00:00") for episode_id in range(1, 10)])
+    monkeypatch.setattr(Config, "RANDOM_EXCLUDE_PLAYED", True)
+    assert picks(user_id=alice) == {10}
+    monkeypatch.setattr(Config, "RANDOM_EXCLUDE_PLAYED", False)
+    assert picks(user_id=alice) == set(range(1, EPISODES + 1))
+
+def test_picker_reloads_its_list_when_the_filters_rule_out_every_episode(memory, picker):
+    alice = add_player(memory, "alice")
+    add_scores(memory, [(episode_id, alice, 100, "2024-05-01 12:00:00") for episode_id in range(1, EPISODES + 1)])
+    assert picks() == set(range(1, EPISODES + 1))
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest(synthetic.dump_entries(3, start=EPISODES))
+    # the cached list isn't stale yet, so unfiltered picks don't see the new episodes...
+    assert picks() == set(range(1, EPISODES + 1))
+    # ...but a pick with nothing left to choose from reloads it
+    assert picks(user_id=alice, exclude_played=True) == {EPISODES + 1, EPISODES + 2, EPISODES + 3}
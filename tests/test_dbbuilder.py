@@ -0,0 +1,155 @@
+"""
+Tests the builder's batched and parallel ingest with synthetic episodes
+(see benchmarks/synthetic.py), on the SQLite backends and, when one is
+available, on a MySQL or MariaDB server. The server is only used if
+TEST_MYSQL_HOST is set; for example, with a throwaway container:
+
+    docker run --rm -d -p 3306:3306 -e MARIADB_ALLOW_EMPTY_ROOT_PASSWORD=1 \
+        -e MARIADB_DATABASE=jenopardy_test mariadb --local-infile=1
+    TEST_MYSQL_HOST=127.0.0.1 python -m pytest tests/test_dbbuilder.py
+
+TEST_MYSQL_PORT, TEST_MYSQL_USER, TEST_MYSQL_PASSWORD, and TEST_MYSQL_DATABASE
+default to 3306, root, no password, and jenopardy_test. The tests empty the
+episode tables of that database.
+"""
+
+import io
+import os
+from contextlib import contextmanager, redirect_stdout
+import pymysql
+import pytest
+import builder_queries
+import dbbuilder
+import schema
+import synthetic
+from backend import MemoryBackend, MySQLBackend, SQLiteBackend
+
+EPISODES = 200
+EPISODE_TABLES = ("clues", "categories", "episodes")
+
+@pytest.fixture
+def sqlite_file(tmp_path, monkeypatch):
+    """Points the builder at a fresh SQLite file."""
+    backend = SQLiteBackend(str(tmp_path / "builder.sqlite3"))
+    monkeypatch.setattr(dbbuilder, "backend", backend)
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def memory(monkeypatch):
+    """Points the builder at a fresh in-memory database."""
+    backend = MemoryBackend(name="test_dbbuilder")
+    monkeypatch.setattr(dbbuilder, "backend", backend)
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def mysql(monkeypatch):
+    """Points the builder at the test MySQL server, with empty episode tables."""
+    if not os.getenv("TEST_MYSQL_HOST"):
+        pytest.skip("set TEST_MYSQL_HOST to test against a MySQL or MariaDB server")
+
+    @contextmanager
+    def connect():
+        conn = pymysql.connect(
+            host=os.getenv("TEST_MYSQL_HOST"),
+            port=int(os.getenv("TEST_MYSQL_PORT", "3306")),
+            user=os.getenv("TEST_MYSQL_USER", "root"),
+            passwd=os.getenv("TEST_MYSQL_PASSWORD", ""),
+            db=os.getenv("TEST_MYSQL_DATABASE", "jenopardy_test"),
+            local_infile=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    backend = MySQLBackend(connect)
+    with connect() as conn, redirect_stdout(io.StringIO()):
+        schema.apply_migrations(conn)
+        cur = conn.cursor()
+        for table in EPISODE_TABLES:
+            cur.execute(f"DELETE FROM {table}")
+        conn.commit()
+    monkeypatch.setattr(dbbuilder, "backend", backend)
+    monkeypatch.setattr(dbbuilder, "q", backend.queries(builder_queries))
+    monkeypatch.setattr(dbbuilder, "DatabaseError", backend.Error)
+    monkeypatch.setattr(dbbuilder.Config, "LOCAL_INFILE", True)
+    yield backend
+
+@pytest.fixture(params=["sqlite_file", "mysql"])
+def writers(request):
+    """A backend that takes several writers at once: a SQLite file, or the test server."""
+    return request.getfixturevalue(request.param)
+
+def count(backend, table: str) -> int:
+    with backend.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        return int(cur.fetchone()[0])
+
+def edited_entries(count_: int) -> list:
+    """The synthetic episodes, with the first clue of every episode rewritten."""
+    entries = []
+    for file, rounds in synthetic.dump_entries(count_):
+        category = synthetic.REGULAR_CATEGORIES[0]
+        clues = rounds[0][category]
+        first = next(iter(clues))
+        rounds[0][category] = {f"{first} (edited)": clues[first],
+                               **{clue: answer for clue, answer in clues.items() if clue != first}}
+        entries.append((file, rounds))
+    return entries
+
+def edited_clues(backend) -> int:
+    with backend.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM clues WHERE question LIKE '%(edited)'")
+        return int(cur.fetchone()[0])
+
+@pytest.mark.parametrize("strategy", sorted(dbbuilder.INGEST_STRATEGIES))
+def test_ingest_writes_every_episode(memory, strategy):
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest(synthetic.dump_entries(30), strategy=strategy)
+    assert count(memory, "episodes") == 30
+    assert count(memory, "categories") == 30 * 13
+    assert count(memory, "clues") == 30 * 61
+
+def test_ingest_updates_existing_episodes_in_place(memory):
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest(synthetic.dump_entries(30))
+        dbbuilder.ingest(edited_entries(30))
+    assert count(memory, "episodes") == 30
+    assert count(memory, "clues") == 30 * 61
+    assert edited_clues(memory) == 30
+
+@pytest.mark.parametrize("strategy", sorted(dbbuilder.INGEST_STRATEGIES))
+def test_parallel_ingest_inserts_and_updates_every_episode(writers, strategy):
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest_parallel(synthetic.dump_entries(EPISODES), workers=4, strategy=strategy)
+    assert count(writers, "episodes") == EPISODES
+    assert count(writers, "clues") == EPISODES * 61
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest_parallel(edited_entries(EPISODES), workers=4, strategy=strategy)
+    assert count(writers, "episodes") == EPISODES
+    assert edited_clues(writers) == EPISODES
+
+def test_parallel_ingest_keeps_duplicate_titles_in_order(writers):
+    entries = list(synthetic.dump_entries(20)) + edited_entries(20)
+    with redirect_stdout(io.StringIO()):
+        dbbuilder.ingest_parallel(entries, workers=4)
+    assert count(writers, "episodes") == 20
+    assert edited_clues(writers) == 20
+
+def test_failed_batch_is_raised_not_skipped(memory, monkeypatch):
+    def fail(cur, episodes):
+        cur.execute("INSERT INTO no_such_table VALUES (1)")
+    monkeypatch.setitem(dbbuilder.INGEST_STRATEGIES, "executemany", fail)
+    with redirect_stdout(io.StringIO()), pytest.raises(memory.Error):
+        dbbuilder.ingest(synthetic.dump_entries(5), strategy="executemany")
+    assert count(memory, "episodes") == 0
+
+def test_closed_memory_backend_raises_its_error():
+    backend = MemoryBackend(name="test_dbbuilder_closed")
+    backend.close()
+    with pytest.raises(backend.Error, match="closed"):
+        with backend.connection():
+            pass
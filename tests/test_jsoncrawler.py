@@ -0,0 +1,200 @@
+"""
+Tests the crawler's fetch stage against a local HTTP server standing in
+for j-archive: the shared rate limit, retrying with backoff when the
+server fails or throttles, and skipping episodes that can't be fetched.
+Also checks the single-pass get_clues against the old find_all scan over
+the saved pages in benchmarks/pages.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+import requests
+from bs4 import BeautifulSoup
+import jsoncrawler as jc
+from crawlmanifest import CrawlManifest
+from pagecache import PageCache
+from parse_clues import PAGES, get_clues_scan, load_rounds
+
+SEASONS = 3
+EPISODES = ("1", "2", "3", "4")
+
+class FixtureServer():
+    """A small stand-in for j-archive. Episode pages are shaped by their game_id:
+    "fail" always answers 500, and any game_id listed in `flaky` answers 503
+    (or 429, if listed in `throttled`) that many times before it succeeds."""
+
+    def __init__(self):
+        self.requests: list[tuple[float, str]] = []
+        self.flaky: dict[str, int] = {}
+        self.throttled: set[str] = set()
+        self.broken: set[str] = set()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def handler(self) -> type[BaseHTTPRequestHandler]:
+        """Builds the request handler, bound to this server's state."""
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self): # pylint: disable=invalid-name
+                fixture.answer(self)
+
+            def log_message(self, format, *args): # pylint: disable=redefined-builtin
+                pass
+
+        return Handler
+
+    def answer(self, request: BaseHTTPRequestHandler) -> None:
+        """Serves one request."""
+        parsed = urlparse(request.path)
+        game_id = parse_qs(parsed.query).get("game_id", [""])[0]
+        with self._lock:
+            self.requests.append((time.monotonic(), request.path))
+            failures_left = self.flaky.get(game_id, 0)
+            if failures_left > 0:
+                self.flaky[game_id] = failures_left - 1
+        if parsed.path == "/listseasons.php":
+            body = "".join(f'<a href="showseason.php?season={n}">Season {n}</a>' for n in range(SEASONS))
+        elif parsed.path == "/showseason.php":
+            body = "".join(f'<a href="showgame.php?game_id={game_id}">Game</a>' for game_id in EPISODES)
+        elif game_id in self.broken:
+            request.send_response(500)
+            request.end_headers()
+            return
+        elif failures_left > 0:
+            if game_id in self.throttled:
+                request.send_response(429)
+                request.send_header("Retry-After", "1")
+            else:
+                request.send_response(503)
+            request.end_headers()
+            return
+        else:
+            body = f'<div id="game_title"><h1>Show #{game_id}</h1></div>'
+        content = f"<html><body>{body}</body></html>".encode("utf-8")
+        request.send_response(200)
+        request.send_header("Content-Length", str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+
+    def episode_requests(self, game_id: str) -> list[float]:
+        """The times an episode page was requested."""
+        return [at for at, path in self.requests if path.endswith(f"game_id={game_id}")]
+
+@pytest.fixture
+def server():
+    """Runs the fixture server for one test."""
+    fixture = FixtureServer()
+    thread = threading.Thread(target=fixture.server.serve_forever, daemon=True)
+    thread.start()
+    yield fixture
+    fixture.server.shutdown()
+    fixture.server.server_close()
+
+@pytest.fixture(autouse=True)
+def crawler(server, tmp_path, monkeypatch):
+    """Points the crawler at the fixture server, with a fresh session, page
+    cache, and fetch counts, short backoff, and a rate limit fast enough not
+    to slow the tests down."""
+    monkeypatch.setattr(jc, "ROOT_URL", server.url)
+    monkeypatch.setattr(jc, "SEASONS_URL", f"{server.url}listseasons.php")
+    monkeypatch.setattr(jc, "BACKOFF", 0.05)
+    monkeypatch.setattr(jc, "RETRIES", 3)
+    monkeypatch.setattr(jc, "session", jc.build_session())
+    monkeypatch.setattr(jc, "limiter", jc.RateLimiter(1000.0))
+    monkeypatch.setattr(jc, "_page_cache", PageCache(str(tmp_path / "htmlcache")))
+    monkeypatch.setattr(jc, "fetch_counts", jc.Counter())
+
+def episode_url(server: FixtureServer, game_id: str) -> str:
+    return f"{server.url}showgame.php?game_id={game_id}"
+
+def test_rate_limit_spaces_out_concurrent_requests(server, monkeypatch):
+    rate = 20.0
+    monkeypatch.setattr(jc, "limiter", jc.RateLimiter(rate))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(jc.fetch, [episode_url(server, game_id) for game_id in EPISODES * 2]))
+    starts = sorted(at for at, _ in server.requests)
+    assert len(starts) == len(EPISODES) * 2
+    # allow for scheduling jitter, but never a burst
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    assert min(gaps) > 0.5 / rate
+    assert starts[-1] - starts[0] >= (len(starts) - 1) / rate * 0.9
+
+def test_server_errors_are_retried_with_growing_backoff(server):
+    server.flaky["1"] = 3
+    assert "Show #1" in jc.fetch(episode_url(server, "1"))
+    attempts = server.episode_requests("1")
+    assert len(attempts) == 4
+    gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+    assert gaps[2] > gaps[1] > jc.BACKOFF
+
+def test_retries_are_held_to_the_rate_limit(server, monkeypatch):
+    rate = 10.0
+    monkeypatch.setattr(jc, "limiter", jc.RateLimiter(rate))
+    monkeypatch.setattr(jc, "BACKOFF", 0.001)
+    server.flaky["1"] = 3
+    assert "Show #1" in jc.fetch(episode_url(server, "1"))
+    attempts = server.episode_requests("1")
+    assert len(attempts) == 4
+    gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+    assert min(gaps) > 0.9 / rate
+
+def test_throttling_waits_for_retry_after(server):
+    server.flaky["1"] = 1
+    server.throttled.add("1")
+    assert "Show #1" in jc.fetch(episode_url(server, "1"))
+    first, second = server.episode_requests("1")
+    assert second - first >= 0.9
+
+def test_gives_up_after_the_last_retry(server):
+    server.broken.add("1")
+    with pytest.raises(requests.RequestException):
+        jc.fetch(episode_url(server, "1"))
+    assert len(server.episode_requests("1")) == jc.RETRIES + 1
+
+def test_fetch_stage_skips_episodes_that_fail(server, tmp_path):
+    server.broken.add("2")
+    server.flaky["3"] = 1
+    manifest = CrawlManifest(str(tmp_path / "crawl_manifest.json"))
+    changed = jc.fetch_stage(manifest, workers=2)
+    # the first two seasons listed are skipped, like on j-archive
+    assert changed == ["1", "3", "4"]
+    assert manifest.get("2") is None
+    assert episode_url(server, "2") not in jc.get_page_cache()
+    for game_id in changed:
+        assert episode_url(server, game_id) in jc.get_page_cache()
+    assert set(jc.fetch_counts) == set(EPISODES)
+
+def test_single_pass_get_clues_matches_the_find_all_scan():
+    rounds = load_rounds(PAGES)
+    assert len(rounds) > 0
+    for jround, is_double in rounds:
+        assert jc.get_clues(jround, is_double) == get_clues_scan(jround, is_double)
+
+def test_missing_cells_are_filled_with_placeholders():
+    with open(os.path.join(PAGES, "early", "show_0173.html"), encoding="utf-8") as file:
+        soup = BeautifulSoup(file.read(), "lxml")
+    regular, double, _ = jc.create_rounds(soup)
+    state_capitals = jc.get_clues(regular, is_double=False)["STATE CAPITALS"]
+    assert list(state_capitals)[-1] == "null_J_1_5"
+    assert state_capitals["null_J_1_5"] == "null_J_1_5_r"
+    the_stage = jc.get_clues(double, is_double=True)["THE STAGE"]
+    assert list(the_stage)[1:] == [f"null_DJ_5_{clue}" for clue in range(2, 6)]
+
+def test_page_cache_walks_its_directory_only_when_written(tmp_path, monkeypatch):
+    PageCache(str(tmp_path / "pages")).put("https://example.com/1", "<html>one</html>")
+    walks = []
+    original = PageCache._files
+    monkeypatch.setattr(PageCache, "_files", lambda cache: walks.append(1) or original(cache))
+    cache = PageCache(str(tmp_path / "pages"))
+    assert cache.get("https://example.com/1") == "<html>one</html>"
+    assert walks == []
+    cache.put("https://example.com/2", "<html>two</html>")
+    cache.put("https://example.com/3", "<html>three</html>")
+    assert walks == [1]
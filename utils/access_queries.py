@@ -2,6 +2,27 @@
 SQL queries used to access the database client-side.
 """
 
+# scores kept in each period of the leaderboard (ties with the last are kept too)
+LEADERBOARD_SIZE = 10
+LEADERBOARD_PERIODS = ("alltime", "weekly", "daily")
+
+# the schema migration the game's queries need (see schema.MIGRATIONS on the
+# server side); migration 3 added the leaderboard table that write_score fills
+SCHEMA_VERSION = 3
+
+# the first day of the current leaderboard period, given the period as a parameter
+PERIOD_START = """
+    CASE %s
+        WHEN 'daily' THEN CURDATE()
+        WHEN 'weekly' THEN CURDATE() - INTERVAL WEEKDAY(CURDATE()) DAY
+        ELSE DATE('1970-01-01')
+    END
+"""
+
+GET_SCHEMA_VERSION = """
+    SELECT COALESCE(MAX(version), 0) FROM schema_version
+"""
+
 INSERT_PLAYER = """
     INSERT INTO players
     (username, password_hash)
@@ -30,40 +51,93 @@ GET_USERNAME_BY_USERID = """
 """
 
 GET_RANDOM_EP = """
-    SELECT episodeID FROM episodes
-    ORDER BY RAND()
+    SELECT episodes.episodeID
+    FROM
+        episodes
+    JOIN
+        (SELECT FLOOR(MIN(episodeID) + RAND() * (MAX(episodeID) - MIN(episodeID) + 1)) AS pick
+         FROM episodes) AS r
+    WHERE episodes.episodeID >= r.pick
+    ORDER BY episodes.episodeID
     LIMIT 1;
 """
 
-GET_EPID_FROM_DATE = """
+GET_ALL_EPISODE_IDS = """
     SELECT episodeID FROM episodes
-    WHERE epdate >= %s AND epdate < %s + INTERVAL 1 DAY
 """
 
-GET_EP_TITLE = """
-    SELECT epTitle FROM episodes
-    WHERE episodeID = %s
+GET_INCOMPLETE_EPISODE_IDS = """
+    SELECT DISTINCT categories.episodeID
+    FROM
+        categories
+    LEFT JOIN
+        clues ON clues.categoryID = categories.categoryID
+    WHERE
+        categories.name LIKE 'null%' OR
+        clues.question LIKE 'null%'
+"""
+
+GET_PLAYED_EPISODE_IDS = """
+    SELECT DISTINCT epID FROM highscores
+    WHERE player = %s
 """
 
-GET_CATEGORIES = """
-    SELECT name FROM categories
-    WHERE episodeID = %s AND round = %s
-    ORDER BY position;
+# copying the clue corpus to the local replica, by episodeID range (low, high]
+# one snapshot for the whole of a replica sync
+SYNC_SNAPSHOT = """
+    START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY
 """
 
-GET_CATEGORY_ID = """
-    SELECT categoryID FROM categories
-    WHERE episodeID = %s AND name = %s
+GET_MAX_EPISODE_ID = """
+    SELECT MAX(episodeID) FROM episodes
 """
 
-GET_CLUE = """
-    SELECT question, answer FROM clues
-    WHERE categoryID = %s AND moneyvalue = %s
+SYNC_EPISODES = """
+    SELECT episodeID, epDate, epTitle FROM episodes
+    WHERE episodeID > %s AND episodeID <= %s
 """
 
-GET_CLUES = """
-    SELECT question, answer FROM clues
-    WHERE categoryID = %s
+SYNC_CATEGORIES = """
+    SELECT categoryID, name, round, position, episodeID FROM categories
+    WHERE episodeID > %s AND episodeID <= %s
+"""
+
+SYNC_CLUES = """
+    SELECT clues.clueID, clues.categoryID, clues.question, clues.answer, clues.moneyvalue
+    FROM
+        clues
+    JOIN
+        categories ON clues.categoryID = categories.categoryID
+    WHERE
+        categories.episodeID > %s AND categories.episodeID <= %s
+"""
+
+GET_EPID_FROM_DATE = """
+    SELECT episodeID FROM episodes
+    WHERE epdate >= %s AND epdate < %s + INTERVAL 1 DAY
+"""
+
+GET_BOARD = """
+    SELECT
+        episodes.epTitle,
+        categories.round,
+        categories.position,
+        categories.name,
+        clues.moneyvalue,
+        clues.question,
+        clues.answer
+    FROM
+        categories
+    JOIN
+        episodes ON categories.episodeID = episodes.episodeID
+    LEFT JOIN
+        clues ON clues.categoryID = categories.categoryID
+    WHERE
+        categories.episodeID = %s
+    ORDER BY
+        categories.round,
+        categories.position,
+        clues.moneyvalue
 """
 
 INSERT_SCORE = """
@@ -89,7 +163,8 @@ GET_SCORES = """
     LIMIT 10;
 """
 
-GET_ALL_SCORES = """
+# keyset-paginated listings for the admin menu; a None filter matches everything
+GET_SCORES_PAGE = """
     SELECT
         highscores.scoreID AS "Score ID",
         players.userID AS "User ID",
@@ -104,25 +179,112 @@ GET_ALL_SCORES = """
         players ON highscores.player = players.userID
     JOIN
         episodes ON highscores.epID = episodes.episodeID
+    WHERE
+        highscores.scoreID > %s AND
+        (%s IS NULL OR players.username = %s) AND
+        (%s IS NULL OR highscores.date >= %s) AND
+        (%s IS NULL OR highscores.date < %s + INTERVAL 1 DAY) AND
+        (%s IS NULL OR highscores.epID = %s)
     ORDER BY
         highscores.scoreID
+    LIMIT %s
 """
 
-GET_LEADERBOARD = """
+GET_PLAYERS_PAGE = """
+    SELECT
+        userID AS "User ID",
+        username AS "Username"
+    FROM
+        players
+    WHERE
+        userID > %s AND
+        (%s IS NULL OR username LIKE %s)
+    ORDER BY
+        userID
+    LIMIT %s
+"""
+
+GET_LEADERBOARD = f"""
     SELECT
         players.username,
         highscores.score,
         episodes.epTitle,
         highscores.date
     FROM
-        highscores
+        leaderboard
+    JOIN
+        highscores ON leaderboard.scoreID = highscores.scoreID
     JOIN
         players ON highscores.player = players.userID
     JOIN
         episodes ON highscores.epID = episodes.episodeID
+    WHERE
+        leaderboard.period = %s AND
+        leaderboard.periodStart = {PERIOD_START}
     ORDER BY
-        highscores.score DESC
-    LIMIT 10;
+        leaderboard.score DESC
+    LIMIT %s;
+"""
+
+INSERT_LEADERBOARD_ENTRY = f"""
+    INSERT INTO leaderboard
+    (period, periodStart, scoreID, score)
+    VALUES
+    (%s, {PERIOD_START}, %s, %s)
+"""
+
+GET_LEADERBOARD_CUTOFF = f"""
+    SELECT score FROM leaderboard
+    WHERE period = %s AND periodStart = {PERIOD_START}
+    ORDER BY score DESC
+    LIMIT 1 OFFSET %s
+"""
+
+# rows left over from earlier days and weeks, which no leaderboard reads again
+DELETE_STALE_LEADERBOARD = f"""
+    DELETE FROM leaderboard
+    WHERE period = %s AND periodStart < {PERIOD_START}
+"""
+
+TRIM_LEADERBOARD = f"""
+    DELETE FROM leaderboard
+    WHERE period = %s AND periodStart = {PERIOD_START} AND score < %s
+"""
+
+REBUILD_LEADERBOARD = f"""
+    INSERT IGNORE INTO leaderboard
+    (period, periodStart, scoreID, score)
+    SELECT %s, {PERIOD_START}, scoreID, score FROM highscores
+    WHERE date >= {PERIOD_START}
+    ORDER BY score DESC
+    LIMIT %s
+"""
+
+DELETE_LEADERBOARD_BY_SCOREID = """
+    DELETE FROM leaderboard
+    WHERE scoreID = %s
+"""
+
+DELETE_LEADERBOARD_BY_PLAYER = """
+    DELETE leaderboard FROM leaderboard
+    JOIN highscores ON leaderboard.scoreID = highscores.scoreID
+    WHERE highscores.player = %s
+"""
+
+# routine maintenance: a None criterion is ignored
+PURGE_LEADERBOARD_SCORES = """
+    DELETE leaderboard FROM leaderboard
+    JOIN highscores ON leaderboard.scoreID = highscores.scoreID
+    WHERE
+        (%s IS NULL OR highscores.date < %s) AND
+        (%s IS NULL OR highscores.score < %s)
+"""
+
+PURGE_SCORES = """
+    DELETE FROM highscores
+    WHERE
+        (%s IS NULL OR date < %s) AND
+        (%s IS NULL OR score < %s)
 """
 
 GET_SCORE_ID = """
@@ -144,13 +306,3 @@ DELETE_PLAYER = """
     DELETE FROM players
     WHERE userID = %s
 """
-
-GET_ALL_PLAYERS = """
-    SELECT 
-        userID AS "User ID",
-        username AS "Username"
-    FROM
-        players
-    ORDER BY
-        userID
-"""
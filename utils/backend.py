@@ -0,0 +1,466 @@
+"""
+The storage backends the game and the builder can run against, selected
+with Config.BACKEND:
+
+    mysql   the real database, through the SSH tunnel (the default)
+    sqlite  a local SQLite file (Config.SQLITE_FILE)
+    memory  an in-memory SQLite database that lasts as long as the process
+
+Every backend hands out connections that behave like pymysql's - cursor(),
+begin(), commit(), rollback(), and cursors whose execute() takes %s
+placeholders and returns the row count - so dbaccess and dbbuilder run the
+same code on all of them. The queries in access_queries and builder_queries
+that use MySQL-only syntax have SQLite versions in SQLITE_QUERIES, and
+queries() swaps them in for the SQLite backends.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from types import ModuleType, SimpleNamespace
+from typing import Any, Callable, ContextManager, Iterator
+from pymysql import MySQLError
+
+# the first day of the current leaderboard period, given the period as a parameter
+SQLITE_PERIOD_START = """
+    CASE %s
+        WHEN 'daily' THEN date('now', 'localtime')
+        WHEN 'weekly' THEN date('now', 'localtime', 'weekday 0', '-6 days')
+        ELSE '1970-01-01'
+    END
+"""
+
+SQLITE_NOW = "datetime('now', 'localtime')"
+
+SQLITE_RANDOM_EP = """
+    SELECT episodeID FROM episodes
+    WHERE episodeID >= (
+        SELECT MIN(episodeID) + ABS(RANDOM()) % (MAX(episodeID) - MIN(episodeID) + 1)
+        FROM episodes)
+    ORDER BY episodeID
+    LIMIT 1
+"""
+
+# SQLite versions of the queries in access_queries and builder_queries that use MySQL-only syntax
+SQLITE_QUERIES = {
+    "GET_RANDOM_EP": SQLITE_RANDOM_EP,
+    # a deferred transaction reads from one WAL snapshot from its first read on
+    "SYNC_SNAPSHOT": "BEGIN",
+    "GET_EPID_FROM_DATE": """
+        SELECT episodeID FROM episodes
+        WHERE epDate >= %s AND epDate < date(%s, '+1 day')
+    """,
+    "INSERT_SCORE": f"""
+        INSERT INTO highscores
+        (epID, player, score, date)
+        VALUES
+        (%s, %s, %s, {SQLITE_NOW})
+    """,
+    "GET_SCORES_PAGE": """
+        SELECT
+            highscores.scoreID AS "Score ID",
+            players.userID AS "User ID",
+            players.username AS "Username",
+            highscores.score AS "Score",
+            episodes.epTitle AS "Episode Title",
+            episodes.epDate AS "Episode Airdate",
+            highscores.date AS "Earned Date"
+        FROM
+            highscores
+        JOIN
+            players ON highscores.player = players.userID
+        JOIN
+            episodes ON highscores.epID = episodes.episodeID
+        WHERE
+            highscores.scoreID > %s AND
+            (%s IS NULL OR players.username = %s) AND
+            (%s IS NULL OR highscores.date >= %s) AND
+            (%s IS NULL OR highscores.date < date(%s, '+1 day')) AND
+            (%s IS NULL OR highscores.epID = %s)
+        ORDER BY
+            highscores.scoreID
+        LIMIT %s
+    """,
+    "GET_LEADERBOARD": f"""
+        SELECT
+            players.username,
+            highscores.score,
+            episodes.epTitle,
+            highscores.date
+        FROM
+            leaderboard
+        JOIN
+            highscores ON leaderboard.scoreID = highscores.scoreID
+        JOIN
+            players ON highscores.player = players.userID
+        JOIN
+            episodes ON highscores.epID = episodes.episodeID
+        WHERE
+            leaderboard.period = %s AND
+            leaderboard.periodStart = {SQLITE_PERIOD_START}
+        ORDER BY
+            leaderboard.score DESC
+        LIMIT %s
+    """,
+    "INSERT_LEADERBOARD_ENTRY": f"""
+        INSERT INTO leaderboard
+        (period, periodStart, scoreID, score)
+        VALUES
+        (%s, {SQLITE_PERIOD_START}, %s, %s)
+    """,
+    "GET_LEADERBOARD_CUTOFF": f"""
+        SELECT score FROM leaderboard
+        WHERE period = %s AND periodStart = {SQLITE_PERIOD_START}
+        ORDER BY score DESC
+        LIMIT 1 OFFSET %s
+    """,
+    "DELETE_STALE_LEADERBOARD": f"""
+        DELETE FROM leaderboard
+        WHERE period = %s AND periodStart < {SQLITE_PERIOD_START}
+    """,
+    "TRIM_LEADERBOARD": f"""
+        DELETE FROM leaderboard
+        WHERE period = %s AND periodStart = {SQLITE_PERIOD_START} AND score < %s
+    """,
+    "REBUILD_LEADERBOARD": f"""
+        INSERT OR IGNORE INTO leaderboard
+        (period, periodStart, scoreID, score)
+        SELECT %s, {SQLITE_PERIOD_START}, scoreID, score FROM highscores
+        WHERE date >= {SQLITE_PERIOD_START}
+        ORDER BY score DESC
+        LIMIT %s
+    """,
+    "DELETE_LEADERBOARD_BY_PLAYER": """
+        DELETE FROM leaderboard
+        WHERE scoreID IN (SELECT scoreID FROM highscores WHERE player = %s)
+    """,
+    "PURGE_LEADERBOARD_SCORES": """
+        DELETE FROM leaderboard
+        WHERE scoreID IN (
+            SELECT scoreID FROM highscores
+            WHERE
+                (%s IS NULL OR date < %s) AND
+                (%s IS NULL OR score < %s))
+    """,
+    "SQL_ALTER_AUTOINCREMENT": """
+        UPDATE sqlite_sequence SET seq = %s - 1
+        WHERE name = 'episodes'
+    """,
+    "SQL_UPSERT_CATEGORY": """
+        INSERT INTO categories
+        (categoryID, name, round, position, episodeID)
+        VALUES
+        (%s, %s, %s, %s, %s)
+        ON CONFLICT (categoryID) DO UPDATE SET name = excluded.name
+    """,
+    "SQL_UPSERT_CLUE": """
+        INSERT INTO clues
+        (clueID, categoryID, question, answer, moneyvalue)
+        VALUES
+        (%s, %s, %s, %s, %s)
+        ON CONFLICT (clueID) DO UPDATE SET question = excluded.question, answer = excluded.answer
+    """,
+    "SQL_GET_RANDOM_EP": SQLITE_RANDOM_EP
+}
+
+# the SQLite counterpart of the tables and indexes built by schema.MIGRATIONS
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS players (
+        userID INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        password_hash TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS episodes (
+        episodeID INTEGER PRIMARY KEY AUTOINCREMENT,
+        epDate TEXT NOT NULL,
+        epTitle TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        categoryID INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        round TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        episodeID INTEGER NOT NULL REFERENCES episodes (episodeID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS clues (
+        clueID INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoryID INTEGER NOT NULL REFERENCES categories (categoryID),
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        moneyvalue INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS highscores (
+        scoreID INTEGER PRIMARY KEY AUTOINCREMENT,
+        epID INTEGER NOT NULL,
+        player INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        date TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard (
+        period TEXT NOT NULL,
+        periodStart TEXT NOT NULL,
+        scoreID INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (period, periodStart, scoreID)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS categories_episode_round_position ON categories (episodeID, round, position)",
+    "CREATE INDEX IF NOT EXISTS categories_episode_name ON categories (episodeID, name)",
+    "CREATE INDEX IF NOT EXISTS clues_category_moneyvalue ON clues (categoryID, moneyvalue)",
+    "CREATE INDEX IF NOT EXISTS players_username ON players (username)",
+    "CREATE INDEX IF NOT EXISTS episodes_title ON episodes (epTitle)",
+    "CREATE INDEX IF NOT EXISTS episodes_date ON episodes (epDate)",
+    "CREATE INDEX IF NOT EXISTS highscores_score ON highscores (score)",
+    "CREATE INDEX IF NOT EXISTS highscores_player_score ON highscores (player, score)",
+    "CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (period, periodStart, score)"
+]
+
+class Backend():
+    """A place to store the game's tables. Error is the exception type its
+    connections raise, dialect is "mysql" or "sqlite", and concurrent_writers
+    says whether several threads can hold connections at once. opened counts
+    the connections the backend itself has opened."""
+    name = ""
+    dialect = ""
+    concurrent_writers = True
+    opened = 0
+    Error: type[Exception] = Exception
+
+    def connection(self) -> ContextManager[Any]:
+        """Borrows a connection for the duration of a with block.
+        Anything left uncommitted is rolled back if the block raises."""
+        raise NotImplementedError
+
+    def queries(self, module: ModuleType) -> Any:
+        """Returns the queries in a query module, in this backend's dialect."""
+        return module
+
+    def close(self) -> None:
+        """Releases anything the backend holds open."""
+
+class MySQLBackend(Backend):
+    """The MySQL server. Connections come from the given context manager
+    factory - the shared pool for the game, a tunnel per use for the builder."""
+    name = "mysql"
+    dialect = "mysql"
+    Error = MySQLError
+
+    def __init__(self, connect: Callable[[], ContextManager[Any]]):
+        self._connect = connect
+
+    def connection(self) -> ContextManager[Any]:
+        return self._connect()
+
+def sqlite_params(args: Any) -> Any:
+    """Converts pymysql-style arguments (a single value, a sequence, or a
+    dict) to something sqlite3 accepts. Dates are stored as MySQL would print them."""
+    if args is None:
+        return ()
+    if isinstance(args, dict):
+        return {key: sqlite_value(value) for key, value in args.items()}
+    if not isinstance(args, (tuple, list)):
+        args = (args,)
+    return tuple(sqlite_value(value) for value in args)
+
+def sqlite_value(value: Any) -> Any:
+    """Converts a single parameter for sqlite3."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def sqlite_sql(query: str) -> str:
+    """Swaps pymysql's %s placeholders for sqlite3's."""
+    return query.replace("%s", "?").replace("%%", "%")
+
+class SQLiteCursor():
+    """A sqlite3 cursor that takes pymysql-style queries and arguments."""
+
+    def __init__(self, connection: "SQLiteConnection"):
+        self.connection = connection
+        self._cursor = connection.raw.cursor()
+
+    @property
+    def description(self) -> Any:
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int | None:
+        return self._cursor.lastrowid
+
+    def execute(self, query: str, args: Any = None) -> int:
+        """Runs a query and returns the number of rows it changed."""
+        self._cursor.execute(sqlite_sql(query), sqlite_params(args))
+        return max(self._cursor.rowcount, 0)
+
+    def executemany(self, query: str, args: Any) -> int:
+        """Runs a query once per set of arguments and returns the rows changed."""
+        self._cursor.executemany(sqlite_sql(query), [sqlite_params(row) for row in args])
+        return max(self._cursor.rowcount, 0)
+
+    def fetchone(self) -> tuple | None:
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1) -> list[tuple]:
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self) -> list[tuple]:
+        return self._cursor.fetchall()
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._cursor)
+
+    def close(self) -> None:
+        self._cursor.close()
+
+class SQLiteConnection():
+    """A sqlite3 connection with pymysql's transaction methods. It runs in
+    autocommit mode, like the pooled MySQL connections, so a transaction
+    only exists between begin() and commit() or rollback()."""
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+
+    def cursor(self, cursor: type | None = None) -> SQLiteCursor: # pylint: disable=unused-argument
+        """Opens a cursor. The cursor class is ignored - SQLite cursors
+        already stream rows, like pymysql's SSCursor."""
+        return SQLiteCursor(self)
+
+    def begin(self) -> None:
+        """Starts a transaction that holds the write lock from the start. A
+        deferred BEGIN would take it at the first write, and a transaction that
+        reads first (like the builder's upserts) would then fail with "database
+        is locked" instead of waiting, whenever another writer got there first."""
+        self.raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.commit()
+
+    def rollback(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.rollback()
+
+    def ping(self, reconnect: bool = False) -> None: # pylint: disable=unused-argument
+        """Nothing to check - there is no server to lose."""
+
+    @property
+    def open(self) -> bool:
+        return True
+
+class SQLiteBackend(Backend):
+    """A SQLite file. Each thread gets its own connection, and the file is
+    put in WAL mode so that readers and the one writer don't block each other."""
+    name = "sqlite"
+    dialect = "sqlite"
+    Error = sqlite3.Error
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._opened: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        with self._lock:
+            raw = self._open()
+            raw.execute("PRAGMA journal_mode=WAL")
+            for statement in SQLITE_SCHEMA:
+                raw.execute(statement)
+
+    def _open(self) -> sqlite3.Connection:
+        """Opens a new autocommit connection and keeps track of it."""
+        raw = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._opened.append(raw)
+        self.opened += 1
+        return raw
+
+    def _raw(self) -> sqlite3.Connection:
+        """Returns this thread's connection, opening it if needed."""
+        raw = getattr(self._local, "raw", None)
+        if raw is None:
+            with self._lock:
+                raw = self._open()
+            self._local.raw = raw
+        return raw
+
+    @contextmanager
+    def connection(self) -> Iterator[SQLiteConnection]:
+        conn = SQLiteConnection(self._raw())
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def queries(self, module: ModuleType) -> SimpleNamespace:
+        names = {name: value for name, value in vars(module).items() if name.isupper()}
+        names.update({name: value for name, value in SQLITE_QUERIES.items() if name in names})
+        return SimpleNamespace(**names)
+
+    def close(self) -> None:
+        with self._lock:
+            for raw in self._opened:
+                raw.close()
+            self._opened.clear()
+        self._local = threading.local()
+
+class MemoryBackend(SQLiteBackend):
+    """An in-memory SQLite database, for tests and benchmarks. Every
+    MemoryBackend with the same name in a process shares one database,
+    which lasts until the last of them is closed. Access is serialized
+    on a single connection, since in-memory databases can't use WAL."""
+    name = "memory"
+    concurrent_writers = False
+
+    def __init__(self, name: str = "jenopardy"):
+        self._conn_lock = threading.RLock()
+        super().__init__(f"file:{name}?mode=memory&cache=shared")
+
+    def _open(self) -> sqlite3.Connection:
+        raw = sqlite3.connect(self.path, uri=True, isolation_level=None, check_same_thread=False)
+        self._opened.append(raw)
+        self.opened += 1
+        return raw
+
+    def _raw(self) -> sqlite3.Connection:
+        if len(self._opened) == 0:
+            # the database went with the last connection, so there is nothing to reopen
+            raise sqlite3.ProgrammingError("The in-memory database has been closed")
+        return self._opened[0]
+
+    @contextmanager
+    def connection(self) -> Iterator[SQLiteConnection]:
+        with self._conn_lock:
+            with super().connection() as conn:
+                yield conn
+
+def create_backend(name: str,
+                   sqlite_file: str,
+                   mysql_connection: Callable[[], ContextManager[Any]]) -> Backend:
+    """Builds the backend named in the config. The MySQL backend borrows its
+    connections from mysql_connection, which is never called for the others."""
+    match name:
+        case "mysql":
+            return MySQLBackend(mysql_connection)
+        case "sqlite":
+            return SQLiteBackend(sqlite_file)
+        case "memory":
+            return MemoryBackend()
+        case _:
+            raise ValueError(f"Unknown backend {name!r}: expected mysql, sqlite, or memory")
@@ -0,0 +1,69 @@
+"""
+An in-memory copy of an entire episode - every category, clue, and answer
+in the Regular, Double, and Final rounds. It is loaded once when a game
+starts, so choosing a clue during play is a local lookup instead of a query.
+"""
+
+from typing import TypeAlias
+
+CluePair : TypeAlias = tuple[str, str]
+# epTitle, round, position, category name, moneyvalue, question, answer
+BoardRow : TypeAlias = tuple[str, str, int, str, int, str, str]
+
+class Board():
+    """Holds every clue in an episode, keyed by round, category, and money value.
+    Category lookups are case-insensitive, since players type them in by hand."""
+
+    def __init__(self, episode_id: int, title: str):
+        self.episode_id = episode_id
+        self.title = title
+        self._rounds: dict[str, dict[str, dict[int, CluePair]]] = {}
+        self._names: dict[str, dict[str, str]] = {}
+
+    @classmethod
+    def from_rows(cls, episode_id: int, rows: tuple[BoardRow, ...]) -> "Board":
+        """Builds a board from the rows returned by GET_BOARD.
+        Rows are expected to be ordered by round, position, and money value."""
+        if len(rows) == 0:
+            raise ValueError(f"No board found for episodeID #{episode_id}")
+        board = cls(episode_id, str(rows[0][0]))
+        for _, what_round, _, name, moneyvalue, question, answer in rows:
+            board.add_clue(str(what_round), str(name), moneyvalue, question, answer)
+        return board
+
+    def add_clue(self,
+                 what_round: str,
+                 category_name: str,
+                 moneyvalue: int | None,
+                 question: str | None,
+                 answer: str | None) -> None:
+        """Adds a clue to the board. Categories keep the order they are first added in."""
+        categories = self._rounds.setdefault(what_round, {})
+        clues = categories.setdefault(category_name, {})
+        self._names.setdefault(what_round, {})[category_name.lower()] = category_name
+        if moneyvalue is not None:
+            clues[int(moneyvalue)] = (str(question), str(answer))
+
+    def categories(self, what_round: str) -> list[str]:
+        """Returns the category names in a round, in board order.
+        The list is a copy, so callers are free to modify it."""
+        if what_round not in self._rounds:
+            raise ValueError(f"No categories found for episodeID #{self.episode_id} in round {what_round}")
+        return list(self._rounds[what_round].keys())
+
+    def clue(self, what_round: str, category_name: str, moneyvalue: int) -> CluePair:
+        """Retrieves a clue and its answer from the board."""
+        name = self._names.get(what_round, {}).get(category_name.lower())
+        if name is None:
+            raise ValueError("Category not found")
+        clue = self._rounds[what_round][name].get(moneyvalue)
+        if clue is None:
+            raise ValueError("Clue not found")
+        return clue
+
+    def final_jeopardy(self) -> tuple[str, str, str]:
+        """Returns the Final Jeopardy category, clue, and answer."""
+        for category_name, clues in self._rounds.get("Final", {}).items():
+            for question, answer in clues.values():
+                return (category_name, question, answer)
+        raise ValueError("Can't find clue and answer group")
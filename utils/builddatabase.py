@@ -1,14 +1,85 @@
 """
 Server-side program to scrape from j-archive and fully update the episode tables in the database.
+Run with --stream to feed episodes straight from the crawler into the database as they are
+parsed, instead of crawling everything first and then reading it all back from the dump.
+Run with --workers N to write to the database with N parallel writers.
+Run with --strategy to choose how new episodes are written (see dbbuilder.INGEST_STRATEGIES).
 """
 
-from dbbuilder import update_database
-from jsoncrawler import crawl
+import argparse
+import queue
+import threading
+import schema
+from dbbuilder import INGEST_STRATEGIES, DONE, backend, drain, ingest, ingest_parallel, migrate, update_database
+from config import Config
+from jsoncrawler import crawl, iter_crawl
+
+# at most this many parsed episodes wait between the crawler and the database
+QUEUE_SIZE = 100
+# if the crawler goes this long without producing an episode, write what is pending
+FLUSH_SECONDS = 5.0
+
+def stream(workers: int = 1, strategy: str = Config.INGEST_STRATEGY) -> None:
+    """Runs the web scraper and the database updater as one pipeline. The crawler
+    runs on its own thread and hands parsed episodes through a bounded queue to
+    the batched database writer, so memory use stays flat and new episodes reach
+    the database while the crawl is still going."""
+    migrate()
+    episodes: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    errors = []
+
+    def produce() -> None:
+        try:
+            for entry in iter_crawl():
+                episodes.put(entry)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            errors.append(e)
+        finally:
+            episodes.put(DONE)
+
+    producer = threading.Thread(target=produce, name="crawler", daemon=True)
+    producer.start()
+    if workers > 1:
+        ingest_parallel(drain(episodes, FLUSH_SECONDS), workers, strategy=strategy)
+    else:
+        ingest(drain(episodes, FLUSH_SECONDS), strategy=strategy)
+    producer.join()
+    if errors:
+        raise errors[0]
+
+def check_indexes() -> None:
+    """Applies any pending migrations, then reports any hot query that still
+    reads a whole table. Only meaningful on the MySQL backend."""
+    if backend.dialect != "mysql":
+        print(f"Index checks need the mysql backend, not {backend.name}.")
+        return
+    migrate()
+    with backend.connection() as conn:
+        full_scans = schema.check_hot_queries(conn)
+    if len(full_scans) == 0:
+        print("Every hot query is served by an index.")
+    for full_scan in full_scans:
+        print(full_scan)
 
 def main():
     """Runs both the web scraper and the database updater."""
-    crawl()
-    update_database()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stream", action="store_true",
+                        help="feed episodes into the database while crawling")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of parallel database writers")
+    parser.add_argument("--strategy", choices=INGEST_STRATEGIES, default=Config.INGEST_STRATEGY,
+                        help="how new episodes are written")
+    parser.add_argument("--check-indexes", action="store_true",
+                        help="migrate the schema and EXPLAIN the hot queries, then exit")
+    args = parser.parse_args()
+    if args.check_indexes:
+        check_indexes()
+    elif args.stream:
+        stream(args.workers, args.strategy)
+    else:
+        crawl()
+        update_database(args.workers, args.strategy)
 
 if __name__ == "__main__":
     main()
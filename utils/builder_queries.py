@@ -23,6 +23,55 @@ SQL_INSERT_CLUE = """
     (%s, %s, %s, %s)
 """
 
+# multi-row forms of the inserts above, for a whole batch of episodes at once;
+# {values} is filled with one placeholder group per row
+SQL_INSERT_EPISODES = """
+    INSERT INTO episodes
+    (epDate, epTitle)
+    VALUES
+    {values}
+"""
+
+SQL_INSERT_CATEGORIES = """
+    INSERT INTO categories
+    (name, round, position, episodeID)
+    VALUES
+    {values}
+"""
+
+SQL_INSERT_CLUES = """
+    INSERT INTO clues
+    (categoryID, question, answer, moneyvalue)
+    VALUES
+    {values}
+"""
+
+SQL_GET_EPISODEIDS_BY_EPTITLES = """
+    SELECT episodeID, epTitle FROM episodes
+    WHERE epTitle IN ({titles})
+    ORDER BY episodeID
+"""
+
+SQL_GET_CATEGORYIDS_BY_EPIDS = """
+    SELECT categoryID, episodeID, round, position FROM categories
+    WHERE episodeID IN ({episode_ids})
+"""
+
+# bulk loads from a tab-separated file on the client (needs local_infile on both ends)
+SQL_LOAD_CATEGORIES = """
+    LOAD DATA LOCAL INFILE %s
+    INTO TABLE categories
+    CHARACTER SET utf8mb4
+    (name, round, position, episodeID)
+"""
+
+SQL_LOAD_CLUES = """
+    LOAD DATA LOCAL INFILE %s
+    INTO TABLE clues
+    CHARACTER SET utf8mb4
+    (categoryID, question, answer, moneyvalue)
+"""
+
 SQL_GET_EPISODEID_BY_EPTITLE = """
     SELECT episodeID FROM episodes
     WHERE epTitle = %s
@@ -34,6 +83,16 @@ SQL_GET_EPTITLE_EXISTENCE = """
     WHERE epTitle = %s
 """
 
+SQL_GET_ALL_EPISODES = """
+    SELECT episodeID, epTitle FROM episodes
+    ORDER BY episodeID
+"""
+
+SQL_GET_CATEGORYIDS_BY_EPID = """
+    SELECT categoryID, round, position FROM categories
+    WHERE episodeID = %s
+"""
+
 SQL_GET_CATEGORYID_BY_NAME_AND_EPID = """
     SELECT categoryID FROM categories
     WHERE name = %s AND episodeID = %s
@@ -64,6 +123,40 @@ SQL_GET_CLUES_BY_CATEGORYID = """
     ORDER BY moneyvalue
 """
 
+SQL_GET_EPISODE_CONTENTS = """
+    SELECT
+        categories.categoryID,
+        categories.round,
+        categories.position,
+        categories.name,
+        clues.clueID,
+        clues.moneyvalue,
+        clues.question,
+        clues.answer
+    FROM
+        categories
+    LEFT JOIN
+        clues ON clues.categoryID = categories.categoryID
+    WHERE
+        categories.episodeID = %s
+"""
+
+SQL_UPSERT_CATEGORY = """
+    INSERT INTO categories
+    (categoryID, name, round, position, episodeID)
+    VALUES
+    (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE name = VALUES(name)
+"""
+
+SQL_UPSERT_CLUE = """
+    INSERT INTO clues
+    (clueID, categoryID, question, answer, moneyvalue)
+    VALUES
+    (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE question = VALUES(question), answer = VALUES(answer)
+"""
+
 SQL_UPDATE_CATEGORY = """
     UPDATE categories 
     SET name = %s 
@@ -77,8 +170,14 @@ SQL_UPDATE_CLUES = """
 """
 
 SQL_GET_RANDOM_EP = """
-    SELECT episodeID FROM episodes
-    ORDER BY RAND()
+    SELECT episodes.episodeID
+    FROM
+        episodes
+    JOIN
+        (SELECT FLOOR(MIN(episodeID) + RAND() * (MAX(episodeID) - MIN(episodeID) + 1)) AS pick
+         FROM episodes) AS r
+    WHERE episodes.episodeID >= r.pick
+    ORDER BY episodes.episodeID
     LIMIT 1;
 """
 
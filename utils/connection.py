@@ -0,0 +1,157 @@
+"""
+Keeps one SSH tunnel open for the life of the session, with a small,
+bounded pool of database connections behind it. Every function in
+dbaccess borrows a connection from here instead of opening its own
+tunnel, so only the first query of a session pays for the handshake.
+The backend the game runs against (see utils.backend) is chosen here;
+with Config.BACKEND set to "sqlite" or "memory", the pool is never used.
+With Config.INSTRUMENT on, the backend records every query it runs in
+utils.instrumentation.stats.
+"""
+
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+import pymysql
+import sshtunnel
+from pymysql import MySQLError
+from utils.settings import Config
+from utils.backend import Backend, create_backend
+from utils.instrumentation import InstrumentedBackend, stats
+
+sshtunnel.SSH_TIMEOUT = 300.0
+sshtunnel.TUNNEL_TIMEOUT = 300.0
+
+class ConnectionPool():
+    """A bounded pool of pymysql connections sharing one SSH tunnel.
+    Idle connections are pinged before they are handed out, and the
+    tunnel is restarted (dropping every idle connection) if it has gone down."""
+
+    def __init__(self, size: int = Config.POOL_SIZE, timeout: float = Config.POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._tunnel: sshtunnel.SSHTunnelForwarder | None = None
+        # bumped every time the tunnel is restarted, so that connections
+        # bound to the old local port are thrown away instead of reused
+        self._generation = 0
+
+    def _local_port(self) -> int:
+        """Starts the tunnel if needed, restarting it if it has dropped."""
+        with self._lock:
+            if self._tunnel is None:
+                self._tunnel = sshtunnel.SSHTunnelForwarder(
+                    (Config.SSH_HOST),
+                    ssh_username=Config.SSH_USERNAME,
+                    ssh_password=Config.SSH_PASSWORD,
+                    remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306))
+                with stats.tunnel_setup():
+                    self._tunnel.start()
+            elif not self._tunnel.is_active:
+                with stats.tunnel_setup():
+                    self._tunnel.restart()
+                self._generation += 1
+                self._drain()
+            return self._tunnel.local_bind_port
+
+    def _connect(self, port: int) -> pymysql.Connection:
+        """Opens a new connection through the tunnel. Autocommit is on so that
+        pooled connections never hold a stale read snapshot between borrows;
+        writes that need a transaction call begin() explicitly."""
+        return pymysql.connect(
+            host=Config.LOCALHOST,
+            user=Config.LOCALUSER,
+            passwd=Config.LOCALPASSWORD,
+            db=Config.DATABASE,
+            port=port,
+            autocommit=True)
+
+    def _drain(self) -> None:
+        """Closes every idle connection."""
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.close()
+            except MySQLError:
+                pass
+
+    def acquire(self) -> pymysql.Connection:
+        """Borrows a healthy connection, opening a new one if none are idle."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pymysql.err.OperationalError("Timed out waiting for a database connection")
+        try:
+            port = self._local_port()
+            while True:
+                try:
+                    generation, conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect(port)
+                if generation != self._generation:
+                    conn.close()
+                    continue
+                try:
+                    conn.ping(reconnect=True)
+                    return conn
+                except MySQLError:
+                    try:
+                        conn.close()
+                    except MySQLError:
+                        pass
+                    continue
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: pymysql.Connection, broken: bool = False) -> None:
+        """Returns a connection to the pool. Broken connections are closed instead."""
+        try:
+            if broken or not conn.open:
+                conn.close()
+            else:
+                self._idle.put_nowait((self._generation, conn))
+        except (MySQLError, queue.Full):
+            pass
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[pymysql.Connection]:
+        """Borrows a connection for the duration of a with block.
+        Anything left uncommitted is rolled back on the way out."""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except MySQLError:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def close(self) -> None:
+        """Closes every idle connection and the tunnel."""
+        with self._lock:
+            self._drain()
+            if self._tunnel is not None:
+                self._tunnel.stop()
+                self._tunnel = None
+
+pool = ConnectionPool()
+atexit.register(pool.close)
+
+backend: Backend | InstrumentedBackend = create_backend(Config.BACKEND, Config.SQLITE_FILE, pool.connection)
+atexit.register(backend.close)
+if Config.INSTRUMENT:
+    backend = InstrumentedBackend(backend, stats)
+if Config.STATS_FILE:
+    atexit.register(stats.dump, Config.STATS_FILE)
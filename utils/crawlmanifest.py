@@ -0,0 +1,97 @@
+"""
+A persisted record of every episode page the crawler has fetched, kept as a
+JSON index next to jsondump/. For each game_id it stores the page's URL, the
+title it was dumped under, when it was last fetched, the ETag/Last-Modified
+headers j-archive sent back, a hash of the page, and the error if the page
+couldn't be parsed. The crawler uses these to send conditional requests and
+to skip episodes that haven't changed.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import TypeAlias
+
+MANIFEST_FILE = "crawl_manifest.json"
+
+ManifestEntry : TypeAlias = dict[str, str | None]
+
+def hash_content(content: bytes) -> str:
+    """Hashes a fetched page so unchanged pages can be recognised."""
+    return hashlib.sha256(content).hexdigest()
+
+class CrawlManifest():
+    """The crawl manifest, loaded into memory. Safe to update from several
+    crawler threads at once; call save() to write it back to disk."""
+
+    def __init__(self, path: str = MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, ManifestEntry] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self._entries = json.load(file)
+
+    def get(self, game_id: str) -> ManifestEntry | None:
+        """Returns the stored entry for a game, if it has been crawled before."""
+        with self._lock:
+            return self._entries.get(game_id)
+
+    def conditional_headers(self, game_id: str) -> dict[str, str]:
+        """Builds If-None-Match/If-Modified-Since headers from the stored entry."""
+        entry = self.get(game_id)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = str(entry["etag"])
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = str(entry["last_modified"])
+        return headers
+
+    def is_unchanged(self, game_id: str, content_hash: str) -> bool:
+        """Checks if a freshly fetched page matches the one already dumped."""
+        entry = self.get(game_id)
+        return entry is not None and entry.get("sha256") == content_hash
+
+    def urls(self) -> dict[str, str]:
+        """Maps every recorded game_id to its episode page URL."""
+        with self._lock:
+            return {game_id: str(entry["url"])
+                    for game_id, entry in self._entries.items() if entry.get("url")}
+
+    def unparsed(self) -> list[str]:
+        """Lists the games that were fetched but never made it through the parse
+        stage. Games whose pages failed to parse are left out until they change."""
+        with self._lock:
+            return [game_id for game_id, entry in self._entries.items()
+                    if not entry.get("title") and not entry.get("parse_error")]
+
+    def record(self, game_id: str, **fields: str | None) -> None:
+        """Updates a game's entry, stamping it with the current fetch time."""
+        with self._lock:
+            entry = self._entries.setdefault(game_id, {})
+            entry.update(fields)
+            entry["fetched"] = datetime.now(timezone.utc).isoformat()
+
+    def record_title(self, game_id: str, title: str) -> None:
+        """Stores the title a parsed game was dumped under, leaving the fetch time alone."""
+        with self._lock:
+            entry = self._entries.setdefault(game_id, {})
+            entry["title"] = title
+            entry.pop("parse_error", None)
+
+    def record_parse_error(self, game_id: str, error: str) -> None:
+        """Marks a game whose page couldn't be parsed, so later crawls skip it until it changes."""
+        with self._lock:
+            self._entries.setdefault(game_id, {})["parse_error"] = error
+
+    def save(self) -> None:
+        """Writes the manifest to disk. The write goes to a temporary file
+        first, so an interrupted save never corrupts the existing manifest."""
+        with self._lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._entries, file, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
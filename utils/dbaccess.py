@@ -1,65 +1,75 @@
 """
 Functions that allow user-side access to the database.
+Every function borrows a connection from the configured backend in
+utils.connection (the shared pool, for MySQL) rather than opening its
+own SSH tunnel.
+With Config.USE_REPLICA on, the episode and clue lookups are answered
+from the local replica (see utils.replica) instead of the server.
 """
 
-import pymysql
-import sshtunnel
-from pymysql import MySQLError
+from typing import Collection, Iterator
+from pymysql.cursors import Cursor, SSCursor
 from werkzeug.security import generate_password_hash, check_password_hash
 from prettytable import from_db_cursor, PrettyTable
-from altconfig import Config
-import utils.access_queries as q
+from utils.settings import Config
+import utils.access_queries as access_queries
+from utils.access_queries import LEADERBOARD_SIZE, LEADERBOARD_PERIODS, SCHEMA_VERSION
+from utils.board import Board
+from utils.connection import backend
+from utils.episodepicker import picker
+from utils.replica import replica
+
+q = backend.queries(access_queries)
+DatabaseError = backend.Error
+
+def check_schema() -> None:
+    """Raises if the MySQL schema is older than the game's queries need,
+    which happens when a new version of the game is deployed before the
+    builder has migrated the database. Without this, every score would be
+    rolled back on the missing leaderboard table. The SQLite backends
+    create their own tables, so only MySQL is checked."""
+    if backend.dialect != "mysql":
+        return
+    with backend.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(q.GET_SCHEMA_VERSION)
+            version = int(cur.fetchone()[0])
+        except DatabaseError:
+            # no schema_version table: the builder has never migrated this database
+            version = 0
+        finally:
+            cur.close()
 
-sshtunnel.SSH_TIMEOUT = 300.0
-sshtunnel.TUNNEL_TIMEOUT = 300.0
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(f"The database schema is at version {version}, but the game needs "
+                           f"version {SCHEMA_VERSION}. Run utils/builddatabase.py --check-indexes to migrate it.")
 
 def add_player_to_table(username: str, password: str) -> None:
     """Adds a new player account to the users table."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         hashed = generate_password_hash(password)
         try:
             cur.execute(q.INSERT_PLAYER, (username, hashed))
             cur.connection.commit()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
         finally:
             cur.close()
-            conn.close()
 
 def check_username_exists(username: str) -> bool:
     """Checks if the username the user tried to create an account with already exists."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_USERNAME, (username))
             result = cur.fetchone()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
             result = None
         finally:
             cur.close()
-            conn.close()
         if result is None:
             return False
         return True
@@ -67,26 +77,15 @@ def check_username_exists(username: str) -> bool:
 def check_password(username: str, password: str) -> bool:
     """Checks the entered password against the user's 
     stored hashed password to determine if it's correct."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_PASSWORD_HASH_BY_USERNAME, (username))
             result = cur.fetchone()
-        except MySQLError:
+        except DatabaseError:
             result = None
         finally:
             cur.close()
-            conn.close()
 
     if result is not None:
         hashed = str(result[0])
@@ -98,29 +97,18 @@ def check_password(username: str, password: str) -> bool:
 
 def get_user_id(username: str) -> int:
     """Retrieves the unique user ID of the username."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_USERID_BY_USERNAME, (username))
             result = cur.fetchone()
             if result is not None:
                 user_id = int(result[0])
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
             user_id = None
         finally:
             cur.close()
-            conn.close()
 
     if user_id is None:
         raise ValueError("UserID not found")
@@ -128,88 +116,58 @@ def get_user_id(username: str) -> int:
 
 def get_username(user_id: int) -> str:
     """Retrieves the username associated with the unique user ID."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_USERNAME_BY_USERID, (user_id))
             result = cur.fetchone()
             if result is not None:
                 username = str(result[0])
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
             username = None
         finally:
             cur.close()
-            conn.close()
 
     if username is None:
         raise ValueError("Username not found!")
     return username
 
-def get_random_ep() -> int:
+def get_random_ep(user_id: int | None = None,
+                  exclude_played: bool | None = None,
+                  complete_only: bool | None = None,
+                  just_played: Collection[int] = ()) -> int:
     """
-    Retrieves a random episodeID from the database.
+    Retrieves a random episodeID. Picks are made from a cached list of
+    episode IDs (see utils.episodepicker), so the episodes table is not
+    sorted on every new game. Optionally skips episodes the player has
+    already played (including just_played, whose scores may not be
+    written yet), or episodes with clues missing from j-archive. Filters
+    left as None follow Config.RANDOM_EXCLUDE_PLAYED and Config.RANDOM_COMPLETE_ONLY.
     """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.GET_RANDOM_EP)
-            result = cur.fetchone()
-            if result is not None:
-                episode_id = int(result[0])
-        except MySQLError as e:
-            print(f"Error: {e}")
-            episode_id = None
-        finally:
-            cur.close()
-            conn.close()
-
-    if episode_id is None:
-        raise ValueError("EpisodeID not found")
-    return episode_id
+    if exclude_played is None:
+        exclude_played = Config.RANDOM_EXCLUDE_PLAYED
+    if complete_only is None:
+        complete_only = Config.RANDOM_COMPLETE_ONLY
+    return picker.pick(user_id, exclude_played, complete_only, just_played)
 
 def get_ep_id_from_date(ep_date: str) -> int:
     """
     Retrieves an episode ID from the database based on the datetime given.
     """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    if replica.enabled:
+        episode_id = replica.get_ep_id_from_date(ep_date)
+        if episode_id is None:
+            raise ValueError("EpisodeID not found")
+        return episode_id
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_EPID_FROM_DATE, (ep_date, ep_date))
             result = cur.fetchone()
             if result is not None:
                 episode_id = int(result[0])
-        except MySQLError:
+        except DatabaseError:
             print("No episode found for the date given!")
             choice = input("Generate random episode? y/n ")
             if choice == "y":
@@ -218,249 +176,81 @@ def get_ep_id_from_date(ep_date: str) -> int:
                 episode_id = None
         finally:
             cur.close()
-            conn.close()
 
     if episode_id is None:
         raise ValueError("EpisodeID not found")
     return episode_id
 
-def get_ep_title(episode_id: int) -> str | None:
-    """
-    Retrieves the episode title that corresponds to an episodeID from the database.
-    """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.GET_EP_TITLE, (episode_id))
-            result = cur.fetchone()
-            if result is not None:
-                ep_title = str(result[0])
-        except MySQLError as e:
-            print(f"Error: {e}")
-            ep_title = None
-        finally:
-            cur.close()
-            conn.close()
-
-    if ep_title is None:
-        raise ValueError("Episode title not found")
-    return ep_title
-
-def get_categories(episode_id: int, what_round: str) -> list[str]:
+def get_board(episode_id: int) -> Board:
     """
-    Retrieves a list of the categories in a given round from the database. 
-    Round can be either "Regular" or "Double".
+    Retrieves every category, clue, and answer in an episode with a
+    single query, and returns them as a Board. Gameplay reads clues from
+    the board, so no further queries are needed until the score is written.
     """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    if replica.enabled:
+        return replica.get_board(episode_id)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(q.GET_CATEGORIES, (episode_id, what_round))
+            cur.execute(q.GET_BOARD, (episode_id))
             result = cur.fetchall()
-            if result is not None:
-                categories = []
-                for r in result:
-                    categories.append(str(r[0]))
-        except MySQLError as e:
-            print(f"Error: {e}")
-            categories = None
-        finally:
-            cur.close()
-            conn.close()
-    if categories is None:
-        raise ValueError(f"No categories found for episodeID #{episode_id} in round {what_round}")
-    return categories
-
-def get_category_id(episode_id: int, name: str) -> int:
-    """
-    Gets the unique category ID of a category. NOTE: Category names are not unique.
-    """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.GET_CATEGORY_ID, (episode_id, name))
-            result = cur.fetchone()
-            if result is not None:
-                category_id = int(result[0])
-        except MySQLError as e:
-            print(f"Error: {e}")
-            category_id = None
-        finally:
-            cur.close()
-            conn.close()
-    if category_id is None:
-        raise ValueError("CategoryID not found")
-    return category_id
-
-def get_clue(category_id: int, moneyvalue: int) -> tuple[str, str]:
-    """
-    Retrieves a clue and its corresponding answer.
-
-    Parameters
-    ----------
-    categoryID : int
-        The category the cluegroup belongs to.
-    moneyvalue : int
-        The value of the clue.
-    
-    Returns
-    -------
-    result : tuple[str, str]
-        A tuple representing the cluegroup. The first value
-        is the clue, and the second is the answer. To use,
-        call individual elements.
-    """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.GET_CLUE, (category_id, moneyvalue))
-            result = cur.fetchone()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(f"Error: {e}")
             result = None
         finally:
             cur.close()
-            conn.close()
 
     if result is None:
-        raise ValueError("Clue not found")
-    else:
-        return result
-
-def get_final_jeopardy(episode_id: int) -> tuple:
-    """
-    Retrieves all the information for Final Jeopardy from the
-    database. Unlike get_clue, this also retrieves the category.
-    
-    Returns
-    -------
-    fj : tuple[str, str, str]
-        The representation of the FJ round. The first element is
-        the category, the second is the clue, and the third is
-        the answer. To use, call individual elements.
-    """
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.GET_CATEGORIES, (episode_id, "Final"))
-            result = cur.fetchone()
-            if result is not None:
-                category_name = str(result[0])
-            cur.execute(q.GET_CATEGORY_ID, (episode_id, category_name))
-            result = cur.fetchone()
-            if result is not None:
-                category_id = int(result[0])
-            cur.execute(q.GET_CLUES, (category_id))
-            result = cur.fetchone()
-            if result is not None:
-                clue_and_answer = list(result)
-        except MySQLError as e:
-            print(f"Error: {e}")
-            category_name = None
-            clue_and_answer = None
-        finally:
-            cur.close()
-            conn.close()
-    if clue_and_answer is None:
-        raise ValueError("Can't find clue and answer group")
-    fj = (category_name, clue_and_answer[0], clue_and_answer[1])
-    return fj
+        raise ValueError(f"No board found for episodeID #{episode_id}")
+    return Board.from_rows(episode_id, result)
+
+def add_to_leaderboards(cur: Cursor, score_id: int, score: int) -> None:
+    """Adds a new score to the current period of every leaderboard, then trims
+    each one back down to its top LEADERBOARD_SIZE scores (ties are kept).
+    Rows from periods that have ended are dropped on the way."""
+    for period in LEADERBOARD_PERIODS:
+        cur.execute(q.DELETE_STALE_LEADERBOARD, (period, period))
+        cur.execute(q.INSERT_LEADERBOARD_ENTRY, (period, period, score_id, score))
+        # the score in last place, which every kept score is at least
+        cur.execute(q.GET_LEADERBOARD_CUTOFF, (period, period, LEADERBOARD_SIZE - 1))
+        cutoff = cur.fetchone()
+        if cutoff is not None:
+            cur.execute(q.TRIM_LEADERBOARD, (period, period, cutoff[0]))
+
+def rebuild_leaderboards(cur: Cursor) -> None:
+    """Refills the current period of every leaderboard from the scores table,
+    for after scores have been deleted out from under it."""
+    for period in LEADERBOARD_PERIODS:
+        cur.execute(q.REBUILD_LEADERBOARD, (period, period, period, LEADERBOARD_SIZE))
 
 def write_score(episode_id: int, user_id: int, score: int) -> None:
-    """Adds a new score to the scores table."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    """Adds a new score to the scores table, and to the leaderboards
+    in the same transaction."""
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
+            conn.begin()
             cur.execute(q.INSERT_SCORE, (episode_id, user_id, score))
-            cur.connection.commit()
-        except MySQLError as e:
+            add_to_leaderboards(cur, cur.lastrowid, score)
+            conn.commit()
+        except DatabaseError as e:
             print(e)
+            conn.rollback()
         finally:
             cur.close()
-            conn.close()
 
 def check_score_id_exists(score_id: int) -> bool:
     """Check if the score ID exists in the scores table."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_SCORE_ID, (score_id))
             result = cur.fetchone()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
             result = None
         finally:
             cur.close()
-            conn.close()
 
     if result is None:
         return False
@@ -468,182 +258,162 @@ def check_score_id_exists(score_id: int) -> bool:
 
 def get_scores(user_id: int) -> tuple:
     """Get all scores that have a specific user ID attached."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.GET_SCORES, (user_id))
             result = cur.fetchall()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
         finally:
             cur.close()
-            conn.close()
 
     if result is None:
         raise ValueError("No scores found")
     return result
 
-def get_leaderboard() -> tuple:
-    """Generates a leaderboard of the top 10 scores in the scores table."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+def get_leaderboard(period: str = "alltime") -> tuple:
+    """Generates a leaderboard of the top 10 scores in the scores table.
+    Period can be "alltime", "weekly", or "daily". The leaderboard is kept
+    up to date as scores are written, so this only reads the top rows."""
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(q.GET_LEADERBOARD)
+            cur.execute(q.GET_LEADERBOARD, (period, period, LEADERBOARD_SIZE))
             result = cur.fetchall()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
         finally:
             cur.close()
-            conn.close()
 
     if result is None:
         raise ValueError("No scores found")
     return result
 
-def generate_player_table() -> PrettyTable:
-    """Creates a result set of all the players currently in the database.
-    Accessible only to the admin."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.GET_ALL_PLAYERS)
-            player_table = from_db_cursor(cur)
-        except MySQLError as e:
-            print(e)
-        finally:
-            cur.close()
-            conn.close()
-
-    if player_table is None:
-        raise ValueError("Can't generate player table")
-    return player_table
-
-def generate_score_table() -> PrettyTable:
-    """Creates a result set of all the scores currently in the database.
-    Accessible only to the admin."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
+def fetch_page(query: str, params: tuple) -> PrettyTable:
+    """Runs one page of a keyset-paginated listing on a server-side cursor,
+    so rows are streamed into the table rather than buffered twice."""
+    with backend.connection() as conn:
+        cur = conn.cursor(SSCursor)
         try:
-            cur.execute(q.GET_ALL_SCORES)
-            score_table = from_db_cursor(cur)
-        except MySQLError as e:
+            cur.execute(query, params)
+            page = from_db_cursor(cur)
+        except DatabaseError as e:
             print(e)
+            page = None
         finally:
             cur.close()
-            conn.close()
 
-    if score_table is None:
-        raise ValueError("Can't generate score table")
-    return score_table
+    if page is None:
+        raise ValueError("Can't generate page")
+    return page
+
+def iter_score_pages(page_size: int = 25,
+                     username: str | None = None,
+                     start_date: str | None = None,
+                     end_date: str | None = None,
+                     episode_id: int | None = None) -> Iterator[PrettyTable]:
+    """Pages through the scores table in scoreID order, optionally filtered by
+    player, by the date range the score was earned in (yyyy-mm-dd, inclusive),
+    and by episode. Each page starts after the last scoreID of the one before,
+    so no page costs more than page_size rows. Accessible only to the admin."""
+    last_id = 0
+    while True:
+        page = fetch_page(q.GET_SCORES_PAGE, (
+            last_id,
+            username, username,
+            start_date, start_date,
+            end_date, end_date,
+            episode_id, episode_id,
+            page_size))
+        if len(page.rows) == 0:
+            return
+        yield page
+        if len(page.rows) < page_size:
+            return
+        last_id = int(page.rows[-1][0])
+
+def iter_player_pages(page_size: int = 25, username: str | None = None) -> Iterator[PrettyTable]:
+    """Pages through the players table in userID order, optionally filtered by a
+    username pattern (% matches anything). Accessible only to the admin."""
+    last_id = 0
+    while True:
+        page = fetch_page(q.GET_PLAYERS_PAGE, (last_id, username, username, page_size))
+        if len(page.rows) == 0:
+            return
+        yield page
+        if len(page.rows) < page_size:
+            return
+        last_id = int(page.rows[-1][0])
 
-def delete_scores_by_player(user_id: int) -> None:
-    """Deletes all scores attached to a certain user ID.
+def delete_score_by_score_id(score_id: int) -> None:
+    """Delete a score from the scores table.
     Accessible only to the admin."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(q.DELETE_ALL_SCORES_BY_PLAYER, (user_id))
-            cur.connection.commit()
-        except MySQLError as e:
+            conn.begin()
+            cur.execute(q.DELETE_LEADERBOARD_BY_SCOREID, (score_id))
+            cur.execute(q.DELETE_SCORE_BY_SCOREID, (score_id))
+            rebuild_leaderboards(cur)
+            conn.commit()
+        except DatabaseError as e:
             print(e)
+            conn.rollback()
         finally:
             cur.close()
-            conn.close()
 
-def delete_score_by_score_id(score_id: int) -> None:
-    """Delete a score from the scores table.
-    Accessible only to the admin."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+def remove_players(usernames: list[str]) -> tuple[int, int]:
+    """Removes one or many players, and every score attached to them, in a
+    single transaction on one connection, so a failure partway leaves nothing
+    orphaned. Usernames that don't exist are skipped. Returns the number of
+    players and of scores removed. Accessible only to the admin."""
+    players = scores = 0
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(q.DELETE_SCORE_BY_SCOREID, (score_id))
-            cur.connection.commit()
-        except MySQLError as e:
+            conn.begin()
+            user_ids = []
+            for username in usernames:
+                cur.execute(q.GET_USERID_BY_USERNAME, (username))
+                result = cur.fetchone()
+                if result is not None:
+                    user_ids.append(int(result[0]))
+            if len(user_ids) > 0:
+                cur.executemany(q.DELETE_LEADERBOARD_BY_PLAYER, user_ids)
+                scores = cur.executemany(q.DELETE_ALL_SCORES_BY_PLAYER, user_ids) or 0
+                players = cur.executemany(q.DELETE_PLAYER, user_ids) or 0
+                if scores > 0:
+                    rebuild_leaderboards(cur)
+            conn.commit()
+        except DatabaseError as e:
             print(e)
+            conn.rollback()
+            players = scores = 0
         finally:
             cur.close()
-            conn.close()
-
-def delete_player(user_id: int) -> None:
-    """Removes a user from the users table.
-    Accessible only to the admin."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    return players, scores
+
+def purge_scores(older_than: str | None = None, below: int | None = None) -> int:
+    """Deletes every score earned before a date (yyyy-mm-dd) and/or worth less
+    than a value, in one transaction, then refills the leaderboards.
+    Returns the number of scores deleted. Accessible only to the admin."""
+    if older_than is None and below is None:
+        raise ValueError("Give a date, a score, or both to purge by")
+    criteria = (older_than, older_than, below, below)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(q.DELETE_PLAYER, (user_id))
-            cur.connection.commit()
-        except MySQLError as e:
+            conn.begin()
+            cur.execute(q.PURGE_LEADERBOARD_SCORES, criteria)
+            purged = cur.execute(q.PURGE_SCORES, criteria)
+            if purged > 0:
+                rebuild_leaderboards(cur)
+            conn.commit()
+        except DatabaseError as e:
             print(e)
+            conn.rollback()
+            purged = 0
         finally:
             cur.close()
-            conn.close()
+    return purged
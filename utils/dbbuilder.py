@@ -2,20 +2,34 @@
 Server-side program that takes the JSON files produced by
 jsoncrawler.py, parses them, and inserts their values into the
 database. If the data already exists in the database, it
-updates the relevant data.
+updates only the rows that have changed.
 
 The program starts from the top and works down - episode, 
 categories, clues.
+
+Everything is written to the backend set by Config.BACKEND (see backend.py),
+so the builder can fill a local SQLite or in-memory database as well as MySQL.
+With Config.INSTRUMENT on, every query is timed (see instrumentation.py).
 """
 
+import atexit
 import os
 import json
-from typing import TypeAlias
+import tempfile
+import queue
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterable, Iterator, TypeAlias
 from datetime import datetime
 import pymysql
 import sshtunnel
-import builder_queries as q
-from pymysql import MySQLError
+import builder_queries
+import schema
+from episodestore import EpisodeStore
+from backend import Backend, create_backend
+from instrumentation import InstrumentedBackend, stats
 from config import Config
 
 sshtunnel.SSH_TIMEOUT = 300.0
@@ -23,9 +37,23 @@ sshtunnel.TUNNEL_TIMEOUT = 300.0
 
 JRound : TypeAlias = dict[str, dict[str, str]]
 EpisodeData : TypeAlias = list[JRound]
+# an episode's dump file name (title and airdate) with its rounds
+DumpEntry : TypeAlias = tuple[str, EpisodeData]
 
 DIRECTORY = "jsondump/"
 
+# number of episodes written per transaction by the bulk paths
+BATCH_SIZE = 50
+
+# most rows sent in one multi-row INSERT, to stay well under max_allowed_packet
+MULTIROW_CHUNK = 1000
+
+# default number of parallel writers for ingest_parallel
+WORKERS = 4
+
+# marks the end of a queue of episodes
+DONE = object()
+
 MONEYVALUES_SINGLE = {
     0:200,
     1:400,
@@ -46,14 +74,73 @@ MONEYVALUES_FINAL = {
     0:4000
 }
 
+MONEYVALUES = (MONEYVALUES_SINGLE, MONEYVALUES_DOUBLE, MONEYVALUES_FINAL)
+
+ROUND_NAMES = ("Regular", "Double", "Final")
+
 VALID_ROUNDS = {0, 1, 2}
 
+@contextmanager
+def open_connection() -> Iterator[pymysql.Connection]:
+    """Opens a single tunnel and connection that can be shared by many
+    statements, for the bulk paths that write whole episodes at once."""
+    tunnel = sshtunnel.SSHTunnelForwarder(
+        (Config.SSH_HOST),
+        ssh_username=Config.SSH_USERNAME,
+        ssh_password=Config.SSH_PASSWORD,
+        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306))
+    with stats.tunnel_setup():
+        tunnel.start()
+    try:
+        conn = pymysql.connect(
+            host=Config.LOCALHOST,
+            user=Config.LOCALUSER,
+            passwd=Config.LOCALPASSWORD,
+            db=Config.DATABASE,
+            port=tunnel.local_bind_port,
+            local_infile=Config.LOCAL_INFILE)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    finally:
+        tunnel.stop()
+
+backend: Backend | InstrumentedBackend = create_backend(Config.BACKEND, Config.SQLITE_FILE, open_connection)
+if Config.INSTRUMENT:
+    backend = InstrumentedBackend(backend, stats)
+if Config.STATS_FILE:
+    atexit.register(stats.dump, Config.STATS_FILE)
+q = backend.queries(builder_queries)
+DatabaseError = backend.Error
+
+def migrate() -> None:
+    """Brings the database schema up to date. Safe to run every time.
+    The SQLite backends create their own tables, so only MySQL is migrated."""
+    if backend.dialect != "mysql":
+        return
+    with backend.connection() as conn:
+        version = schema.apply_migrations(conn)
+    print(f"Database schema is at version {version}")
+
 def open_json(json_file: str) -> EpisodeData:
     """Helper function that opens the JSON cleanly."""
     with open(DIRECTORY + json_file, encoding='utf-8') as file:
         json_data = json.load(file)
     return json_data
 
+def iter_dump() -> Iterator[DumpEntry]:
+    """Streams every episode the crawler dumped, one at a time, from either
+    jsondump/ or the episode store depending on Config.DUMP_FORMAT. Episodes
+    from the store are given the file name they would have had in jsondump/."""
+    if Config.DUMP_FORMAT == "store":
+        with EpisodeStore() as store:
+            for _, title, json_data in store:
+                yield f"{title}.json", json_data
+    else:
+        for file in sorted(os.listdir(DIRECTORY)):
+            yield file, open_json(file)
+
 def build_ep_date_from_file(json_file: str) -> datetime:
     """
     Builds an episode datetime object from the filename.
@@ -94,29 +181,18 @@ def build_clues_and_answers(json_round: JRound, category_name: str) -> dict[str,
 
 def insert_episode(json_file: str) -> None:
     """Inserts the new episode in the JSON file into the database."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         episode_date = build_ep_date_from_file(json_file)
         episode_title = build_ep_title_from_file(json_file)
         try:
             cur.execute(q.SQL_INSERT_EPISODE, (episode_date, episode_title))
             cur.connection.commit()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(f"Error: {e}")
             clean_episode_id()
         finally:
             cur.close()
-            conn.close()
 
 def insert_categories(json_round: JRound, round_position: int, episode_id: int) -> None:
     """Inserts categories in a JSON round into the episode."""
@@ -131,28 +207,17 @@ def insert_categories(json_round: JRound, round_position: int, episode_id: int)
     elif round_position == 2:
         what_round = "Final"
 
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             for index, category in enumerate(categories):
                 position = index + 1
                 cur.execute(q.SQL_INSERT_CATEGORY, (category, what_round, position, episode_id))
                 conn.commit()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
         finally:
             cur.close()
-            conn.close()
 
 def insert_clues_and_answers(
     json_round: JRound,
@@ -164,17 +229,7 @@ def insert_clues_and_answers(
         raise ValueError(f"insertCategories: roundPosition must be one of {VALID_ROUNDS}")
 
     clues_and_answers = build_clues_and_answers(json_round, category_name)
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             category_id = get_category_id(category_name, episode_id)
@@ -199,38 +254,26 @@ def insert_clues_and_answers(
                     answer_to_add,
                     money_value))
                 cur.connection.commit()
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
         finally:
             cur.close()
-            conn.close()
 
 def get_episode_id(episode_title: str) -> int:
     """Retrieves the episode ID based on the episode title string.
     The episode title should always be unique."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.SQL_GET_EPISODEID_BY_EPTITLE, (episode_title))
             result = cur.fetchone()
             if result is not None:
                 episode_id = int(result[0])
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
             result = None
         finally:
             cur.close()
-            conn.close()
 
     if episode_id is None:
         raise ValueError("No episode ID found")
@@ -239,115 +282,28 @@ def get_episode_id(episode_title: str) -> int:
 def get_category_id(category_name: str, episode_id: int) -> int:
     """Retrieves the category ID from the database based on the category name.
     NOTE: Category names are not unique, but episode IDs are."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.SQL_GET_CATEGORYID_BY_NAME_AND_EPID, (category_name, episode_id))
             result = cur.fetchone()
             if result is not None:
                 category_id = int(result[0])
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
             result = None
         finally:
             cur.close()
-            conn.close()
 
     if category_id is None:
         raise ValueError("CategoryID not found")
     return category_id
 
-def get_category_ids_by_round(episode_id: int, what_round: str) -> list[int]:
-    """Retrieves all category IDs in an episode's round."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.SQL_GET_CATEGORYIDS_BY_ROUND, (what_round, episode_id))
-            result = cur.fetchall()
-            if result is not None:
-                category_ids = []
-                for row in result:
-                    id_to_add = row[0]
-                    category_ids.append(id_to_add)
-        except MySQLError as e:
-            print(e)
-            category_ids = None
-        finally:
-            cur.close()
-            conn.close()
-
-    if category_ids is None:
-        raise ValueError("No categoryIDs found")
-    return category_ids
-
-def get_clue_ids_by_category_id(category_id: int) -> list[int]:
-    """Retrieves all clue IDs that are associated with a category ID."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.SQL_GET_CLUES_BY_CATEGORYID, (category_id))
-            result = cur.fetchall()
-            if result is not None:
-                clue_ids = []
-                for row in result:
-                    id_to_add = row[0]
-                    clue_ids.append(int(id_to_add))
-        except MySQLError as e:
-            print(e)
-            clue_ids = None
-        finally:
-            cur.close()
-            conn.close()
-
-    if clue_ids is None:
-        raise ValueError("No clueIDs found")
-    return clue_ids
-
 def clean_episode_id() -> None:
     """If the db builder is interrupted, this function can reset the
     auto-increment property of the episodeID field in the episodes
     table. Not at all necessary, but aesthetically pleasing."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(q.SQL_GET_MAX_EPISODEID)
@@ -355,128 +311,443 @@ def clean_episode_id() -> None:
             if max_result is not None:
                 max_id = int(max_result[0]) + 1
                 cur.execute(q.SQL_ALTER_AUTOINCREMENT, (max_id))
-        except MySQLError as e:
+        except DatabaseError as e:
             print(e)
         finally:
             cur.close()
-            conn.close()
 
-def update_category(category_name: str, category_id: int) -> None:
-    """Updates a category that already exists in the database."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
+def get_all_episode_ids() -> dict[str, int]:
+    """Maps every episode title already in the database to its episode ID, so
+    that new and existing episodes can be told apart without a query per file.
+    If a title appears more than once, the lowest episode ID wins."""
+    with backend.connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(q.SQL_UPDATE_CATEGORY, (category_name, category_id))
-            cur.connection.commit()
-        except MySQLError as e:
+            cur.execute(q.SQL_GET_ALL_EPISODES)
+            episode_ids = {}
+            for episode_id, episode_title in cur.fetchall():
+                episode_ids.setdefault(str(episode_title), int(episode_id))
+        except DatabaseError as e:
             print(e)
+            episode_ids = None
         finally:
             cur.close()
-            conn.close()
 
-def update_clues_and_answers(question: str, answer: str, clue_id: int) -> None:
-    """Updates the clues and answers that already exist in the database.
-    NOTE: A better way to run this would be to check for the x value."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.SQL_UPDATE_CLUES, (question, answer, clue_id))
-            conn.commit()
-        except MySQLError as e:
-            print(e)
-        finally:
-            cur.close()
-            conn.close()
+    if episode_ids is None:
+        raise ValueError("Can't retrieve episode titles")
+    return episode_ids
+
+def build_category_rows(json_data: EpisodeData, episode_id: int) -> list[tuple[str, str, int, int]]:
+    """Builds the (name, round, position, episodeID) rows for an episode's categories."""
+    return [
+        (category, ROUND_NAMES[round_position], index + 1, episode_id)
+        for round_position, jround in enumerate(json_data)
+        for index, category in enumerate(build_categories(jround))]
+
+def build_clue_rows(json_data: EpisodeData,
+                    category_ids: dict[tuple[str, int], int]) -> list[tuple[int, str, str, int]]:
+    """Builds the (categoryID, question, answer, moneyvalue) rows for an episode's
+    clues, given its category IDs keyed by round and position."""
+    clue_rows = []
+    for round_position, jround in enumerate(json_data):
+        money_value_lookup = MONEYVALUES[round_position]
+        for index, category in enumerate(build_categories(jround)):
+            category_id = category_ids[(ROUND_NAMES[round_position], index + 1)]
+            clues_and_answers = build_clues_and_answers(jround, category)
+            for i, (clue, answer) in enumerate(clues_and_answers.items()):
+                clue_rows.append((category_id, clue, answer, money_value_lookup[i]))
+    return clue_rows
+
+def write_episode(cur: pymysql.cursors.Cursor, json_file: str, json_data: EpisodeData) -> int:
+    """Writes a new episode, its categories, and its clues using the given cursor.
+    Categories and clues are each sent as a single multi-row insert. Nothing is
+    committed here - the caller owns the transaction. Returns the new episode ID."""
+    episode_date = build_ep_date_from_file(json_file)
+    episode_title = build_ep_title_from_file(json_file)
+    cur.execute(q.SQL_INSERT_EPISODE, (episode_date, episode_title))
+    episode_id = cur.lastrowid
+
+    cur.executemany(q.SQL_INSERT_CATEGORY, build_category_rows(json_data, episode_id))
+
+    # categories are matched back up by round and position, since names aren't unique
+    cur.execute(q.SQL_GET_CATEGORYIDS_BY_EPID, (episode_id))
+    category_ids = {(row[1], int(row[2])): int(row[0]) for row in cur.fetchall()}
+
+    cur.executemany(q.SQL_INSERT_CLUE, build_clue_rows(json_data, category_ids))
+    return episode_id
 
-def is_ep_in_database(episode_title: str) -> bool:
-    """Checks if the episode title already exists in the database.
-    If it does, that indicates that the episode should be updated,
-    rather than added."""
-    with sshtunnel.SSHTunnelForwarder(
-        (Config.SSH_HOST),
-        ssh_username=Config.SSH_USERNAME,
-        ssh_password=Config.SSH_PASSWORD,
-        remote_bind_address=(Config.SSH_REMOTE_BIND_ADDRESS, 3306)) as tunnel:
-        conn = pymysql.connect(
-            host=Config.LOCALHOST,
-            user=Config.LOCALUSER,
-            passwd=Config.LOCALPASSWORD,
-            db=Config.DATABASE,
-            port=tunnel.local_bind_port)
-        cur = conn.cursor()
-        try:
-            cur.execute(q.SQL_GET_EPTITLE_EXISTENCE, (episode_title))
-            result = cur.fetchone()
-        except MySQLError as e:
-            print(e)
-        finally:
-            cur.close()
-            conn.close()
+def write_episodes_executemany(cur: pymysql.cursors.Cursor, episodes: list[DumpEntry]) -> dict[str, int]:
+    """The "executemany" ingest strategy: writes a batch one episode at a time
+    with write_episode, so each episode costs a handful of round trips.
+    Returns the titles and episode IDs of the episodes written."""
+    return {
+        build_ep_title_from_file(json_file): write_episode(cur, json_file, json_data)
+        for json_file, json_data in episodes}
+
+def values_list(placeholder: str, count: int) -> str:
+    """Repeats a placeholder group, for a multi-row VALUES clause or an IN list."""
+    return ", ".join([placeholder] * count)
+
+def insert_rows(cur: pymysql.cursors.Cursor, query: str, placeholder: str, rows: list[tuple]) -> None:
+    """Inserts rows with as few multi-row INSERTs as MULTIROW_CHUNK allows."""
+    for start in range(0, len(rows), MULTIROW_CHUNK):
+        chunk = rows[start:start + MULTIROW_CHUNK]
+        cur.execute(query.format(values=values_list(placeholder, len(chunk))),
+                    [value for row in chunk for value in row])
+
+def insert_batch_episodes(cur: pymysql.cursors.Cursor, episodes: list[DumpEntry]) -> dict[str, int]:
+    """Inserts the episode rows of a batch in one statement, then reads their IDs
+    back by title. The batch's titles are all new, so each matches one row."""
+    titles = [build_ep_title_from_file(json_file) for json_file, _ in episodes]
+    insert_rows(cur, q.SQL_INSERT_EPISODES, "(%s, %s)", [
+        (build_ep_date_from_file(json_file), title)
+        for (json_file, _), title in zip(episodes, titles)])
+    cur.execute(q.SQL_GET_EPISODEIDS_BY_EPTITLES.format(titles=values_list("%s", len(titles))), titles)
+    episode_ids = {}
+    for episode_id, episode_title in cur.fetchall():
+        episode_ids.setdefault(str(episode_title), int(episode_id))
+    return episode_ids
+
+def get_batch_category_ids(cur: pymysql.cursors.Cursor,
+                           episode_ids: Iterable[int]) -> dict[int, dict[tuple[str, int], int]]:
+    """Reads back the category IDs of a batch of episodes in one query,
+    keyed by episode ID and then by round and position."""
+    episode_ids = list(episode_ids)
+    cur.execute(q.SQL_GET_CATEGORYIDS_BY_EPIDS.format(episode_ids=values_list("%s", len(episode_ids))),
+                episode_ids)
+    category_ids: dict[int, dict[tuple[str, int], int]] = {}
+    for category_id, episode_id, what_round, position in cur.fetchall():
+        category_ids.setdefault(int(episode_id), {})[(what_round, int(position))] = int(category_id)
+    return category_ids
 
-    if result is None:
-        return False
-    return True
-
-def update_database() -> None:
-    """Updates the database, file by file, beginning at the episode level
-    and working down to categories, then clues. If the episode doesn't
-    already exist in the database, it is added. Otherwise, it will
-    update."""
-    for file in os.listdir(DIRECTORY):
-        episode_title = build_ep_title_from_file(file)
-        json_data = open_json(file)
-        check = is_ep_in_database(episode_title)
-        if check is False:
-            print(f"Attempting to add {episode_title}...")
-            insert_episode(file)
-            for round_position, jround in enumerate(json_data):
-                categories = build_categories(jround)
-                episode_id = get_episode_id(episode_title)
-                insert_categories(jround, round_position, episode_id)
-                for category in categories:
-                    insert_clues_and_answers(jround, round_position, category, episode_id)
-            print("Episode added to database!")
-        else:
-            episode_id = get_episode_id(episode_title)
-            print(f"Updating {episode_title}...")
-            for round_position, jround in enumerate(json_data):
-                what_round = ""
-                match round_position:
-                    case 0:
-                        what_round = "Regular"
-                    case 1:
-                        what_round = "Double"
-                    case 2:
-                        what_round = "Final"
-                category_ids = get_category_ids_by_round(episode_id, what_round)
-                new_category_names = build_categories(jround)
-                for i, cat_id in enumerate(category_ids):
-                    update_category(new_category_names[i], cat_id)
-                    clue_ids = get_clue_ids_by_category_id(cat_id)
-                    new_clues = list(build_clues_and_answers(jround, new_category_names[i]).keys())
-                    new_answers = list(build_clues_and_answers(
-                        jround,
-                        new_category_names[i]).values())
-                    for c, clue_id in enumerate(clue_ids):
-                        update_clues_and_answers(new_clues[c], new_answers[c], clue_id)
-            print("Episode updated!")
+def write_episodes_multirow(cur: pymysql.cursors.Cursor, episodes: list[DumpEntry]) -> dict[str, int]:
+    """The "multirow" ingest strategy: writes a whole batch with one multi-row
+    INSERT per table (split every MULTIROW_CHUNK rows), so a batch costs a few
+    round trips however many episodes are in it. Returns the titles and
+    episode IDs of the episodes written."""
+    episode_ids = insert_batch_episodes(cur, episodes)
+    category_rows = [
+        row
+        for json_file, json_data in episodes
+        for row in build_category_rows(json_data, episode_ids[build_ep_title_from_file(json_file)])]
+    insert_rows(cur, q.SQL_INSERT_CATEGORIES, "(%s, %s, %s, %s)", category_rows)
+    category_ids = get_batch_category_ids(cur, episode_ids.values())
+    clue_rows = [
+        row
+        for json_file, json_data in episodes
+        for row in build_clue_rows(json_data, category_ids[episode_ids[build_ep_title_from_file(json_file)]])]
+    insert_rows(cur, q.SQL_INSERT_CLUES, "(%s, %s, %s, %s)", clue_rows)
+    return episode_ids
+
+def tsv_field(value: object) -> str:
+    """Formats a value for LOAD DATA's default tab-separated format."""
+    if value is None:
+        return "\\N"
+    return (str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+            .replace("\0", "\\0"))
+
+def load_rows(cur: pymysql.cursors.Cursor, query: str, rows: list[tuple]) -> None:
+    """Writes rows to a temporary tab-separated file and bulk loads it."""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n",
+                                     suffix=".tsv", delete=False) as file:
+        for row in rows:
+            file.write("\t".join(tsv_field(value) for value in row) + "\n")
+    try:
+        cur.execute(query, (file.name,))
+    finally:
+        os.remove(file.name)
+
+def write_episodes_loaddata(cur: pymysql.cursors.Cursor, episodes: list[DumpEntry]) -> dict[str, int]:
+    """The "loaddata" ingest strategy: like "multirow", but categories and clues
+    are bulk loaded with LOAD DATA LOCAL INFILE. Needs Config.LOCAL_INFILE and a
+    server with local_infile enabled. Backends other than MySQL use "multirow"."""
+    if backend.dialect != "mysql":
+        return write_episodes_multirow(cur, episodes)
+    episode_ids = insert_batch_episodes(cur, episodes)
+    load_rows(cur, q.SQL_LOAD_CATEGORIES, [
+        row
+        for json_file, json_data in episodes
+        for row in build_category_rows(json_data, episode_ids[build_ep_title_from_file(json_file)])])
+    category_ids = get_batch_category_ids(cur, episode_ids.values())
+    load_rows(cur, q.SQL_LOAD_CLUES, [
+        row
+        for json_file, json_data in episodes
+        for row in build_clue_rows(json_data, category_ids[episode_ids[build_ep_title_from_file(json_file)]])])
+    return episode_ids
+
+# the ways insert_episodes_bulk can write a batch of new episodes
+INGEST_STRATEGIES = {
+    "executemany": write_episodes_executemany,
+    "multirow": write_episodes_multirow,
+    "loaddata": write_episodes_loaddata
+}
+
+def insert_episodes_bulk(conn: pymysql.Connection,
+                         episodes: list[DumpEntry],
+                         strategy: str = Config.INGEST_STRATEGY) -> dict[str, int]:
+    """Inserts a batch of new episodes over the given connection, in a single
+    transaction, with one of the INGEST_STRATEGIES. If any episode fails, the
+    whole batch is rolled back and the error is raised. Returns the titles and
+    episode IDs of the episodes inserted."""
+    write = INGEST_STRATEGIES[strategy]
+    cur = conn.cursor()
+    try:
+        conn.begin()
+        inserted = write(cur, episodes)
+        conn.commit()
+    except DatabaseError:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return inserted
+
+def upsert_episode(cur: pymysql.cursors.Cursor, episode_id: int, json_data: EpisodeData) -> int:
+    """Brings an existing episode in line with its dump using the given cursor.
+    The stored episode is read back in one query and compared in memory, and
+    only the categories and clues that differ are written, each set as one
+    INSERT ... ON DUPLICATE KEY UPDATE. Nothing is committed here - the caller
+    owns the transaction. Returns the number of rows written."""
+    cur.execute(q.SQL_GET_EPISODE_CONTENTS, (episode_id))
+    stored_categories = {}
+    stored_clues = {}
+    for category_id, what_round, position, name, clue_id, moneyvalue, question, answer in cur.fetchall():
+        stored_categories[(what_round, int(position))] = (int(category_id), name)
+        if clue_id is not None:
+            stored_clues[(int(category_id), int(moneyvalue))] = (int(clue_id), question, answer)
+
+    category_rows = []
+    for round_position, jround in enumerate(json_data):
+        for index, name in enumerate(build_categories(jround)):
+            what_round, position = ROUND_NAMES[round_position], index + 1
+            stored_category = stored_categories.get((what_round, position))
+            if stored_category is None or stored_category[1] != name:
+                category_id = stored_category[0] if stored_category is not None else None
+                category_rows.append((category_id, name, what_round, position, episode_id))
+    if len(category_rows) > 0:
+        cur.executemany(q.SQL_UPSERT_CATEGORY, category_rows)
+
+    category_ids = {key: value[0] for key, value in stored_categories.items()}
+    if any(row[0] is None for row in category_rows):
+        # new categories were added, so their IDs need to be read back
+        cur.execute(q.SQL_GET_CATEGORYIDS_BY_EPID, (episode_id))
+        category_ids = {(row[1], int(row[2])): int(row[0]) for row in cur.fetchall()}
+
+    clue_rows = []
+    for round_position, jround in enumerate(json_data):
+        money_value_lookup = MONEYVALUES[round_position]
+        for index, name in enumerate(build_categories(jround)):
+            category_id = category_ids[(ROUND_NAMES[round_position], index + 1)]
+            clues_and_answers = build_clues_and_answers(jround, name)
+            for i, (question, answer) in enumerate(clues_and_answers.items()):
+                moneyvalue = money_value_lookup[i]
+                stored_clue = stored_clues.get((category_id, moneyvalue))
+                if stored_clue is None or (stored_clue[1], stored_clue[2]) != (question, answer):
+                    clue_id = stored_clue[0] if stored_clue is not None else None
+                    clue_rows.append((clue_id, category_id, question, answer, moneyvalue))
+    if len(clue_rows) > 0:
+        cur.executemany(q.SQL_UPSERT_CLUE, clue_rows)
+    return len(category_rows) + len(clue_rows)
+
+def upsert_episodes_bulk(conn: pymysql.Connection, episodes: list[tuple[int, EpisodeData]]) -> int:
+    """Upserts a batch of existing episodes over the given connection, in a
+    single transaction. If any episode fails, the whole batch is rolled back
+    and the error is raised. Returns the number of rows written."""
+    written = 0
+    cur = conn.cursor()
+    try:
+        conn.begin()
+        for episode_id, json_data in episodes:
+            written += upsert_episode(cur, episode_id, json_data)
+        conn.commit()
+    except DatabaseError:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return written
+
+class IngestProgress():
+    """Counts the episodes written by one or more ingest workers, and prints
+    progress and throughput every `interval` seconds."""
+
+    def __init__(self, interval: float = 10.0):
+        self.interval = interval
+        self.added = 0
+        self.updated = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_report = self._start
+
+    def add(self, added: int = 0, updated: int = 0, rows: int = 0) -> None:
+        """Records a written batch, reporting if it's been a while."""
+        with self._lock:
+            self.added += added
+            self.updated += updated
+            self.rows += rows
+            now = time.monotonic()
+            due = now - self._last_report >= self.interval
+            if due:
+                self._last_report = now
+        if due:
+            self.report()
+
+    def report(self) -> None:
+        """Prints the episodes written so far and the rate they were written at."""
+        elapsed = max(time.monotonic() - self._start, 1e-9)
+        total = self.added + self.updated
+        print(f"Progress: {total} episodes ({self.added} added, {self.updated} updated, "
+              f"{self.rows} changed rows) in {elapsed:.0f}s - {total / elapsed:.1f} episodes/s")
+
+def flush_batches(conn: pymysql.Connection,
+                  new_batch: list[DumpEntry],
+                  update_batch: list[tuple[int, EpisodeData]],
+                  episode_ids: dict[str, int],
+                  progress: IngestProgress,
+                  strategy: str = Config.INGEST_STRATEGY) -> None:
+    """Writes out the pending batches of new and existing episodes and empties
+    them. The IDs of newly inserted episodes are added to episode_ids. A batch
+    that fails is rolled back and its error raised, rather than skipped."""
+    if len(update_batch) > 0:
+        written = upsert_episodes_bulk(conn, update_batch)
+        progress.add(updated=len(update_batch), rows=written)
+        update_batch.clear()
+    if len(new_batch) > 0:
+        inserted = insert_episodes_bulk(conn, new_batch, strategy)
+        episode_ids.update(inserted)
+        progress.add(added=len(inserted))
+        new_batch.clear()
+
+def ingest(episodes: Iterable[DumpEntry | None],
+           episode_ids: dict[str, int] | None = None,
+           progress: IngestProgress | None = None,
+           strategy: str = Config.INGEST_STRATEGY) -> None:
+    """Writes a stream of episodes to the database over a single connection.
+    New episodes are inserted (with the given ingest strategy, see
+    INGEST_STRATEGIES), and episodes that already exist are upserted.
+    Both are collected into batches of BATCH_SIZE and written in one
+    transaction per batch. A None in the stream writes out the pending
+    batches early; the streaming pipeline sends one whenever the crawler
+    goes quiet, so episodes don't sit waiting for a full batch. A batch that
+    fails is rolled back and stops the ingest with its error."""
+    if episode_ids is None:
+        episode_ids = get_all_episode_ids()
+    report_at_end = progress is None
+    if progress is None:
+        progress = IngestProgress()
+    pending_titles = set()
+    new_batch = []
+    update_batch = []
+    with backend.connection() as conn:
+        for entry in episodes:
+            if entry is None:
+                flush_batches(conn, new_batch, update_batch, episode_ids, progress, strategy)
+                pending_titles.clear()
+                continue
+            file, json_data = entry
+            episode_title = build_ep_title_from_file(file)
+            if episode_title in pending_titles:
+                # a second file with the same title updates the first, so the first must land
+                flush_batches(conn, new_batch, update_batch, episode_ids, progress, strategy)
+                pending_titles.clear()
+            if episode_title in episode_ids:
+                update_batch.append((episode_ids[episode_title], json_data))
+            else:
+                new_batch.append((file, json_data))
+                pending_titles.add(episode_title)
+            if len(new_batch) + len(update_batch) >= BATCH_SIZE:
+                flush_batches(conn, new_batch, update_batch, episode_ids, progress, strategy)
+                pending_titles.clear()
+        flush_batches(conn, new_batch, update_batch, episode_ids, progress, strategy)
+    if report_at_end:
+        progress.report()
+
+def shard_of(file: str, shards: int) -> int:
+    """Picks the shard an episode belongs to from its title. The same title
+    always lands in the same shard, so two files with one title are handled
+    by one worker, in the order they were read."""
+    return zlib.crc32(build_ep_title_from_file(file).encode("utf-8")) % shards
+
+def drain(episodes: queue.Queue, flush_seconds: float | None = None) -> Iterator[DumpEntry | None]:
+    """Yields episodes off a queue until DONE is taken off it. If flush_seconds
+    is set, yields None whenever the queue stays empty that long, so that the
+    writer flushes its pending batches instead of waiting for them to fill."""
+    while True:
+        try:
+            entry = episodes.get(timeout=flush_seconds)
+        except queue.Empty:
+            yield None
+            continue
+        if entry is DONE:
+            return
+        yield entry
+
+def ingest_parallel(episodes: Iterable[DumpEntry | None],
+                    workers: int = WORKERS,
+                    flush_seconds: float | None = None,
+                    strategy: str = Config.INGEST_STRATEGY) -> None:
+    """Writes a stream of episodes to the database with `workers` threads, each
+    running ingest() over its own connection. Episodes are sharded by title
+    (see shard_of), so conflicting titles never race between workers. A None
+    in the stream is passed on to every worker. If a worker fails, no more
+    episodes are handed out, and its error is raised once the others finish."""
+    if not backend.concurrent_writers:
+        print(f"The {backend.name} backend has a single connection, so writing with one worker")
+        ingest(episodes, strategy=strategy)
+        return
+    episode_ids = get_all_episode_ids()
+    progress = IngestProgress()
+    shards = [queue.Queue(maxsize=BATCH_SIZE * 2) for _ in range(workers)]
+    errors = []
+    failed = threading.Event()
+
+    def work(shard: queue.Queue) -> None:
+        try:
+            # each worker only ever sees its own titles, so a shared map is safe
+            ingest(drain(shard, flush_seconds), episode_ids, progress, strategy)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            errors.append(e)
+            failed.set()
+            # keep taking episodes so the reader never blocks on a dead worker
+            for _ in drain(shard):
+                pass
+
+    threads = [threading.Thread(target=work, args=(shard,), name=f"ingest-{n}", daemon=True)
+               for n, shard in enumerate(shards)]
+    for thread in threads:
+        thread.start()
+    try:
+        for entry in episodes:
+            if failed.is_set():
+                break
+            if entry is None:
+                for shard in shards:
+                    shard.put(None)
+            else:
+                shards[shard_of(entry[0], workers)].put(entry)
+    finally:
+        for shard in shards:
+            shard.put(DONE)
+        for thread in threads:
+            thread.join()
+    progress.report()
+    if errors:
+        raise errors[0]
+
+def update_database(workers: int = 1, strategy: str = Config.INGEST_STRATEGY) -> None:
+    """Updates the database from everything the crawler has dumped, episode
+    by episode. With more than one worker, the dump is sharded across that
+    many parallel writers. New episodes are written with the given ingest
+    strategy (see INGEST_STRATEGIES)."""
+    if strategy not in INGEST_STRATEGIES:
+        raise ValueError(f"Unknown ingest strategy {strategy!r}: expected one of {', '.join(INGEST_STRATEGIES)}")
+    migrate()
+    if workers > 1:
+        ingest_parallel(iter_dump(), workers, strategy=strategy)
+    else:
+        ingest(iter_dump(), strategy=strategy)
@@ -0,0 +1,152 @@
+"""
+Picks random episodes without asking the database to sort the whole episodes
+table. The list of episode IDs (and of episodes with missing clues) is cached
+in the process and refreshed every few minutes, so a pick is a constant-time
+choice from memory. Filters for episodes a player has already played and for
+episodes with missing clues are applied to that cached list. If they rule out
+every cached episode, the list is reloaded once before giving up, in case the
+builder has added episodes since it was loaded.
+"""
+
+import random
+import threading
+import time
+from typing import Collection
+from utils.settings import Config
+import utils.access_queries as access_queries
+from utils.connection import backend
+from utils.replica import replica
+
+# rejection sampling tries this many random picks before filtering the whole list
+SAMPLE_ATTEMPTS = 32
+
+q = backend.queries(access_queries)
+
+class EpisodePicker():
+    """Uniform random episode selection over a cached list of episode IDs."""
+
+    def __init__(self, refresh_seconds: float = Config.EPISODE_CACHE_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._episode_ids: list[int] = []
+        self._incomplete: set[int] = set()
+        self._loaded_at = float("-inf")
+
+    def _refresh(self, force: bool = False) -> None:
+        """Reloads the episode ID lists if they have gone stale, or if forced."""
+        with self._lock:
+            if not force and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            if replica.enabled:
+                self._episode_ids = replica.episode_ids()
+                self._incomplete = replica.incomplete_episode_ids()
+                self._loaded_at = time.monotonic()
+                return
+            with backend.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(q.GET_ALL_EPISODE_IDS)
+                    episode_ids = [int(row[0]) for row in cur.fetchall()]
+                    cur.execute(q.GET_INCOMPLETE_EPISODE_IDS)
+                    incomplete = {int(row[0]) for row in cur.fetchall()}
+                except backend.Error as e:
+                    print(f"Error: {e}")
+                    return
+                finally:
+                    cur.close()
+            self._episode_ids = episode_ids
+            self._incomplete = incomplete
+            self._loaded_at = time.monotonic()
+
+    def _played(self, user_id: int) -> set[int]:
+        """Retrieves every episode ID the player has a score for."""
+        with backend.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(q.GET_PLAYED_EPISODE_IDS, (user_id))
+                return {int(row[0]) for row in cur.fetchall()}
+            except backend.Error as e:
+                print(f"Error: {e}")
+                return set()
+            finally:
+                cur.close()
+
+    def _pick_by_id_range(self) -> int | None:
+        """Falls back to picking a random point in the episode ID range, for
+        when the cached list can't be loaded. Gaps in the IDs make this
+        slightly less than uniform."""
+        with backend.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(q.GET_RANDOM_EP)
+                result = cur.fetchone()
+            except backend.Error as e:
+                print(f"Error: {e}")
+                result = None
+            finally:
+                cur.close()
+        if result is None:
+            return None
+        return int(result[0])
+
+    def pick(self,
+             user_id: int | None = None,
+             exclude_played: bool = False,
+             complete_only: bool = False,
+             just_played: Collection[int] = ()) -> int:
+        """
+        Picks an episode ID uniformly at random.
+
+        Parameters
+        ----------
+        user_id : int | None
+            The player to pick for. Needed if exclude_played is set.
+        exclude_played : bool
+            Skip episodes the player already has a score for.
+        complete_only : bool
+            Skip episodes with any clue or category missing on j-archive.
+        just_played : Collection[int]
+            Episodes the player has played whose scores may not be written
+            yet. Skipped along with the rest if exclude_played is set.
+        """
+        self._refresh()
+        if len(self._episode_ids) == 0:
+            episode_id = self._pick_by_id_range()
+            if episode_id is None:
+                raise ValueError("EpisodeID not found")
+            return episode_id
+
+        episode_id = self._pick_cached(user_id, exclude_played, complete_only, just_played)
+        if episode_id is None:
+            # every cached episode is filtered out, but the builder may have added more
+            self._refresh(force=True)
+            episode_id = self._pick_cached(user_id, exclude_played, complete_only, just_played)
+        if episode_id is None:
+            raise ValueError("No episodes left that match the filters")
+        return episode_id
+
+    def _pick_cached(self,
+                     user_id: int | None,
+                     exclude_played: bool,
+                     complete_only: bool,
+                     just_played: Collection[int]) -> int | None:
+        """Picks from the cached list, or returns None if the filters rule out every episode in it."""
+        episode_ids = self._episode_ids
+        excluded = set()
+        if complete_only:
+            excluded |= self._incomplete
+        if exclude_played and user_id is not None:
+            excluded |= self._played(user_id) | set(just_played)
+
+        # most episodes pass the filters, so a few random picks almost always
+        # find one without touching the rest of the list
+        for _ in range(SAMPLE_ATTEMPTS):
+            episode_id = random.choice(episode_ids)
+            if episode_id not in excluded:
+                return episode_id
+        candidates = [episode_id for episode_id in episode_ids if episode_id not in excluded]
+        if len(candidates) == 0:
+            return None
+        return random.choice(candidates)
+
+picker = EpisodePicker()
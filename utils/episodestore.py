@@ -0,0 +1,89 @@
+"""
+A single-file alternative to one-JSON-file-per-episode in jsondump/. Every
+episode is kept as a row in one SQLite file, with its rounds stored as
+zlib-compressed JSON. Episodes can be looked up by game_id or title, or
+streamed one at a time in game_id order, without opening thousands of files.
+"""
+
+import json
+import sqlite3
+import zlib
+from typing import Any, Iterator
+
+STORE_FILE = "jsondump.sqlite3"
+
+CREATE_EPISODES = """
+    CREATE TABLE IF NOT EXISTS episodes (
+        game_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        data BLOB NOT NULL
+    )
+"""
+
+CREATE_TITLE_INDEX = """
+    CREATE INDEX IF NOT EXISTS episodes_title ON episodes (title)
+"""
+
+def pack(episode_data: Any) -> bytes:
+    """Compresses an episode's rounds for storage."""
+    return zlib.compress(json.dumps(episode_data, separators=(",", ":")).encode("utf-8"))
+
+def unpack(blob: bytes) -> Any:
+    """Restores an episode's rounds from storage."""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+class EpisodeStore():
+    """The episode store. Use as a context manager so writes are committed."""
+
+    def __init__(self, path: str = STORE_FILE):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(CREATE_EPISODES)
+        self._conn.execute(CREATE_TITLE_INDEX)
+
+    def __enter__(self) -> "EpisodeStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+
+    def put(self, game_id: int | str, title: str, episode_data: Any) -> None:
+        """Adds an episode, replacing any earlier copy with the same game_id."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO episodes (game_id, title, data) VALUES (?, ?, ?)",
+            (int(game_id), title, pack(episode_data)))
+
+    def get(self, game_id: int | str) -> tuple[str, Any] | None:
+        """Returns the title and rounds of an episode, or None if it isn't stored."""
+        row = self._conn.execute(
+            "SELECT title, data FROM episodes WHERE game_id = ?", (int(game_id),)).fetchone()
+        if row is None:
+            return None
+        return row[0], unpack(row[1])
+
+    def get_by_title(self, title: str) -> tuple[int, Any] | None:
+        """Returns the game_id and rounds of an episode by its title."""
+        row = self._conn.execute(
+            "SELECT game_id, data FROM episodes WHERE title = ? ORDER BY game_id",
+            (title,)).fetchone()
+        if row is None:
+            return None
+        return row[0], unpack(row[1])
+
+    def __iter__(self) -> Iterator[tuple[int, str, Any]]:
+        """Streams every episode as (game_id, title, rounds), one at a time."""
+        cursor = self._conn.execute("SELECT game_id, title, data FROM episodes ORDER BY game_id")
+        for game_id, title, data in cursor:
+            yield game_id, title, unpack(data)
+
+    def commit(self) -> None:
+        """Commits any episodes added since the last commit."""
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Commits and closes the store."""
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,319 @@
+"""
+Per-query timing for dbaccess and dbbuilder. InstrumentedBackend wraps a
+backend (see utils.backend) so that every statement run on its connections
+is recorded in a Registry under the name of its constant in access_queries
+or builder_queries, with its wall time split into
+
+    tunnel   starting (or restarting) the SSH tunnel
+    connect  borrowing or opening the connection
+    execute  execute() and executemany()
+    fetch    fetchone(), fetchmany(), fetchall(), and iterating the cursor
+
+along with the rows it returned or changed and the errors it raised.
+Tunnel and connect time is charged to the first statement run on the
+connection, since that statement is the one kept waiting for it.
+
+The registry can be read in process (the admin's debug menu shows the
+slowest queries), or dumped as JSON or Prometheus text.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Iterator
+from prettytable import PrettyTable
+
+PHASES = ("tunnel", "connect", "execute", "fetch")
+
+# statements that aren't one of the named queries (schema migrations, ad hoc SQL)
+UNNAMED = "(unnamed)"
+
+class QueryStats():
+    """Running totals for one named query."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.max_execute = 0.0
+
+    @property
+    def total_seconds(self) -> float:
+        """Time spent on the query across every phase and call."""
+        return sum(self.seconds.values())
+
+    @property
+    def mean_seconds(self) -> float:
+        """Time spent on the query per call, across every phase."""
+        return self.total_seconds / self.calls if self.calls > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """The totals, as plain values for a JSON dump."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "seconds": dict(self.seconds),
+            "mean_seconds": self.mean_seconds,
+            "max_execute_seconds": self.max_execute}
+
+class Registry():
+    """Collects QueryStats by query name. Safe to use from every thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._names: dict[str, str] = {}
+        self._templates: list[tuple[str, str]] = []
+        self.queries: dict[str, QueryStats] = {}
+        self.connections = 0
+        self.tunnels = 0
+
+    def name_queries(self, queries: ModuleType | Any) -> None:
+        """Learns the names of the queries in a query module (or the namespace
+        backend.queries() made from it). Queries that are filled in with
+        str.format() before they run are matched on the text before the first field."""
+        with self._lock:
+            for name, value in vars(queries).items():
+                if not name.isupper() or not isinstance(value, str):
+                    continue
+                self._names.setdefault(value, name)
+                if "{" in value:
+                    self._templates.append((value[:value.index("{")], name))
+
+    def name_of(self, query: str) -> str:
+        """The name of the constant a query came from."""
+        name = self._names.get(query)
+        if name is not None:
+            return name
+        for prefix, name in self._templates:
+            if query.startswith(prefix):
+                return name
+        return UNNAMED
+
+    @contextmanager
+    def tunnel_setup(self) -> Iterator[None]:
+        """Times starting the SSH tunnel, for the next connection borrowed on this thread."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.tunnel = getattr(self._local, "tunnel", 0.0) + time.perf_counter() - start
+            with self._lock:
+                self.tunnels += 1
+
+    def take_tunnel_time(self) -> float:
+        """Returns, and clears, the tunnel time waiting on this thread."""
+        seconds = getattr(self._local, "tunnel", 0.0)
+        self._local.tunnel = 0.0
+        return seconds
+
+    def record(self, name: str, phase: str, seconds: float, rows: int = 0,
+               call: bool = False, error: bool = False) -> None:
+        """Adds time (and rows, a call, or an error) to a query's totals."""
+        with self._lock:
+            query_stats = self.queries.get(name)
+            if query_stats is None:
+                query_stats = self.queries[name] = QueryStats()
+            query_stats.seconds[phase] += seconds
+            query_stats.rows += rows
+            if call:
+                query_stats.calls += 1
+            if error:
+                query_stats.errors += 1
+            if phase == "execute":
+                query_stats.max_execute = max(query_stats.max_execute, seconds)
+
+    def record_connection(self) -> None:
+        """Counts a connection borrowed from the backend."""
+        with self._lock:
+            self.connections += 1
+
+    def snapshot(self) -> dict[str, QueryStats]:
+        """A copy of every query's totals, safe to read while queries keep running."""
+        with self._lock:
+            copies = {}
+            for name, query_stats in self.queries.items():
+                copy = QueryStats()
+                copy.__dict__.update(query_stats.__dict__, seconds=dict(query_stats.seconds))
+                copies[name] = copy
+            return copies
+
+    def reset(self) -> None:
+        """Forgets everything recorded so far. Query names are kept."""
+        with self._lock:
+            self.queries.clear()
+            self.connections = 0
+            self.tunnels = 0
+
+    def slowest(self, limit: int = 10) -> PrettyTable:
+        """A table of the queries that take longest per call."""
+        table = PrettyTable(["Query", "Calls", "Errors", "Rows", "Mean ms", "Max execute ms"]
+                            + [f"{phase.capitalize()} ms" for phase in PHASES])
+        ranked = sorted(self.snapshot().items(), key=lambda item: item[1].mean_seconds, reverse=True)
+        for name, query_stats in ranked[:limit]:
+            table.add_row([name, query_stats.calls, query_stats.errors, query_stats.rows,
+                           f"{query_stats.mean_seconds * 1000:.2f}", f"{query_stats.max_execute * 1000:.2f}"]
+                          + [f"{query_stats.seconds[phase] * 1000:.1f}" for phase in PHASES])
+        return table
+
+    def to_json(self) -> str:
+        """Every query's totals as JSON."""
+        queries = self.snapshot()
+        return json.dumps({
+            "connections": self.connections,
+            "tunnels": self.tunnels,
+            "queries": {name: query_stats.as_dict() for name, query_stats in sorted(queries.items())}}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Every query's totals in the Prometheus text exposition format."""
+        queries = sorted(self.snapshot().items())
+        lines = [
+            "# HELP jenopardy_connections_total Connections borrowed from the backend.",
+            "# TYPE jenopardy_connections_total counter",
+            f"jenopardy_connections_total {self.connections}",
+            "# HELP jenopardy_tunnels_total SSH tunnels started.",
+            "# TYPE jenopardy_tunnels_total counter",
+            f"jenopardy_tunnels_total {self.tunnels}",
+            "# HELP jenopardy_query_seconds_total Time spent on each query, by phase.",
+            "# TYPE jenopardy_query_seconds_total counter"]
+        lines += [f'jenopardy_query_seconds_total{{query="{name}",phase="{phase}"}} {query_stats.seconds[phase]}'
+                  for name, query_stats in queries
+                  for phase in PHASES]
+        for metric, kind, description, value in (
+                ("calls_total", "counter", "Times each query was run.", "calls"),
+                ("errors_total", "counter", "Times each query raised a database error.", "errors"),
+                ("rows_total", "counter", "Rows each query returned or changed.", "rows"),
+                ("max_execute_seconds", "gauge", "Slowest execute of each query.", "max_execute")):
+            lines += [f"# HELP jenopardy_query_{metric} {description}",
+                      f"# TYPE jenopardy_query_{metric} {kind}"]
+            lines += [f'jenopardy_query_{metric}{{query="{name}"}} {getattr(query_stats, value)}'
+                      for name, query_stats in queries]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Writes every query's totals to a file: Prometheus text if the
+        file name ends in .prom, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+
+class InstrumentedCursor():
+    """A cursor that records the time and rows of everything run on it.
+    Anything not timed is passed through to the wrapped cursor."""
+
+    def __init__(self, cursor: Any, connection: "InstrumentedConnection"):
+        self._cursor = cursor
+        self._connection = connection
+        self._name = UNNAMED
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def _run(self, method: str, query: str, args: Any) -> int:
+        """Times one execute() or executemany(), charging any setup time to it."""
+        self._name = self._connection.registry.name_of(query)
+        for phase, seconds in self._connection.take_setup().items():
+            self._connection.registry.record(self._name, phase, seconds)
+        start = time.perf_counter()
+        try:
+            result = getattr(self._cursor, method)(query, args)
+        except self._connection.error:
+            self._connection.registry.record(self._name, "execute", time.perf_counter() - start,
+                                             call=True, error=True)
+            raise
+        # rows a SELECT returns are counted as they are fetched
+        rows = result if self._cursor.description is None and isinstance(result, int) else 0
+        self._connection.registry.record(self._name, "execute", time.perf_counter() - start,
+                                         rows=rows, call=True)
+        return result
+
+    def execute(self, query: str, args: Any = None) -> int:
+        return self._run("execute", query, args)
+
+    def executemany(self, query: str, args: Any) -> int:
+        return self._run("executemany", query, args)
+
+    def _fetch(self, method: str, *args: Any) -> Any:
+        """Times one fetch, charging it to the statement last run."""
+        start = time.perf_counter()
+        try:
+            result = getattr(self._cursor, method)(*args)
+        except self._connection.error:
+            self._connection.registry.record(self._name, "fetch", time.perf_counter() - start, error=True)
+            raise
+        if result is None:
+            rows = 0
+        elif method == "fetchone":
+            rows = 1
+        else:
+            rows = len(result)
+        self._connection.registry.record(self._name, "fetch", time.perf_counter() - start, rows=rows)
+        return result
+
+    def fetchone(self) -> tuple | None:
+        return self._fetch("fetchone")
+
+    def fetchmany(self, size: int = 1) -> list[tuple]:
+        return self._fetch("fetchmany", size)
+
+    def fetchall(self) -> list[tuple]:
+        return self._fetch("fetchall")
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self.fetchone, None)
+
+class InstrumentedConnection():
+    """A connection whose cursors are instrumented. The time it took to get
+    the connection waits here until the first statement claims it."""
+
+    def __init__(self, conn: Any, registry: Registry, error: type[Exception], setup: dict[str, float]):
+        self._conn = conn
+        self.registry = registry
+        self.error = error
+        self._setup = setup
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def cursor(self, *args: Any) -> InstrumentedCursor:
+        return InstrumentedCursor(self._conn.cursor(*args), self)
+
+    def take_setup(self) -> dict[str, float]:
+        """Returns, and clears, the tunnel and connect time not yet charged to a statement."""
+        setup, self._setup = self._setup, {}
+        return setup
+
+class InstrumentedBackend():
+    """Wraps a backend so that its connections record every statement in a
+    Registry. Behaves like the backend it wraps in every other way."""
+
+    def __init__(self, backend: Any, registry: Registry):
+        self.backend = backend
+        self.registry = registry
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
+
+    def queries(self, module: ModuleType) -> Any:
+        """Returns the backend's queries for a module, and learns their names."""
+        queries = self.backend.queries(module)
+        self.registry.name_queries(queries)
+        return queries
+
+    @contextmanager
+    def connection(self) -> Iterator[InstrumentedConnection]:
+        """Borrows a connection from the wrapped backend, timing how long that takes."""
+        self.registry.take_tunnel_time()
+        start = time.perf_counter()
+        with self.backend.connection() as conn:
+            borrowed = time.perf_counter() - start
+            tunnel = self.registry.take_tunnel_time()
+            self.registry.record_connection()
+            yield InstrumentedConnection(conn, self.registry, self.backend.Error,
+                                         {"tunnel": tunnel, "connect": borrowed - tunnel})
+
+stats = Registry()
@@ -3,19 +3,45 @@ Crawls the website j-archive for all Jeopardy episodes that they have currently
 and saves the data as a JSON file.
 NOTE: Some data on the website is missing. When this occurs, a null value must be generated
 in order for the JSON file to be structured correctly and the database to remain consistent.
-Currently, this scraper gets all data every single time. Updates to check for changes to
-the website are necessary.
+Every episode fetched is recorded in a crawl manifest (see crawlmanifest.py). On later runs,
+episodes are requested conditionally and skipped if j-archive reports them unchanged, or if
+the page's hash matches the one already dumped.
+Crawling runs in two stages. The fetch stage saves raw HTML to a compressed page cache
+(see pagecache.py), and the parse stage turns cached pages into JSON on every core. The parse stage can be run on its own
+(python jsoncrawler.py --parse-only) to rebuild jsondump/ without touching the network.
 """
 
-from typing import TypeAlias
+from collections import Counter, deque
+from typing import Iterator, TypeAlias
 from urllib.parse import urlparse
 from urllib.parse import parse_qs
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 import re
+import os
+import sys
 import json
+import threading
+import time
 from bs4 import BeautifulSoup
 import requests
+from crawlmanifest import CrawlManifest, hash_content
+from episodestore import EpisodeStore
+from pagecache import PageCache
+from requests.adapters import HTTPAdapter
 
 WHERE = "jsondump/"
+# "json" for one file per episode in WHERE, "store" for the single-file episode store;
+# the same DUMP_FORMAT variable tells the builder which to read
+DUMP_FORMAT = os.getenv("DUMP_FORMAT", "json")
+
+# number of pages fetched at once, and the minimum gap between requests to j-archive
+WORKERS = 4
+REQUESTS_PER_SECOND = 2.0
+RETRIES = 5
+BACKOFF = 1.0
+# responses that mean "try again later" rather than "this page is broken"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
 SEASONS_URL = "https://j-archive.com/listseasons.php"
 ROOT_URL = "https://j-archive.com/"
@@ -26,18 +52,130 @@ DJ_KEY = "DJ"
 SJ_KEY = "J"
 NJ_KEY = "NJ"
 
+# the BeautifulSoup tree builder for episode pages (see benchmarks/parse_throughput.py)
+PARSER = "lxml"
+
 Rounds: TypeAlias = tuple[BeautifulSoup, BeautifulSoup, BeautifulSoup]
 ClueDict: TypeAlias = dict[str, dict[str, str]]
+EpisodeData: TypeAlias = tuple[ClueDict, ClueDict, ClueDict]
+
+class RateLimiter():
+    """Spaces requests out so that no more than `rate` are started per second,
+    no matter how many threads are fetching. Keeps the crawler polite to j-archive."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        """Blocks until the next request is allowed to start."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+def build_session(workers: int = WORKERS) -> requests.Session:
+    """Creates an HTTP session that keeps connections alive between requests.
+    The session never retries on its own: fetch_response does, so that every
+    attempt waits its turn with the rate limiter."""
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=0)
+    new_session = requests.Session()
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    return new_session
+
+session = build_session()
+limiter = RateLimiter(REQUESTS_PER_SECOND)
+
+# opened on first use, so that importing the crawler doesn't create htmlcache/
+_page_cache: PageCache | None = None
+_page_cache_lock = threading.Lock()
 
-def soupify_link(url) -> BeautifulSoup:
-    """Converts a link into a BeautifulSoup object."""
-    html = requests.get(url, timeout=10)
-    soup = BeautifulSoup(html.text, 'lxml')
+def get_page_cache() -> PageCache:
+    """Returns the crawler's page cache, opening it the first time it is needed
+    in this process (parse workers open their own)."""
+    global _page_cache # pylint: disable=global-statement
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
+
+# how many times each episode page has been fetched; every game_id should be 1
+fetch_counts: Counter[str] = Counter()
+fetch_counts_lock = threading.Lock()
+
+def get_game_id(url: str) -> str | None:
+    """Pulls the game_id out of an episode link, or None if it isn't one."""
+    parsed = urlparse(url)
+    if not parsed.path.endswith("showgame.php"):
+        return None
+    return parse_qs(parsed.query).get("game_id", [None])[0]
+
+def retry_delay(attempt: int, response: requests.Response | None) -> float:
+    """How long to back off before retrying: what the server asked for in
+    Retry-After if it gave a number of seconds, or else exponential backoff."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after is not None and retry_after.strip().isdigit():
+        return float(retry_after)
+    return BACKOFF * 2 ** attempt
+
+def fetch_response(url: str, headers: dict[str, str] | None = None) -> requests.Response:
+    """Requests a page through the shared session, respecting the rate limit.
+    Failed or throttled requests are retried up to RETRIES times with backoff,
+    and every attempt, retries included, counts against the rate limit.
+    Extra headers (such as conditional request headers) can be passed along."""
+    game_id = get_game_id(url)
+    if game_id is not None:
+        with fetch_counts_lock:
+            fetch_counts[game_id] += 1
+    for attempt in range(RETRIES + 1):
+        limiter.wait()
+        try:
+            response = session.get(url, headers=headers, timeout=10)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == RETRIES:
+                raise
+            time.sleep(retry_delay(attempt, None))
+            continue
+        if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+            break
+        time.sleep(retry_delay(attempt, response))
+    response.raise_for_status()
+    return response
+
+def fetch(url: str) -> str:
+    """Fetches a page's HTML through the shared session."""
+    return fetch_response(url).text
+
+def read_page(url: str, refresh: bool = True) -> str:
+    """Reads a page through the page cache. With refresh, the page is fetched
+    and the cache updated, falling back to the cached copy if the fetch fails.
+    Without it, the cached copy is used whenever there is one."""
+    if not refresh:
+        html = get_page_cache().get(url)
+        if html is not None:
+            return html
+    try:
+        html = fetch(url)
+    except requests.RequestException:
+        html = get_page_cache().get(url)
+        if html is None:
+            raise
+        return html
+    get_page_cache().put(url, html)
+    return html
+
+def soupify_link(url, refresh: bool = True) -> BeautifulSoup:
+    """Converts a link into a BeautifulSoup object, reading through the page cache."""
+    html = read_page(url, refresh)
+    soup = BeautifulSoup(html, PARSER)
     return soup
 
-def get_seasons() -> list[str]:
+def get_seasons(refresh: bool = True) -> list[str]:
     """Retrieves a list of all links that go to a season's page."""
-    soup = soupify_link(SEASONS_URL)
+    soup = soupify_link(SEASONS_URL, refresh)
     links = soup.find_all("a")
     season_links = []
     for link in links:
@@ -51,10 +189,10 @@ def get_seasons() -> list[str]:
             season_links.append(temp_url)
     return season_links[2:]
 
-def get_episodes(season_link) -> list[str]:
+def get_episodes(season_link, refresh: bool = True) -> list[str]:
     """From a season's page, retrieves all episode page links."""
     game_links = []
-    soup = soupify_link(season_link)
+    soup = soupify_link(season_link, refresh)
     links = soup.find_all("a")
     for link in links:
         parsed = urlparse(link.attrs['href'])
@@ -104,10 +242,20 @@ def get_categories(soup: BeautifulSoup) -> list[str]:
         return categories
     raise ValueError("Can't get categories")
 
+def index_cells(jround: BeautifulSoup) -> dict[str, BeautifulSoup]:
+    """Walks a round once and indexes every td that has an id by that id,
+    so each clue can be looked up without rescanning the round."""
+    cells = {}
+    for cell in jround.find_all("td", id=True):
+        cells.setdefault(cell["id"], cell)
+    return cells
+
 def get_clues(jround: BeautifulSoup, is_double: bool) -> ClueDict:
-    """Gets all clues in an episode soup. NOTE: This is slow."""
+    """Gets all clues in an episode soup. The round is scanned once up front
+    (see index_cells), and every clue is then a dictionary lookup."""
     clue_lists = []
     answer_lists = []
+    cells = {} if jround == "null" else index_cells(jround)
 
     for category in CATEGORY_CONSTS:
         clue_list = []
@@ -131,17 +279,15 @@ def get_clues(jround: BeautifulSoup, is_double: bool) -> ClueDict:
                 # dd_string = "False"
             else:
                 # dd_soup = jround.find_all("td", {"class":"clue_value_daily_double"})
-                clue_soup = jround.find_all(
-                    "td", {"id":f"clue_{selected_key}_{category}_{clue}"})
-                answer_soup = jround.find_all(
-                    "td", {"id":f"clue_{selected_key}_{category}_{clue}_r"})
-                if len(clue_soup) > 0:
-                    clue_string = clue_soup[0].get_text()
+                clue_soup = cells.get(f"clue_{selected_key}_{category}_{clue}")
+                answer_soup = cells.get(f"clue_{selected_key}_{category}_{clue}_r")
+                if clue_soup is not None:
+                    clue_string = clue_soup.get_text()
                 # checking for if the length is just one char might work well
                 else:
                     clue_string = f"null_{selected_key}_{category}_{clue}"
-                if len(answer_soup) > 0:
-                    nested_answer = answer_soup[0].find("em", {"class":"correct_response"})
+                if answer_soup is not None:
+                    nested_answer = answer_soup.find("em", {"class":"correct_response"})
                     answer_string = nested_answer.get_text()
                 else:
                     answer_string = f"null_{selected_key}_{category}_{clue}_r"
@@ -190,7 +336,7 @@ def get_final_jeopardy(jround: BeautifulSoup) -> ClueDict:
     print("Adding FJ...")
     return final_jeopardy_round
 
-def build_episode_data(soup) -> tuple[ClueDict, ClueDict, ClueDict]:
+def build_episode_data(soup) -> EpisodeData:
     """Creates a full episode as a tuple of three rounds."""
     # This needs to run for all episodes, not just the two on the pilots
     jrounds = create_rounds(soup)
@@ -208,23 +354,185 @@ def build_episode_data(soup) -> tuple[ClueDict, ClueDict, ClueDict]:
     full_episode = tuple(full_episode_list)
     return full_episode
 
-def get_title(episode_link: str) -> str:
-    """Finds the episode title to use from the episode link."""
-    episode_soup = soupify_link(episode_link)
+def get_title(episode_soup: BeautifulSoup) -> str:
+    """Finds the episode title to use from the episode page."""
     title_soup = episode_soup.find("div", {"id":"game_title"})
     title_string = title_soup.get_text() # type: ignore
     return title_string
 
-def crawl():
-    """Crawls the entire j-archive website for all currently listed episodes,
-    parses them, and dumps the data to a JSON."""
+def fetch_episode(episode: str, manifest: CrawlManifest) -> str | None:
+    """Fetch stage for a single episode: downloads the page and saves the raw
+    HTML to the page cache. Returns the game_id if the page is new or has changed
+    since the last crawl (and so needs parsing), otherwise None."""
+    game_id = str(get_game_id(episode))
+    cached = episode in get_page_cache()
+    headers = manifest.conditional_headers(game_id) if cached else {}
+    try:
+        response = fetch_response(episode, headers)
+    except requests.RequestException as e:
+        print(f"Error: {e}")
+        return None
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified")
+    }
+    if response.status_code == 304:
+        print(f"game_id {game_id} unchanged, skipping...")
+        manifest.record(game_id)
+        return None
+    content_hash = hash_content(response.content)
+    if cached and manifest.is_unchanged(game_id, content_hash):
+        print(f"game_id {game_id} unchanged, skipping...")
+        manifest.record(game_id, **validators)
+        return None
+
+    get_page_cache().put(episode, response.text)
+    # the title is filled in by the parse stage, which starts over on a changed page
+    manifest.record(game_id, url=episode, title=None, parse_error=None, sha256=content_hash, **validators)
+    return game_id
+
+def fetch_stage(manifest: CrawlManifest, workers: int = WORKERS) -> list[str]:
+    """Fetches every listed episode into the HTML cache, on a pool of `workers`
+    threads sharing one rate limit. Returns the game_ids that need parsing:
+    those that changed, plus any left unparsed by an earlier, interrupted run."""
+    changed = []
     seasons = get_seasons()
-    for season in seasons:
-        episodes = get_episodes(season)
-        for episode in episodes:
-            ep_title = get_title(episode)
-            jsondata = f"{ep_title}.json"
-            soup = soupify_link(episode)
-            episode_data = build_episode_data(soup)
-            with open(WHERE + jsondata, "w", encoding="utf-8") as jf:
-                json.dump(episode_data, jf)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for episodes in executor.map(get_episodes, seasons):
+                for game_id in executor.map(fetch_episode, episodes, repeat(manifest)):
+                    if game_id is not None:
+                        changed.append(game_id)
+                manifest.save()
+    finally:
+        manifest.save()
+    refetched = [game_id for game_id, count in fetch_counts.items() if count > 1]
+    print(f"Fetched {len(fetch_counts)} episodes, {len(refetched)} more than once.")
+    return sorted(set(changed) | set(manifest.unparsed()))
+
+def parse_page(episode: str) -> tuple[str, str, EpisodeData]:
+    """Parse stage for a single episode: parses the cached copy of its page.
+    Runs in a worker process, so it only touches the cache, never the network."""
+    html = get_page_cache().get(episode)
+    if html is None:
+        raise ValueError(f"{episode} is not in the page cache")
+    soup = BeautifulSoup(html, PARSER)
+    game_id = str(get_game_id(episode))
+    ep_title = get_title(soup)
+    episode_data = build_episode_data(soup)
+    return game_id, ep_title, episode_data
+
+def parse_page_safely(episode: str) -> tuple[str, str | None, EpisodeData | None, str | None]:
+    """Runs parse_page, but hands back any error instead of raising it, so that
+    one page the parser can't handle doesn't stop the rest of the parse stage.
+    Returns (game_id, title, rounds, None), or (game_id, None, None, error)."""
+    try:
+        game_id, ep_title, episode_data = parse_page(episode)
+    except Exception as e: # pylint: disable=broad-exception-caught
+        return str(get_game_id(episode)), None, None, f"{type(e).__name__}: {e}"
+    return game_id, ep_title, episode_data, None
+
+def dump_episode(store: EpisodeStore | None,
+                 game_id: str,
+                 ep_title: str,
+                 episode_data: EpisodeData) -> None:
+    """Writes a parsed episode to the episode store, or to a JSON if there is no store."""
+    if store is not None:
+        store.put(game_id, ep_title, episode_data)
+    else:
+        with open(f"{WHERE}{ep_title}.json", "w", encoding="utf-8") as jf:
+            json.dump(episode_data, jf)
+
+def save_parsed(store: EpisodeStore | None,
+                manifest: CrawlManifest,
+                game_id: str,
+                ep_title: str | None,
+                episode_data: EpisodeData | None,
+                error: str | None) -> bool:
+    """Dumps an episode returned by parse_page_safely and records its title in
+    the manifest. A page that failed to parse is recorded as such instead, and
+    is left alone by later crawls until it changes. Returns whether it was dumped."""
+    if error is not None or ep_title is None or episode_data is None:
+        print(f"Error: couldn't parse game_id {game_id}: {error}")
+        manifest.record_parse_error(game_id, str(error))
+        return False
+    dump_episode(store, game_id, ep_title, episode_data)
+    manifest.record_title(game_id, ep_title)
+    return True
+
+def parse_stage(game_ids: list[str] | None = None, processes: int | None = None) -> None:
+    """Parses cached episode pages and dumps each to a JSON (or to the episode
+    store, if DUMP_FORMAT is "store"), spread across `processes` worker
+    processes (all cores by default). Needs no network, so it can be re-run on
+    its own whenever the parser is fixed. If no game_ids are given, every page
+    in the cache is re-parsed, including pages that failed to parse before.
+    A page that fails is reported and marked in the manifest, and the rest
+    carry on."""
+    manifest = CrawlManifest()
+    urls = manifest.urls()
+    if game_ids is None:
+        game_ids = sorted(urls)
+    episodes = [urls[game_id] for game_id in game_ids
+                if game_id in urls and urls[game_id] in get_page_cache()]
+    store = EpisodeStore() if DUMP_FORMAT == "store" else None
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for result in executor.map(parse_page_safely, episodes, chunksize=8):
+                save_parsed(store, manifest, *result)
+    finally:
+        if store is not None:
+            store.close()
+        manifest.save()
+
+def crawl(workers: int = WORKERS, processes: int | None = None):
+    """Crawls the entire j-archive website for all currently listed episodes,
+    parses them, and dumps the data to a JSON. Fetching and parsing are
+    separate stages: pages are first fetched into the HTML cache by a pool
+    of threads, and the new or changed ones are then parsed on a pool of
+    processes. Episodes that haven't changed since the last crawl are skipped."""
+    manifest = CrawlManifest()
+    changed = fetch_stage(manifest, workers)
+    parse_stage(changed, processes)
+
+def iter_crawl(workers: int = WORKERS,
+               processes: int | None = None) -> Iterator[tuple[str, EpisodeData]]:
+    """Crawls like crawl(), but yields each new or changed episode as a
+    (dump file name, rounds) pair as soon as it has been parsed, for the
+    streaming pipeline in builddatabase. Fetching and parsing overlap: each
+    page is handed to the parse pool the moment it arrives. Episodes are
+    still dumped and recorded in the manifest as they go, and pages that fail
+    to parse are marked in the manifest and left out of the stream."""
+    manifest = CrawlManifest()
+    store = EpisodeStore() if DUMP_FORMAT == "store" else None
+
+    def finish(future: Future) -> Iterator[tuple[str, EpisodeData]]:
+        game_id, ep_title, episode_data, error = future.result()
+        if save_parsed(store, manifest, game_id, ep_title, episode_data, error):
+            yield f"{ep_title}.json", episode_data
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as fetchers, \
+                ProcessPoolExecutor(max_workers=processes) as parsers:
+            for episodes in fetchers.map(get_episodes, get_seasons()):
+                pending: deque[Future] = deque()
+                fetched = fetchers.map(fetch_episode, episodes, repeat(manifest))
+                for episode, game_id in zip(episodes, fetched):
+                    if game_id is not None:
+                        pending.append(parsers.submit(parse_page_safely, episode))
+                    while pending and pending[0].done():
+                        yield from finish(pending.popleft())
+                while pending:
+                    yield from finish(pending.popleft())
+                if store is not None:
+                    store.commit()
+                manifest.save()
+    finally:
+        if store is not None:
+            store.close()
+        manifest.save()
+
+if __name__ == "__main__":
+    if "--parse-only" in sys.argv:
+        parse_stage()
+    else:
+        crawl()
@@ -0,0 +1,98 @@
+"""
+A compressed, on-disk cache of every page the crawler fetches, so that a fix
+to the parser never means crawling j-archive again. Pages are gzipped and
+stored under the SHA-256 of their URL. When the cache grows past its size
+limit, the least recently used pages are evicted first. The cache's size is
+only totalled on the first write, so processes that only read from it (the
+parse workers) never walk the whole directory.
+"""
+
+import os
+import gzip
+import hashlib
+import threading
+
+CACHE_DIRECTORY = "htmlcache/"
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+class PageCache():
+    """A size-bounded, gzip-compressed page cache keyed by URL.
+    Safe to use from several crawler threads at once."""
+
+    def __init__(self, directory: str = CACHE_DIRECTORY, max_bytes: int = MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # bytes on disk, totalled on first use by _total_size
+        self._size: int | None = None
+
+    def _path(self, url: str) -> str:
+        """Where a URL's page lives. Pages are spread over 256 subdirectories."""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.html.gz")
+
+    def _total_size(self) -> int:
+        """Returns the bytes on disk, walking the cache the first time.
+        Must be called with the lock held."""
+        if self._size is None:
+            self._size = sum(os.path.getsize(path) for path, _ in self._files())
+        return self._size
+
+    def _files(self) -> list[tuple[str, float]]:
+        """Lists every cached file with its last access time."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".html.gz"):
+                    path = os.path.join(root, name)
+                    files.append((path, os.path.getmtime(path)))
+        return files
+
+    def __contains__(self, url: str) -> bool:
+        return os.path.exists(self._path(url))
+
+    def get(self, url: str) -> str | None:
+        """Returns the cached HTML for a URL, or None if it isn't cached."""
+        path = self._path(url)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                html = file.read()
+        except FileNotFoundError:
+            return None
+        # the modification time doubles as the last access time for eviction
+        os.utime(path)
+        return html
+
+    def put(self, url: str, html: str) -> None:
+        """Stores a page, then evicts old pages if the cache is over its limit."""
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as file:
+            file.write(html)
+        with self._lock:
+            size = self._total_size()
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+            self._size = size + os.path.getsize(path) - old_size
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self) -> None:
+        """Deletes the least recently used pages until the cache is back under
+        90% of its limit, so that eviction doesn't run again on the next put."""
+        target = int(self.max_bytes * 0.9)
+        with self._lock:
+            total = self._total_size()
+            for path, _ in sorted(self._files(), key=lambda file: file[1]):
+                if total <= target:
+                    break
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+            self._size = total
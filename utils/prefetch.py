@@ -0,0 +1,76 @@
+"""
+Loads boards in the background so the player is never left waiting on
+the tunnel. A random episode for the next game is loaded while the
+current game is being played (or while the player is still reading the
+game's intro), and is handed over instantly when a new game starts.
+Episodes handed out are remembered, so a preload never picks the game
+still being played, whose score isn't written yet.
+"""
+
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Collection
+from utils.settings import Config
+import utils.dbaccess as db
+from utils.board import Board
+
+def load_random_board(user_id: int | None = None, just_played: Collection[int] = ()) -> Board:
+    """Picks a random episode for the player and loads its entire board."""
+    episode_id = db.get_random_ep(user_id, just_played=just_played)
+    return db.get_board(episode_id)
+
+class Prefetcher():
+    """Runs board loads on a small thread pool. Each load borrows its own
+    connection from the shared pool, so it never blocks the player's queries."""
+
+    def __init__(self, workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._next_random: Future | None = None
+        # episodes handed out this session, by player
+        self._played: dict[int | None, set[int]] = {}
+
+    def playing(self, episode_id: int, user_id: int | None = None) -> None:
+        """Records that the player has started an episode, so later random
+        picks skip it even before its score is written."""
+        with self._lock:
+            self._played.setdefault(user_id, set()).add(episode_id)
+
+    def _just_played(self, user_id: int | None) -> frozenset[int]:
+        """The episodes handed out to the player this session."""
+        with self._lock:
+            return frozenset(self._played.get(user_id, ()))
+
+    def preload_random(self, user_id: int | None = None) -> None:
+        """Starts loading a random board for the player's next game,
+        unless one is already loading."""
+        just_played = self._just_played(user_id)
+        with self._lock:
+            if self._next_random is None:
+                self._next_random = self._executor.submit(load_random_board, user_id, just_played)
+
+    def random_board(self, user_id: int | None = None) -> Board:
+        """Hands over the preloaded random board (waiting for it if it is still
+        loading) and immediately starts preloading another for the game after.
+        If the preload failed, or picked an episode the player has started
+        since, the board is loaded again in the foreground."""
+        with self._lock:
+            pending, self._next_random = self._next_random, None
+        try:
+            board = pending.result() if pending is not None else None
+        except (db.DatabaseError, ValueError) as e:
+            print(f"Error: {e}")
+            board = None
+        if board is None or (Config.RANDOM_EXCLUDE_PLAYED and board.episode_id in self._just_played(user_id)):
+            board = load_random_board(user_id, self._just_played(user_id))
+        self.playing(board.episode_id, user_id)
+        self.preload_random(user_id)
+        return board
+
+    def shutdown(self) -> None:
+        """Stops the worker threads, abandoning any load that hasn't started yet."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+prefetcher = Prefetcher()
+atexit.register(prefetcher.shutdown)
@@ -0,0 +1,243 @@
+"""
+A local, read-only copy of the clue corpus (the episodes, categories, and
+clues tables) in a SQLite file. The corpus only grows when the builder runs,
+so it is synced by episode ID: each sync copies the episodes above the
+highest episodeID already held locally, along with their categories and clues.
+With Config.USE_REPLICA on, gameplay reads come from this file instead of
+going through the tunnel, so they take microseconds and work offline.
+Accounts and scores always stay on the server.
+
+Each sync that finishes is recorded in the sync_log table, in the same
+transaction as the rows it copied; the replica is only used once one has,
+so a first sync that fails partway never leaves the game reading a partial
+copy. Syncs read from the configured backend (see utils.connection), so
+they are instrumented like any other query.
+
+Run this module directly to sync, or with --full to copy the corpus from
+scratch (needed to pick up episodes the builder has updated in place).
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+from typing import Any
+from pymysql.cursors import SSCursor
+from sshtunnel import BaseSSHTunnelForwarderError
+from utils.settings import Config
+import utils.access_queries as access_queries
+from utils.board import Board
+from utils.connection import backend
+
+q = backend.queries(access_queries)
+
+# rows copied from the server per round trip
+SYNC_CHUNK = 1000
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS episodes (
+        episodeID INTEGER PRIMARY KEY,
+        epDate TEXT NOT NULL,
+        epTitle TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        categoryID INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        round TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        episodeID INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS clues (
+        clueID INTEGER PRIMARY KEY,
+        categoryID INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        moneyvalue INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_log (
+        finished TEXT NOT NULL,
+        episodes INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS episodes_date ON episodes (epDate)",
+    "CREATE INDEX IF NOT EXISTS categories_episode_round_position ON categories (episodeID, round, position)",
+    "CREATE INDEX IF NOT EXISTS categories_episode_name ON categories (episodeID, name)",
+    "CREATE INDEX IF NOT EXISTS clues_category_moneyvalue ON clues (categoryID, moneyvalue)"
+]
+
+# the SQLite counterparts of the gameplay queries in access_queries
+GET_HIGH_WATER_MARK = "SELECT COALESCE(MAX(episodeID), 0) FROM episodes"
+GET_SYNCED = "SELECT 1 FROM sync_log LIMIT 1"
+RECORD_SYNC = "INSERT INTO sync_log (finished, episodes) VALUES (datetime('now'), ?)"
+GET_ALL_EPISODE_IDS = "SELECT episodeID FROM episodes"
+GET_INCOMPLETE_EPISODE_IDS = """
+    SELECT DISTINCT categories.episodeID
+    FROM categories
+    LEFT JOIN clues ON clues.categoryID = categories.categoryID
+    WHERE categories.name LIKE 'null%' OR clues.question LIKE 'null%'
+"""
+GET_EPID_FROM_DATE = """
+    SELECT episodeID FROM episodes
+    WHERE epDate >= ? AND epDate < date(?, '+1 day')
+"""
+GET_BOARD = """
+    SELECT
+        episodes.epTitle,
+        categories.round,
+        categories.position,
+        categories.name,
+        clues.moneyvalue,
+        clues.question,
+        clues.answer
+    FROM categories
+    JOIN episodes ON categories.episodeID = episodes.episodeID
+    LEFT JOIN clues ON clues.categoryID = categories.categoryID
+    WHERE categories.episodeID = ?
+    ORDER BY categories.round, categories.position, clues.moneyvalue
+"""
+
+class Replica():
+    """The local clue corpus. Reads use one read-only SQLite connection per
+    thread (the prefetcher loads boards on its own threads); syncs open a
+    separate writable connection and apply everything in one transaction,
+    so readers never see a half-copied episode."""
+
+    def __init__(self, path: str = Config.REPLICA_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._synced = False
+
+    @property
+    def enabled(self) -> bool:
+        """True if gameplay should read from the replica, which needs a
+        sync to have finished. Once one has, the replica stays usable."""
+        if not Config.USE_REPLICA:
+            return False
+        if not self._synced and os.path.exists(self.path):
+            try:
+                self._synced = self._one(GET_SYNCED) is not None
+            except sqlite3.Error:
+                # no sync_log yet: the first sync hasn't finished
+                return False
+        return self._synced
+
+    def _reader(self) -> sqlite3.Connection:
+        """Returns this thread's read-only connection, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _one(self, query: str, params: tuple = ()) -> Any:
+        """Runs a query and returns its first row."""
+        return self._reader().execute(query, params).fetchone()
+
+    def _all(self, query: str, params: tuple = ()) -> list:
+        """Runs a query and returns every row."""
+        return self._reader().execute(query, params).fetchall()
+
+    def sync(self, full: bool = False) -> int:
+        """Copies every episode newer than the local high-water mark from the
+        server, with its categories and clues. With full set, the local copy
+        is emptied and rebuilt. Returns the number of episodes copied."""
+        local = sqlite3.connect(self.path)
+        try:
+            for statement in CREATE_TABLES:
+                local.execute(statement)
+            if full:
+                for table in ("clues", "categories", "episodes"):
+                    local.execute(f"DELETE FROM {table}")
+            low = local.execute(GET_HIGH_WATER_MARK).fetchone()[0]
+
+            with backend.connection() as conn:
+                cur = conn.cursor(SSCursor)
+                try:
+                    # one snapshot, and a fixed upper bound, so the categories and
+                    # clues copied belong to exactly the episodes copied
+                    cur.execute(q.SYNC_SNAPSHOT)
+                    cur.execute(q.GET_MAX_EPISODE_ID)
+                    # read to the end, so the unbuffered result is finished
+                    # before the copies start
+                    high = int(cur.fetchall()[0][0] or 0)
+                    copied = 0
+                    if high > low:
+                        copied = self._copy(cur, local, "episodes", q.SYNC_EPISODES, (low, high))
+                        self._copy(cur, local, "categories", q.SYNC_CATEGORIES, (low, high))
+                        self._copy(cur, local, "clues", q.SYNC_CLUES, (low, high))
+                    conn.commit()
+                finally:
+                    cur.close()
+            local.execute(RECORD_SYNC, (copied,))
+            local.commit()
+        except BaseException:
+            local.rollback()
+            raise
+        finally:
+            local.close()
+        return copied
+
+    @staticmethod
+    def _copy(cur: SSCursor,
+              local: sqlite3.Connection,
+              table: str,
+              query: str,
+              params: tuple[int, int]) -> int:
+        """Streams the rows of one table from the server into the replica."""
+        cur.execute(query, params)
+        columns = len(cur.description)
+        insert = f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * columns)})"
+        copied = 0
+        while True:
+            rows = cur.fetchmany(SYNC_CHUNK)
+            if len(rows) == 0:
+                return copied
+            if table == "episodes":
+                rows = [(episode_id, str(ep_date), title) for episode_id, ep_date, title in rows]
+            local.executemany(insert, rows)
+            copied += len(rows)
+
+    def refresh(self) -> bool:
+        """Syncs if the server can be reached. If it can't, the game carries on
+        with whatever the replica already holds. Returns True if the sync ran."""
+        try:
+            copied = self.sync()
+        except (backend.Error, BaseSSHTunnelForwarderError, OSError) as e:
+            print(f"Couldn't update the local clue corpus ({e}), playing from the local copy.")
+            return False
+        if copied > 0:
+            print(f"Added {copied} episodes to the local clue corpus.")
+        return True
+
+    def episode_ids(self) -> list[int]:
+        """Retrieves every episode ID in the replica."""
+        return [int(row[0]) for row in self._all(GET_ALL_EPISODE_IDS)]
+
+    def incomplete_episode_ids(self) -> set[int]:
+        """Retrieves the episodes with a category or clue missing from j-archive."""
+        return {int(row[0]) for row in self._all(GET_INCOMPLETE_EPISODE_IDS)}
+
+    def get_ep_id_from_date(self, ep_date: str) -> int | None:
+        """See dbaccess.get_ep_id_from_date. Returns None if there is no episode that day."""
+        result = self._one(GET_EPID_FROM_DATE, (ep_date, ep_date))
+        return int(result[0]) if result is not None else None
+
+    def get_board(self, episode_id: int) -> Board:
+        """See dbaccess.get_board."""
+        return Board.from_rows(episode_id, tuple(self._all(GET_BOARD, (episode_id,))))
+
+replica = Replica()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--full", action="store_true",
+                        help="empty the local copy and copy the whole corpus again")
+    args = parser.parse_args()
+    print(f"Copied {replica.sync(args.full)} episodes.")
@@ -0,0 +1,195 @@
+"""
+Owns the database schema. Every change to the tables is a numbered migration,
+and the migrations already applied are recorded in the schema_version table,
+so apply_migrations can be run by the builder every time and only does the
+work that is missing. check_hot_queries runs EXPLAIN on the queries the game
+runs most, to confirm that none of them has to scan a whole table.
+"""
+
+from typing import Callable, TypeAlias
+import pymysql
+import access_queries as aq
+
+# table, index name, indexed columns
+Index : TypeAlias = tuple[str, str, str]
+# a step is a statement, an index to create, or a function run with a cursor
+Step : TypeAlias = str | Index | Callable[[pymysql.cursors.Cursor], None]
+Migration : TypeAlias = tuple[int, str, list[Step]]
+
+CREATE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT NOT NULL PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied DATETIME NOT NULL
+    )
+"""
+
+GET_SCHEMA_VERSION = """
+    SELECT COALESCE(MAX(version), 0) FROM schema_version
+"""
+
+INSERT_SCHEMA_VERSION = """
+    INSERT INTO schema_version
+    (version, description, applied)
+    VALUES
+    (%s, %s, NOW())
+"""
+
+GET_INDEX_EXISTENCE = """
+    SELECT 1 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    LIMIT 1
+"""
+
+CREATE_PLAYERS = """
+    CREATE TABLE IF NOT EXISTS players (
+        userID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL
+    )
+"""
+
+CREATE_EPISODES = """
+    CREATE TABLE IF NOT EXISTS episodes (
+        episodeID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        epDate DATETIME NOT NULL,
+        epTitle VARCHAR(255) NOT NULL
+    )
+"""
+
+CREATE_CATEGORIES = """
+    CREATE TABLE IF NOT EXISTS categories (
+        categoryID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        round VARCHAR(16) NOT NULL,
+        position INT NOT NULL,
+        episodeID INT NOT NULL,
+        FOREIGN KEY (episodeID) REFERENCES episodes (episodeID)
+    )
+"""
+
+CREATE_CLUES = """
+    CREATE TABLE IF NOT EXISTS clues (
+        clueID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        categoryID INT NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        moneyvalue INT NOT NULL,
+        FOREIGN KEY (categoryID) REFERENCES categories (categoryID)
+    )
+"""
+
+CREATE_HIGHSCORES = """
+    CREATE TABLE IF NOT EXISTS highscores (
+        scoreID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        epID INT NOT NULL,
+        player INT NOT NULL,
+        score INT NOT NULL,
+        date DATETIME NOT NULL
+    )
+"""
+
+CREATE_LEADERBOARD = """
+    CREATE TABLE IF NOT EXISTS leaderboard (
+        period VARCHAR(8) NOT NULL,
+        periodStart DATE NOT NULL,
+        scoreID INT NOT NULL,
+        score INT NOT NULL,
+        PRIMARY KEY (period, periodStart, scoreID),
+        INDEX leaderboard_rank (period, periodStart, score)
+    )
+"""
+
+def backfill_leaderboard(cur: pymysql.cursors.Cursor) -> None:
+    """Fills the current period of each leaderboard from highscores, so the
+    leaderboard starts out correct on a database that already has scores."""
+    for period in aq.LEADERBOARD_PERIODS:
+        cur.execute(aq.REBUILD_LEADERBOARD, (period, period, period, aq.LEADERBOARD_SIZE))
+
+MIGRATIONS: list[Migration] = [
+    (1, "create tables", [
+        CREATE_PLAYERS,
+        CREATE_EPISODES,
+        CREATE_CATEGORIES,
+        CREATE_CLUES,
+        CREATE_HIGHSCORES
+    ]),
+    (2, "indexes for the gameplay and builder queries", [
+        ("categories", "categories_episode_round_position", "episodeID, round, position"),
+        ("categories", "categories_episode_name", "episodeID, name"),
+        ("clues", "clues_category_moneyvalue", "categoryID, moneyvalue"),
+        ("players", "players_username", "username"),
+        ("episodes", "episodes_title", "epTitle"),
+        ("episodes", "episodes_date", "epDate"),
+        ("highscores", "highscores_score", "score"),
+        ("highscores", "highscores_player_score", "player, score")
+    ]),
+    (3, "materialized leaderboard", [CREATE_LEADERBOARD, backfill_leaderboard])
+]
+
+def schema_version(cur: pymysql.cursors.Cursor) -> int:
+    """Returns the number of the last migration applied."""
+    cur.execute(CREATE_SCHEMA_VERSION)
+    cur.execute(GET_SCHEMA_VERSION)
+    return int(cur.fetchone()[0])
+
+def create_index(cur: pymysql.cursors.Cursor, index: Index) -> None:
+    """Creates an index unless one with that name is already on the table.
+    MySQL has no CREATE INDEX IF NOT EXISTS, so the catalog is checked first."""
+    table, name, columns = index
+    cur.execute(GET_INDEX_EXISTENCE, (table, name))
+    if cur.fetchone() is None:
+        cur.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+def apply_migrations(conn: pymysql.Connection) -> int:
+    """Applies every migration newer than the database's schema version, in order.
+    Every step is safe to repeat, so a migration interrupted partway (MySQL
+    commits DDL as it goes) simply runs again next time. Returns the new version."""
+    cur = conn.cursor()
+    try:
+        version = schema_version(cur)
+        for number, description, steps in MIGRATIONS:
+            if number <= version:
+                continue
+            print(f"Applying migration {number}: {description}...")
+            for step in steps:
+                if isinstance(step, tuple):
+                    create_index(cur, step)
+                elif callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+            cur.execute(INSERT_SCHEMA_VERSION, (number, description))
+            conn.commit()
+            version = number
+    finally:
+        cur.close()
+    return version
+
+# the queries run during every game and login, with sample parameters to EXPLAIN them with
+HOT_QUERIES: list[tuple[str, str, tuple]] = [
+    ("GET_USERNAME", aq.GET_USERNAME, ("player",)),
+    ("GET_PASSWORD_HASH_BY_USERNAME", aq.GET_PASSWORD_HASH_BY_USERNAME, ("player",)),
+    ("GET_USERID_BY_USERNAME", aq.GET_USERID_BY_USERNAME, ("player",)),
+    ("GET_EPID_FROM_DATE", aq.GET_EPID_FROM_DATE, ("2000-01-03", "2000-01-03")),
+    ("GET_BOARD", aq.GET_BOARD, (1,)),
+    ("GET_SCORES", aq.GET_SCORES, (1,)),
+    ("GET_LEADERBOARD", aq.GET_LEADERBOARD, ("alltime", "alltime", aq.LEADERBOARD_SIZE))
+]
+
+def check_hot_queries(conn: pymysql.Connection) -> list[str]:
+    """EXPLAINs every hot query and returns a description of each table that
+    one of them reads with a full scan. An empty list means every hot query
+    is served by an index. NOTE: on a nearly empty table, MySQL may choose a
+    scan anyway because it is cheaper, so run this against real data."""
+    full_scans = []
+    cur = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        for name, sql, params in HOT_QUERIES:
+            cur.execute(f"EXPLAIN {sql.strip().rstrip(';')}", params)
+            for row in cur.fetchall():
+                if str(row.get("type")).upper() == "ALL":
+                    full_scans.append(f"{name}: full scan of {row.get('table')}")
+    finally:
+        cur.close()
+    return full_scans
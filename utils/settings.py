@@ -0,0 +1,24 @@
+"""
+The game's settings. The game reads its config from the untracked
+altconfig.py, which predates most of the tuning settings in config.py
+(the connection pool, backends, replica, and so on). Any setting an
+altconfig.py leaves out falls back to config.py's default, so an existing
+altconfig.py keeps working as new settings are added. Without an
+altconfig.py (a fresh checkout, the tests, the benchmarks), config.py's
+settings are used as they are.
+"""
+
+import config
+
+try:
+    import altconfig
+except ImportError:
+    altconfig = None
+
+if altconfig is None:
+    Config = config.Config
+elif issubclass(altconfig.Config, config.Config):
+    Config = altconfig.Config
+else:
+    class Config(altconfig.Config, config.Config): # type: ignore[no-redef]
+        """altconfig's settings, with config.py's defaults for the rest."""